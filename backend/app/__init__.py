@@ -1,15 +1,28 @@
-from flask import Flask
+import atexit
+import threading
+from flask import Flask, jsonify
 from flask_cors import CORS
-from .routes.chat import chat_bp
-from .routes.auth import auth_bp
-from .routes.file_routes import file_bp
+from .config.settings import EMBEDDING_WARMUP, EMBEDDING_REINDEX_ENABLED, UPLOAD_MAX_BYTES
 from .utils.logger import Logger
 
 logger = Logger()
 
 def create_app():
     """Create and configure the Flask application"""
+    # Routes and services are imported here, not at package import: PDF extraction
+    # workers are spawned processes that import app.services.extractors (and run.py),
+    # and must not build the Supabase client, the AI/file services and their pools
+    from .routes.chat import chat_bp, ai_service
+    from .routes.auth import auth_bp
+    from .routes.file_routes import file_bp, ingestion_service, reindexer
+    from .services.embedding_service import get_embedding_service
+    from .lib.http_client import get_http_client, close_http_client
+    from .utils.uploads import UploadRequest
+
     app = Flask(__name__)
+    # Uploads are streamed to disk once and refused early when too large
+    app.request_class = UploadRequest
+    app.config['MAX_CONTENT_LENGTH'] = UPLOAD_MAX_BYTES
     CORS(app, resources={r"/*": {"origins": "*", "allow_headers": ["Content-Type", "Authorization"], "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"]}})  # Enable CORS for all routes
 
     # Register blueprints
@@ -17,4 +30,23 @@ def create_app():
     app.register_blueprint(auth_bp)
     app.register_blueprint(file_bp, url_prefix='/file')
 
+    @app.errorhandler(413)
+    def request_too_large(error):
+        return jsonify({'error': f'File is too large, the limit is {UPLOAD_MAX_BYTES // (1024 * 1024)} MB'}), 413
+
+    # One pooled client for web search and scraping, its connections are closed at exit
+    get_http_client()
+    atexit.register(close_http_client)
+
+    # Load the embedding model without holding up startup
+    if EMBEDDING_WARMUP:
+        threading.Thread(target=get_embedding_service().warm_up, name='embedding-warmup', daemon=True).start()
+
+    # New files get an LLM summary once ready (FILE_SUMMARY_ENABLED)
+    ingestion_service.summarizer = ai_service.summarize_file
+
+    # Re-embed files of an older embedding model while their old vectors keep serving
+    if EMBEDDING_REINDEX_ENABLED:
+        reindexer.start()
+
     return app
\ No newline at end of file
@@ -1,6 +1,7 @@
 """
 Configuration for different AI agents/models available in the application.
 Each agent is configured with a unique ID, model name, display name, and description.
+context_tokens is the budget for file excerpts in the agent's prompts.
 """
 
 AVAILABLE_AGENTS = {
@@ -11,6 +12,7 @@ AVAILABLE_AGENTS = {
         "description": "Mistral Small 3.1 - 24B instruction model. Great for general questions.",
         "avatar": "🧠", 
         "temperature": 0.7,
+        "context_tokens": 4000,
         "is_default": True
     },
     "gemma": {
@@ -20,6 +22,7 @@ AVAILABLE_AGENTS = {
         "description": "Google's Gemma 3 - 4B instruction model. Balances efficiency and knowledge.",
         "avatar": "🔍",
         "temperature": 0.7,
+        "context_tokens": 2000,
         "is_default": False
     },
     "deepseek": {
@@ -29,6 +32,7 @@ AVAILABLE_AGENTS = {
         "description": "DeepSeek Chat v3 - Excels at technical topics and detailed explanations.",
         "avatar": "🔬",
         "temperature": 0.6,
+        "context_tokens": 4000,
         "is_default": False
     },
     "llama": {
@@ -38,6 +42,7 @@ AVAILABLE_AGENTS = {
         "description": "Meta's Llama 4 Maverick model - Creative and diverse responses.",
         "avatar": "🦙",
         "temperature": 0.75,
+        "context_tokens": 4000,
         "is_default": False
     },
     "qwen": {
@@ -47,6 +52,7 @@ AVAILABLE_AGENTS = {
         "description": "Alibaba's Qwen3 30B model - Very knowledgeable and precise.",
         "avatar": "⚡",
         "temperature": 0.65,
+        "context_tokens": 4000,
         "is_default": False
     }
 }
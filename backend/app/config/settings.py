@@ -0,0 +1,116 @@
+"""
+Runtime settings read from environment variables.
+Each setting has a default suitable for local development.
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# How schedule and exam answers are produced:
+#   'template' - deterministic Vietnamese templates, answered in milliseconds
+#   'llm'      - the agent rephrases the retrieved data
+# A request can override this with the 'response_mode' field.
+SCHEDULE_RESPONSE_MODE = os.getenv('SCHEDULE_RESPONSE_MODE', 'template')
+
+# Timetable/exam snapshots persisted to Supabase (see timetable_snapshots.py)
+TIMETABLE_SNAPSHOTS_ENABLED = os.getenv('TIMETABLE_SNAPSHOTS_ENABLED', 'true').lower() == 'true'
+# A snapshot younger than this is served without asking UIS; older ones only when UIS fails
+TIMETABLE_SNAPSHOT_MAX_AGE = int(os.getenv('TIMETABLE_SNAPSHOT_MAX_AGE', 6 * 3600))
+
+# Sentence-transformers model shared by every embedding caller (see embedding_service.py).
+# Its name is stored as file_chunks.embedding_version; after a change, files embedded by the
+# previous model are searched with that model until they are re-indexed
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+EMBEDDING_DIMENSION = int(os.getenv('EMBEDDING_DIMENSION', 384))
+# 'torch' (SentenceTransformer) or 'onnx' (ONNX Runtime, see onnx_embedding.py)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+# Where the ONNX export of the model is written the first time the onnx backend is used
+ONNX_MODEL_DIR = os.getenv('ONNX_MODEL_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'study-assistant', 'onnx'))
+# Use the dynamically quantized int8 export
+ONNX_QUANTIZE = os.getenv('ONNX_QUANTIZE', 'true').lower() == 'true'
+# Threads of one ONNX inference, 0 lets ONNX Runtime decide
+ONNX_INTRA_OP_THREADS = int(os.getenv('ONNX_INTRA_OP_THREADS', 0))
+# Load the embedding model in the background when the app starts
+EMBEDDING_WARMUP = os.getenv('EMBEDDING_WARMUP', 'false').lower() == 'true'
+# Chunks embedded per model call during ingestion; also bounds the vectors held in memory
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 64))
+# Query embeddings kept in memory so repeated questions skip the model (0 disables the cache)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 1024))
+
+# Writes of file_chunks rows (see chunk_writer.py): batch size in bytes, batches sent at once, retries per batch
+CHUNK_INSERT_MAX_BYTES = int(os.getenv('CHUNK_INSERT_MAX_BYTES', 1024 * 1024))
+CHUNK_INSERT_CONCURRENCY = int(os.getenv('CHUNK_INSERT_CONCURRENCY', 3))
+CHUNK_INSERT_RETRIES = int(os.getenv('CHUNK_INSERT_RETRIES', 3))
+
+# Shared client for outbound web requests: search API and scraped pages (see lib/http_client.py)
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', 20))
+# Idle connections kept open, and for how many seconds
+HTTP_MAX_KEEPALIVE = int(os.getenv('HTTP_MAX_KEEPALIVE', 10))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 30.0))
+# Requests to the same host at once
+HTTP_MAX_PER_HOST = int(os.getenv('HTTP_MAX_PER_HOST', 4))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5.0))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 15.0))
+# Used when the h2 package is installed
+HTTP2_ENABLED = os.getenv('HTTP2_ENABLED', 'true').lower() == 'true'
+
+# Background re-embedding of files stored with an older embedding version (see reindexer.py).
+# Enable it in one process only
+EMBEDDING_REINDEX_ENABLED = os.getenv('EMBEDDING_REINDEX_ENABLED', 'false').lower() == 'true'
+# Chunks re-embedded per step, and the pause between steps so user traffic keeps the model
+EMBEDDING_REINDEX_BATCH_SIZE = int(os.getenv('EMBEDDING_REINDEX_BATCH_SIZE', 32))
+EMBEDDING_REINDEX_PAUSE = float(os.getenv('EMBEDDING_REINDEX_PAUSE', 1.0))
+# Seconds between checks for outdated files once none are left
+EMBEDDING_REINDEX_IDLE = int(os.getenv('EMBEDDING_REINDEX_IDLE', 600))
+
+# Background file ingestion (see ingestion_service.py)
+INGESTION_WORKERS = int(os.getenv('INGESTION_WORKERS', 2))
+# Uploads waiting or running at once; further uploads are refused with 503
+INGESTION_MAX_PENDING = int(os.getenv('INGESTION_MAX_PENDING', 20))
+# How long finished jobs stay queryable in memory before only the database status is left
+INGESTION_JOB_TTL = int(os.getenv('INGESTION_JOB_TTL', 3600))
+
+# Uploads (see utils/uploads.py): larger request bodies are refused with 413 before they are read
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', 50 * 1024 * 1024))
+# Uploads up to this size stay in memory, larger ones are streamed to a temporary file
+UPLOAD_SPOOL_BYTES = int(os.getenv('UPLOAD_SPOOL_BYTES', 1024 * 1024))
+
+# PDF extraction (see extractors.py); PDFs with more pages are refused at upload
+PDF_MAX_PAGES = int(os.getenv('PDF_MAX_PAGES', 1000))
+PDF_MAX_BYTES = int(os.getenv('PDF_MAX_BYTES', 50 * 1024 * 1024))
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', max(1, min(4, os.cpu_count() or 1))))
+# Smaller documents are extracted in-process, the pool start-up isn't worth it
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 32))
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', 16))
+
+# Office documents (see extractors.py); larger files are refused
+DOCX_MAX_BYTES = int(os.getenv('DOCX_MAX_BYTES', 20 * 1024 * 1024))
+XLSX_MAX_BYTES = int(os.getenv('XLSX_MAX_BYTES', 20 * 1024 * 1024))
+PPTX_MAX_BYTES = int(os.getenv('PPTX_MAX_BYTES', 50 * 1024 * 1024))
+# Rows read from a workbook, over all sheets; the rest is skipped
+XLSX_MAX_ROWS = int(os.getenv('XLSX_MAX_ROWS', 50000))
+
+# Chunking (see chunker.py), in tokens of the embedding model
+CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', 200))
+
+# Most recent ready files searched when a question is asked across all of a user's files
+USER_SEARCH_MAX_FILES = int(os.getenv('USER_SEARCH_MAX_FILES', 50))
+
+# Outline of each file built at ingest (see file_outline.py): headings kept, keywords, characters of opening text
+OUTLINE_MAX_SECTIONS = int(os.getenv('OUTLINE_MAX_SECTIONS', 40))
+OUTLINE_MAX_KEYWORDS = int(os.getenv('OUTLINE_MAX_KEYWORDS', 15))
+OUTLINE_LEAD_CHARS = int(os.getenv('OUTLINE_LEAD_CHARS', 800))
+# Also write an LLM summary of each new file in the background, with this model (default agent's if empty)
+FILE_SUMMARY_ENABLED = os.getenv('FILE_SUMMARY_ENABLED', 'false').lower() == 'true'
+FILE_SUMMARY_MODEL = os.getenv('FILE_SUMMARY_MODEL', '')
+
+# Tokens of file context in a prompt, for agents without their own context_tokens (see config/agents.py)
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 3000))
+
+# Memory for cached per-file embedding matrices (see vector_index.py)
+VECTOR_CACHE_MAX_BYTES = int(os.getenv('VECTOR_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+# 'float16' or 'int8' also stores chunk vectors packed in file_chunks.embedding_q and keeps
+# them quantized in the vector cache (see embedding_codec.py); 'none' keeps float32.
+# int8 is the better trade-off: NumPy has no fast float16 matmul, so float16 search is slower
+EMBEDDING_QUANTIZATION = os.getenv('EMBEDDING_QUANTIZATION', 'none')
@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import httpx
+from ..config.settings import (
+    HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY, HTTP_MAX_PER_HOST,
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP2_ENABLED
+)
+from ..utils.logger import Logger
+
+logger = Logger()
+
+
+def _h2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class SharedHttpClient:
+    """
+    One pooled httpx.AsyncClient for outbound web traffic (search API, scraped pages).
+
+    Flask runs every async view in a new event loop, and the connections of an
+    AsyncClient belong to the loop that opened them. The client therefore lives on
+    its own event loop in a background thread: request() hands the call to that
+    loop and awaits the result from the caller's loop, so keep-alive connections
+    and HTTP/2 streams are reused across requests instead of paying a DNS and TLS
+    handshake every time. At most max_per_host requests go to one host at once.
+    """
+
+    def __init__(self, max_connections=HTTP_MAX_CONNECTIONS, max_keepalive=HTTP_MAX_KEEPALIVE,
+                 keepalive_expiry=HTTP_KEEPALIVE_EXPIRY, max_per_host=HTTP_MAX_PER_HOST,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT, http2=HTTP2_ENABLED):
+        self.max_per_host = max_per_host
+        self.connect_timeout = connect_timeout
+        # HTTP/2 needs the h2 package
+        self.http2 = http2 and _h2_available()
+        self._client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry
+            ),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout)
+        )
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='http-client', daemon=True)
+        self._thread.start()
+        # host -> [semaphore, requests using it], only touched on the client's loop
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {
+            'requests': 0,
+            'errors': 0,
+            'in_flight': 0,
+            'connections_opened': 0,
+            'tls_handshakes': 0,
+            'reused_connections': 0,
+            'http2_responses': 0
+        }
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self.stats[key] += delta
+
+    async def _send(self, method, url, kwargs):
+        host = httpx.URL(url).host
+        slot = self._hosts.setdefault(host, [asyncio.Semaphore(self.max_per_host), 0])
+        slot[1] += 1
+        opened = []
+
+        async def trace(event, info):
+            # httpcore reports each new TCP connection and TLS handshake of this request
+            if event == 'connection.connect_tcp.complete':
+                opened.append(event)
+                self._count(connections_opened=1)
+            elif event == 'connection.start_tls.complete':
+                self._count(tls_handshakes=1)
+
+        try:
+            async with slot[0]:
+                response = await self._client.request(method, url, extensions={'trace': trace}, **kwargs)
+        finally:
+            slot[1] -= 1
+            if not slot[1]:
+                del self._hosts[host]
+        self._count(reused_connections=0 if opened else 1,
+                    http2_responses=1 if response.http_version == 'HTTP/2' else 0)
+        return response
+
+    async def request(self, method, url, **kwargs):
+        """
+        Send a request on the shared client, from any event loop.
+
+        Args:
+            method (str): HTTP method
+            url (str): Absolute URL
+            **kwargs: Passed to httpx.AsyncClient.request (params, headers, timeout, follow_redirects...)
+
+        Returns:
+            httpx.Response: The response, with its body already read
+        """
+        if self._closed:
+            raise RuntimeError('The shared HTTP client is closed')
+        self._count(requests=1, in_flight=1)
+        try:
+            future = asyncio.run_coroutine_threadsafe(self._send(method, url, kwargs), self._loop)
+            return await asyncio.wrap_future(future)
+        except Exception:
+            self._count(errors=1)
+            raise
+        finally:
+            self._count(in_flight=-1)
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    def timeout(self, read_timeout):
+        """A timeout with another read limit and the shared connect limit"""
+        return httpx.Timeout(read_timeout, connect=self.connect_timeout)
+
+    def close(self, wait=5.0):
+        """Close pooled connections and stop the client's event loop"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result(wait)
+        except Exception as e:
+            logger.log_with_timestamp('HTTP_CLIENT_ERROR', f'Failed to close connections: {str(e)}')
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(wait)
+        logger.log_with_timestamp('HTTP_CLIENT', 'Closed', str(self.get_stats()))
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['http2'] = self.http2
+        stats['closed'] = self._closed
+        return stats
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+def get_http_client():
+    """Return the process-wide SharedHttpClient, creating it on first call"""
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = SharedHttpClient()
+                logger.log_with_timestamp('HTTP_CLIENT', f'Started (HTTP/2 {"on" if _http_client.http2 else "off"})')
+    return _http_client
+
+
+def close_http_client():
+    """Close the process-wide client if it was created, for shutdown"""
+    if _http_client is not None:
+        _http_client.close()
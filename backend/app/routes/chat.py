@@ -1,15 +1,17 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 from ..services.ai_service import AiService
 from ..services.query_classifier import QueryClassifier
 from ..services.schedule_service import ScheduleService
 from ..services.exam_schedule_service import ExamScheduleService
 from ..services.ptit_auth_service import PTITAuthService
+from ..services.schedule_renderer import ScheduleRenderer
 from ..utils.logger import Logger
 from ..lib.supabase import supabase
 import time
 from datetime import datetime, timedelta
 import json
 from ..config.agents import get_agent, get_all_agents
+from ..config.settings import SCHEDULE_RESPONSE_MODE
 
 chat_bp = Blueprint('chat', __name__)
 ai_service = AiService()
@@ -25,6 +27,162 @@ schedule_service.set_ai_service(ai_service)
 exam_schedule_service.set_auth_service(ptit_auth_service)
 # Set the schedule_service in the exam_schedule_service for date extraction
 exam_schedule_service.set_schedule_service(schedule_service)
+schedule_renderer = ScheduleRenderer(schedule_service, exam_schedule_service)
+
+def build_schedule_prompt(message, sessions, exam_text, date_info_value, formatted_date_info, original_text):
+    """
+    Build the system prompt asking the agent to rephrase schedule data.
+    Only used when the request asks for response_mode 'llm'.
+    """
+    if not sessions and not exam_text:
+        # No classes or exams found for this date
+        if original_text == 'default':
+            # User didn't specify a date clearly
+            return {
+                "role": "system",
+                "content": f"""
+                You are a helpful study assistant for university students. The student asked about their schedule but didn't specify a clear date.
+                Their query was: "{message}"
+                
+                Please respond in Vietnamese, politely asking them to specify which day or date they're asking about.
+                Use a professional and respectful tone appropriate for university students - avoid using "em" and instead use more formal language.
+                For example, they could clarify with "thứ 7 tuần này", "thứ 2 tuần sau", or a specific date.
+                Your response should be friendly and helpful, encouraging them to provide more details so you can assist them better.
+                """
+            }
+        
+        # We understood the date, but nothing was found
+        if isinstance(date_info_value, tuple):
+            date_repr = f"từ {formatted_date_info}"
+        else:
+            weekday_vn = schedule_service.get_vietnamese_weekday(date_info_value.weekday())
+            date_repr = f"{weekday_vn}, ngày {formatted_date_info}"
+        
+        return {
+            "role": "system",
+            "content": f"""
+            You are a helpful study assistant. The student asked about their schedule for {date_repr}.
+            After checking the system, no classes or exams were found for this date.
+            
+            Please respond in Vietnamese, letting them know there are no classes or exams scheduled for {date_repr}.
+            Offer to check another date if they'd like. Be helpful and friendly in your response.
+            """
+        }
+    
+    # Prepare combined prompt with both schedule and exam info
+    combined_data = ""
+    if sessions:
+        combined_data += "LỊCH HỌC:\n" + schedule_service.format_sessions(sessions, include_weekday=True) + "\n"
+    if exam_text:
+        combined_data += "LỊCH THI:\n" + exam_text
+    
+    return {
+        "role": "system",
+        "content": f"""
+        You are a helpful study assistant. The student asked about their schedule.
+        Here is the schedule information retrieved from the system:
+
+        {combined_data}
+
+        Please respond in Vietnamese, summarizing this information in a natural, 
+        conversational way. Mention the date and add any relevant reminders 
+        about being on time for classes or exams. 
+        
+        If there are both classes and exams, make sure to clearly distinguish between them.
+        If there are exams, emphasize their importance and suggest preparing well in advance.
+        
+        Keep your response concise and friendly.
+        """
+    }
+
+def build_exam_prompt(message, exam_result):
+    """
+    Build the system prompt asking the agent to rephrase exam data.
+    Only used when the request asks for response_mode 'llm'.
+    """
+    if exam_result['exam_count'] == 0:
+        # No exams found
+        return {
+            "role": "system",
+            "content": f"""
+            You are a helpful study assistant. The student asked about their exam schedule.
+            After checking the system, no exams were found matching their query: "{message}"
+            
+            Please respond in Vietnamese, letting them know no exams were found matching their criteria.
+            If their query was for a specific date or date range ({exam_result['filter_value']}), 
+            mention that time period in your response.
+            Offer to check another date or subject if they'd like. Be helpful and friendly in your response.
+            """
+        }
+    else:
+        # We have exam data to share
+        # If it's a date range query, include that information
+        date_info = ""
+        week_context = ""
+        if exam_result['filter_type'] == "date_range":
+            date_info = f"cho khoảng thời gian {exam_result['filter_value']}"
+            
+            # Add additional context for week-based queries
+            if "to" in exam_result['filter_value']:
+                week_context = "Đây là danh sách tất cả các kỳ thi trong khoảng thời gian này. "
+        elif exam_result['filter_type'] == "date":
+            date_info = f"cho ngày {exam_result['filter_value']}"
+        
+        return {
+            "role": "system",
+            "content": f"""
+            You are a helpful study assistant. The student asked about their exam schedule.
+            Here is the exam information retrieved from the system {date_info}:
+
+            {exam_result['exam_text']}
+
+            {week_context}Please respond in Vietnamese, summarizing this information in a natural, 
+            conversational way. Mention the date or date range if provided, along with any upcoming exams,
+            their format, location and time.
+            Add any relevant reminders about being prepared for exams.
+            Keep your response concise and friendly.
+            """
+        }
+
+def stream_structured_response(payload, prompt, message, agent_id, conversation_history, history_note):
+    """
+    Stream a schedule/exam answer as newline-delimited JSON events:
+    
+    - 'data':  the structured schedule/exam data and the deterministic answer,
+               sent as soon as the UIS data is available
+    - 'token': incremental pieces of the LLM summary (only when a prompt is given)
+    - 'done':  the final answer and the updated conversation history
+    """
+    def generate():
+        yield json.dumps({'type': 'data', **payload}, ensure_ascii=False) + "\n"
+        
+        # The deterministic answer stays final unless the LLM summary completes
+        response_text = payload['response']
+        if prompt is not None:
+            parts = []
+            try:
+                for token in ai_service.stream_chat_with_ai(message, [prompt], agent_id):
+                    parts.append(token)
+                    yield json.dumps({'type': 'token', 'content': token}, ensure_ascii=False) + "\n"
+            except Exception as e:
+                logger.log_with_timestamp("STREAM ERROR", f"LLM summary failed: {str(e)}")
+                yield json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False) + "\n"
+            else:
+                if parts:
+                    response_text = "".join(parts)
+        
+        conversation_history.append({"role": "system", "content": history_note})
+        conversation_history.append({"role": "assistant", "content": response_text})
+        yield json.dumps({
+            'type': 'done',
+            'response': response_text,
+            'conversation_history': conversation_history
+        }, ensure_ascii=False) + "\n"
+    
+    return Response(generate(), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @chat_bp.route('/agents', methods=['GET'])
 def get_agents():
@@ -42,6 +200,9 @@ async def chat():
     try:
         data = request.json
         file_id = data.get('file_id')  # handle file context
+        # file_scope 'all' asks across every ready file of user_id
+        file_scope = data.get('file_scope')
+        user_id = data.get('user_id')
         message = data.get('message')
         conversation_history = data.get('conversation_history', [])
         agent_id = data.get('agent_id')  # Get agent_id from request
@@ -57,16 +218,18 @@ async def chat():
             )
         
         # Handle file context
-        if file_id:
+        if file_id or (file_scope == 'all' and user_id):
             # use file context handler
-            response, updated_history = await ai_service.chat_with_file_context(
-                message, file_id, conversation_history, agent_id
+            response, updated_history, sources = await ai_service.chat_with_file_context(
+                message, file_id, conversation_history, agent_id, user_id=user_id
             )
             return jsonify({
                 'response': response,
                 'conversation_history': updated_history,
                 'file_context_active': True,
                 'file_id': file_id,
+                'file_scope': 'file' if file_id else 'all',
+                'sources': sources,
                 'agent_id': agent_id
             })
         
@@ -211,7 +374,7 @@ async def chat():
                 
                 # Process both class schedule and exam schedule for the same date
                 # First, process class schedule
-                schedule_result = await schedule_service.get_schedule_by_semester(current_semester['hoc_ky'])
+                timetable = await schedule_service.get_timetable(current_semester['hoc_ky'])
                 date_info_tuple = schedule_service.extract_date_references(message)
                 
                 # Add safety check to handle None value from extract_date_references
@@ -231,6 +394,7 @@ async def chat():
                     )
                 
                 date_info_value = date_info_tuple[0]  # Get the actual date value (can be a date or a tuple of dates)
+                exam_index = await exam_schedule_service.get_exam_index(current_semester['hoc_ky'], False)
                 
                 # Log the extracted date information
                 if isinstance(date_info_value, tuple):
@@ -242,52 +406,23 @@ async def chat():
                     )
                     formatted_date_info = f"{start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}"
                     
-                    # For ranges, we'll focus on class schedule and not exam schedule
-                    # (exam schedules are usually more relevant for specific dates)
                     if date_info_tuple[1] in ['this_week', 'next_week', 'last_week', 'specific_week']:
-                        all_classes = []
                         days_in_range = (end_date - start_date).days + 1
                         days_to_fetch = min(days_in_range, 7)  # Limit to 7 days for week queries
+                        range_end = start_date + timedelta(days=days_to_fetch - 1)
                         
-                        # Check each day in the range for classes
-                        for i in range(days_to_fetch):
-                            current_date = start_date + timedelta(days=i)
-                            daily_classes = schedule_service.get_class_schedule(schedule_result, current_date)
-                            if daily_classes:
-                                for class_info in daily_classes:
-                                    # Add date information to each class
-                                    class_info['date'] = current_date.strftime('%d/%m/%Y')
-                                    class_info['day_of_week'] = current_date.strftime('%A')
-                                    all_classes.append(class_info)
-                        
-                        schedule_text = all_classes
-                        
-                        # Also get exam schedules for the date range
-                        logger.log_with_timestamp(
-                            "EXAM SCHEDULE", 
-                            f"Getting exam schedules for week: {start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}"
-                        )
-                        
-                        # Get exam data for the date range
-                        exam_data = await exam_schedule_service.get_exam_schedule_by_semester(current_semester['hoc_ky'], False)
-                        exams_in_range = exam_schedule_service.get_exams_by_date_range(exam_data, start_date, end_date)
-                        exam_text = exam_schedule_service.format_exam_schedule(exams_in_range) if exams_in_range else None
-                        exam_count = len(exams_in_range)
+                        sessions = timetable.sessions_between(start_date, range_end)
+                        exams = exam_index.between(start_date, end_date)
                         
                         logger.log_with_timestamp(
                             "EXAM SCHEDULE", 
-                            f"Found {exam_count} exams in the week"
+                            f"Found {len(exams)} exams in the week"
                         )
                     else:
                         # For other date ranges, just get the first day
-                        schedule_text = schedule_service.get_class_schedule(schedule_result, start_date)
-                        
-                        # Also get exam schedule for the start date
-                        date_str = start_date.strftime('%d/%m/%Y')
-                        exam_data = await exam_schedule_service.get_exam_schedule_by_semester(current_semester['hoc_ky'], False)
-                        exams_on_date = exam_schedule_service.get_exams_by_date(exam_data, date_str)
-                        exam_text = exam_schedule_service.format_exam_schedule(exams_on_date) if exams_on_date else None
-                        exam_count = len(exams_on_date)
+                        date_info_value = start_date
+                        sessions = schedule_service.get_class_schedule(timetable, start_date)
+                        exams = exam_index.on(start_date)
                 else:  # It's a single date
                     formatted_date_info = date_info_value.strftime('%d/%m/%Y')
                     logger.log_with_timestamp(
@@ -296,15 +431,18 @@ async def chat():
                         f"Type: {date_info_tuple[1]}"
                     )
                     
-                    # Get class schedule for the date
-                    schedule_text = schedule_service.get_class_schedule(schedule_result, date_info_value)
-                    
-                    # Also get exam schedule for the same date
-                    date_str = date_info_value.strftime('%d/%m/%Y')
-                    exam_data = await exam_schedule_service.get_exam_schedule_by_semester(current_semester['hoc_ky'], False)
-                    exams_on_date = exam_schedule_service.get_exams_by_date(exam_data, date_str)
-                    exam_text = exam_schedule_service.format_exam_schedule(exams_on_date) if exams_on_date else None
-                    exam_count = len(exams_on_date)
+                    sessions = schedule_service.get_class_schedule(timetable, date_info_value)
+                    exams = exam_index.on(date_info_value)
+                
+                # Render the compact records for the response payload
+                schedule_text = []
+                for session in sessions:
+                    class_info = session.to_dict()
+                    class_info['date'] = session.date.strftime('%d/%m/%Y')
+                    class_info['day_of_week'] = session.date.strftime('%A')
+                    schedule_text.append(class_info)
+                exam_text = exam_schedule_service.format_exam_schedule(exams) if exams else None
+                exam_count = len(exams)
                 
                 schedule_result = {
                     'date_info': formatted_date_info,
@@ -312,7 +450,8 @@ async def chat():
                     'original_text': date_info_tuple[2],
                     'schedule_text': schedule_text,
                     'exam_text': exam_text,
-                    'exam_count': exam_count
+                    'exam_count': exam_count,
+                    'exams': [exam.to_dict() for exam in exams]
                 }
                 
                 # Log the processing result (reduced verbosity)
@@ -321,131 +460,49 @@ async def chat():
                     f"Date: {schedule_result['date_info']} | Additional info: Type: {schedule_result['date_type']} | Original text: {schedule_result['original_text']}"
                 )
                 
-                # Format the schedule data for display
-                has_classes = isinstance(schedule_result['schedule_text'], list) and len(schedule_result['schedule_text']) > 0
-                has_exams = exam_count > 0
+                # Deterministic answer; also the fallback when the LLM call fails
+                template_response = schedule_renderer.render_schedule(
+                    sessions, exams, date_info_value, date_info_tuple[2]
+                )
                 
-                if not has_classes and not has_exams:
-                    # No classes or exams found for this date
-                    if date_info_tuple[2] == 'default':
-                        # User didn't specify a date clearly
-                        schedule_prompt = {
-                            "role": "system",
-                            "content": f"""
-                            You are a helpful study assistant for university students. The student asked about their schedule but didn't specify a clear date.
-                            Their query was: "{message}"
-                            
-                            Please respond in Vietnamese, politely asking them to specify which day or date they're asking about.
-                            Use a professional and respectful tone appropriate for university students - avoid using "em" and instead use more formal language.
-                            For example, they could clarify with "thứ 7 tuần này", "thứ 2 tuần sau", or a specific date.
-                            Your response should be friendly and helpful, encouraging them to provide more details so you can assist them better.
-                            """
-                        }
-                    else:
-                        # We understood the date, but nothing was found
-                        # Get friendly date representation
-                        if isinstance(date_info_value, tuple):
-                            date_repr = f"từ {formatted_date_info}"
-                        else:
-                            weekday_vn = schedule_service.get_vietnamese_weekday(date_info_value.weekday())
-                            date_repr = f"{weekday_vn}, ngày {formatted_date_info}"
-                        
-                        schedule_prompt = {
-                            "role": "system",
-                            "content": f"""
-                            You are a helpful study assistant. The student asked about their schedule for {date_repr}.
-                            After checking the system, no classes or exams were found for this date.
-                            
-                            Please respond in Vietnamese, letting them know there are no classes or exams scheduled for {date_repr}.
-                            Offer to check another date if they'd like. Be helpful and friendly in your response.
-                            """
-                        }
-                else:
-                    # We have schedule and/or exam data to share
-                    # Format schedule data
-                    formatted_schedule = ""
-                    if has_classes:
-                        # Format class schedule
-                        if isinstance(schedule_result['schedule_text'], list):
-                            for i, class_info in enumerate(schedule_result['schedule_text'], 1):
-                                # Add class details
-                                formatted_schedule += f"{i}. {class_info.get('ten_mon', '')} ({class_info.get('ma_mon', '')})\n"
-                                
-                                # Add English subject name if available
-                                if class_info.get('ten_mon_eg'):
-                                    formatted_schedule += f"    {class_info.get('ten_mon_eg')}\n"
-                                    
-                                # Add class time
-                                formatted_schedule += f"    {class_info.get('time', '')}\n"
-                                
-                                # Add room information
-                                formatted_schedule += f"    Phòng {class_info.get('room', '')}\n"
-                                
-                                # Add lecturer information with ID
-                                formatted_schedule += f"    {class_info.get('lecturer', '')}"
-                                if class_info.get('ma_giang_vien'):
-                                    formatted_schedule += f" (Mã GV: {class_info.get('ma_giang_vien')})"
-                                formatted_schedule += "\n"
-                                
-                                # Add credit hours if available
-                                if class_info.get('so_tin_chi'):
-                                    formatted_schedule += f"    Số tín chỉ: {class_info.get('so_tin_chi')}\n"
-
-                                # Add class date and thu_kieu_so
-                                formatted_schedule += f"    Ngày học: {class_info.get('ngay_hoc', '')}\n"
-                                thu_kieu_so = class_info.get('thu_kieu_so', '')
-                                if thu_kieu_so:
-                                    formatted_schedule += f"    Thứ {thu_kieu_so}\n"
-                                    
-                                formatted_schedule += "\n"
-                    
-                    # Prepare combined prompt with both schedule and exam info
-                    combined_data = ""
-                    
-                    if has_classes:
-                        combined_data += "LỊCH HỌC:\n" + formatted_schedule + "\n"
-                    
-                    if has_exams:
-                        combined_data += "LỊCH THI:\n" + schedule_result['exam_text']
-                    
-                    if not combined_data.strip():
-                        combined_data = "Không tìm thấy thông tin lớp học hoặc lịch thi cho ngày này."
-                    
-                    schedule_prompt = {
-                        "role": "system",
-                        "content": f"""
-                        You are a helpful study assistant. The student asked about their schedule.
-                        Here is the schedule information retrieved from the system:
-
-                        {combined_data}
-
-                        Please respond in Vietnamese, summarizing this information in a natural, 
-                        conversational way. Mention the date and add any relevant reminders 
-                        about being on time for classes or exams. 
-                        
-                        If there are both classes and exams, make sure to clearly distinguish between them.
-                        If there are exams, emphasize their importance and suggest preparing well in advance.
-                        
-                        Keep your response concise and friendly.
-                        """
-                    }
+                response_mode = data.get('response_mode') or SCHEDULE_RESPONSE_MODE
+                
+                # Streamed: send the data right away, the LLM summary follows as tokens
+                if data.get('stream'):
+                    schedule_prompt = None
+                    if response_mode == 'llm':
+                        schedule_prompt = build_schedule_prompt(
+                            message, sessions, exam_text, date_info_value, formatted_date_info, date_info_tuple[2]
+                        )
+                    return stream_structured_response(
+                        {
+                            'response': template_response,
+                            'schedule_data': schedule_result,
+                            'query_type': 'schedule',
+                            'response_mode': response_mode,
+                            'agent_id': agent_id
+                        },
+                        schedule_prompt, message, agent_id, conversation_history,
+                        f"Schedule data: {schedule_result.get('schedule_text')}\nExam data: {schedule_result.get('exam_text')}"
+                    )
                 
-                # Get AI to format the response nicely
-                try:
-                    enhanced_response, _ = ai_service.chat_with_ai(
-                        message, 
-                        [schedule_prompt],
-                        agent_id
+                if response_mode != 'llm':
+                    enhanced_response = template_response
+                else:
+                    schedule_prompt = build_schedule_prompt(
+                        message, sessions, exam_text, date_info_value, formatted_date_info, date_info_tuple[2]
                     )
-                except Exception as ai_error:
-                    # Log the error and generate fallback response
-                    logger.log_with_timestamp("SCHEDULE AI ERROR", f"Failed to get AI response: {str(ai_error)}")
                     
-                    # Generate a simple fallback response
-                    if not has_classes and not has_exams:
-                        enhanced_response = f"Xin chào, không có lớp học hay lịch thi nào vào {formatted_date_info}. Bạn có muốn kiểm tra ngày khác không?"
-                    else:
-                        enhanced_response = f"Lịch của bạn vào {formatted_date_info}:\n\n{combined_data}\n\nHãy chuẩn bị thật kỹ và đến đúng giờ nhé!"
+                    # Get AI to format the response nicely
+                    try:
+                        enhanced_response, _ = ai_service.chat_with_ai(
+                            message, 
+                            [schedule_prompt],
+                            agent_id
+                        )
+                    except Exception as ai_error:
+                        logger.log_with_timestamp("SCHEDULE AI ERROR", f"Failed to get AI response: {str(ai_error)}")
+                        enhanced_response = template_response
                 
                 # Add the information to the conversation history
                 conversation_history.append({
@@ -462,6 +519,7 @@ async def chat():
                     'schedule_data': schedule_result,
                     'conversation_history': conversation_history,
                     'query_type': 'schedule',
+                    'response_mode': response_mode,
                     'agent_id': agent_id
                 })
                 
@@ -506,10 +564,11 @@ async def chat():
                     raise Exception(f"Không thể lấy thông tin học kỳ: {semester_error}")
                 
                 # Process the exam schedule query
+                # Midterm/final and the semesters to search are read from the question
                 exam_result = await exam_schedule_service.process_exam_query(
                     message, 
                     current_semester['hoc_ky'],
-                    False  # Not midterm by default, could be made configurable
+                    semesters=ptit_auth_service.get_academic_year_semesters(current_semester['hoc_ky'])
                 )
                 
                 # Log the exam processing result
@@ -519,69 +578,42 @@ async def chat():
                     f"Found {exam_result['exam_count']} exams"
                 )
                 
-                # Create a contextualized response using AI
-                if exam_result['exam_count'] == 0:
-                    # No exams found
-                    exam_prompt = {
-                        "role": "system",
-                        "content": f"""
-                        You are a helpful study assistant. The student asked about their exam schedule.
-                        After checking the system, no exams were found matching their query: "{message}"
-                        
-                        Please respond in Vietnamese, letting them know no exams were found matching their criteria.
-                        If their query was for a specific date or date range ({exam_result['filter_value']}), 
-                        mention that time period in your response.
-                        Offer to check another date or subject if they'd like. Be helpful and friendly in your response.
-                        """
-                    }
-                else:
-                    # We have exam data to share
-                    # If it's a date range query, include that information
-                    date_info = ""
-                    week_context = ""
-                    if exam_result['filter_type'] == "date_range":
-                        date_info = f"cho khoảng thời gian {exam_result['filter_value']}"
-                        
-                        # Add additional context for week-based queries
-                        if "to" in exam_result['filter_value']:
-                            week_context = "Đây là danh sách tất cả các kỳ thi trong khoảng thời gian này. "
-                    elif exam_result['filter_type'] == "date":
-                        date_info = f"cho ngày {exam_result['filter_value']}"
-                    
-                    exam_prompt = {
-                        "role": "system",
-                        "content": f"""
-                        You are a helpful study assistant. The student asked about their exam schedule.
-                        Here is the exam information retrieved from the system {date_info}:
-
-                        {exam_result['exam_text']}
-
-                        {week_context}Please respond in Vietnamese, summarizing this information in a natural, 
-                        conversational way. Mention the date or date range if provided, along with any upcoming exams,
-                        their format, location and time.
-                        Add any relevant reminders about being prepared for exams.
-                        Keep your response concise and friendly.
-                        """
-                    }
+                # Deterministic answer; also the fallback when the LLM call fails
+                template_response = schedule_renderer.render_exams(exam_result)
                 
-                logger.log_with_timestamp("EXAM SCHEDULE PROMPT", exam_prompt['content'])
+                response_mode = data.get('response_mode') or SCHEDULE_RESPONSE_MODE
                 
-                # Get AI to format the response nicely
-                try:
-                    enhanced_response, _ = ai_service.chat_with_ai(
-                        message, 
-                        [exam_prompt],
-                        agent_id
+                # Streamed: send the data right away, the LLM summary follows as tokens
+                if data.get('stream'):
+                    exam_prompt = build_exam_prompt(message, exam_result) if response_mode == 'llm' else None
+                    return stream_structured_response(
+                        {
+                            'response': template_response,
+                            'exam_data': exam_result,
+                            'query_type': 'examschedule',
+                            'response_mode': response_mode,
+                            'agent_id': agent_id
+                        },
+                        exam_prompt, message, agent_id, conversation_history,
+                        exam_result['exam_text']
                     )
-                except Exception as ai_error:
-                    # Log the error
-                    logger.log_with_timestamp("EXAM SCHEDULE AI ERROR", f"Failed to get AI response: {str(ai_error)}")
+                
+                if response_mode != 'llm':
+                    enhanced_response = template_response
+                else:
+                    exam_prompt = build_exam_prompt(message, exam_result)
+                    logger.log_with_timestamp("EXAM SCHEDULE PROMPT", exam_prompt['content'])
                     
-                    # Generate a simple fallback response in Vietnamese
-                    if exam_result['exam_count'] == 0:
-                        enhanced_response = "Xin chào, không tìm thấy lịch thi nào phù hợp với yêu cầu của bạn. Bạn có muốn tìm kiếm với thông tin khác không?"
-                    else:
-                        enhanced_response = f"Lịch thi của bạn:\n\n{exam_result['exam_text']}\n\nHãy chuẩn bị thật kỹ và đến đúng giờ nhé!"
+                    # Get AI to format the response nicely
+                    try:
+                        enhanced_response, _ = ai_service.chat_with_ai(
+                            message, 
+                            [exam_prompt],
+                            agent_id
+                        )
+                    except Exception as ai_error:
+                        logger.log_with_timestamp("EXAM SCHEDULE AI ERROR", f"Failed to get AI response: {str(ai_error)}")
+                        enhanced_response = template_response
                 
                 # Add the exam information to the conversation history
                 conversation_history.append({
@@ -598,6 +630,7 @@ async def chat():
                     'exam_data': exam_result,
                     'conversation_history': conversation_history,
                     'query_type': 'examschedule',
+                    'response_mode': response_mode,
                     'agent_id': agent_id
                 })
                 
@@ -1,11 +1,19 @@
 from flask import Blueprint, request, jsonify
 from ..services.file_service import FileService
+from ..services.embedding_service import get_embedding_service
+from ..services.ingestion_service import IngestionService, IngestionQueueFull
+from ..services.reindexer import EmbeddingReindexer
+from ..services.extractors import ExtractionError
+from ..services.vector_index import vector_indexes
+from ..lib.http_client import get_http_client
 from ..utils.logger import Logger
 import traceback
 
 file_bp = Blueprint('file', __name__)
 logger = Logger()
 service = FileService()
+ingestion_service = IngestionService(service)
+reindexer = EmbeddingReindexer(service)
 
 @file_bp.route('/upload', methods=['POST'])
 def upload_file():
@@ -35,57 +43,45 @@ def upload_file():
     logger.log_with_timestamp('FILE_UPLOAD', f'File received: {file.filename}, Content-Type: {file.content_type}, Size: {file.content_length or "unknown"} bytes')
 
     try:
-        # extract text content (assume text extraction earlier done by caller)
-        from ..services.file_service import FileService
-        
-        # PDF files should be processed differently than text files
-        if file.content_type == 'application/pdf':
-            try:
-                logger.log_with_timestamp('FILE_UPLOAD', 'Processing PDF file...')
-                # For PDF files, we need to use a PDF parser
-                import PyPDF2
-                import io
-                
-                # Create a file-like object from the uploaded file
-                pdf_file = io.BytesIO(file.read())
-                
-                # Create PDF reader
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                
-                # Extract text from all pages
-                text_content = ""
-                for page in pdf_reader.pages:
-                    text_content += page.extract_text() + "\n"
-                    
-                logger.log_with_timestamp('FILE_UPLOAD', f'Successfully extracted {len(text_content)} characters from PDF')
-                content = text_content
-            except ImportError:
-                logger.log_with_timestamp('FILE_UPLOAD_ERROR', 'PyPDF2 library not installed, trying fallback method')
-                # Fallback to binary read if PyPDF2 is not available
-                file.seek(0)  # Reset file pointer to beginning
-                content = file.read().decode('utf-8', errors='ignore')
-        else:
-            # For text files, just read as text
-            content = file.read().decode('utf-8', errors='ignore')
-            logger.log_with_timestamp('FILE_UPLOAD', f'Extracted {len(content)} characters from text file')
-        
-        # Log content sample for debugging
-        content_sample = content[:200] + "..." if len(content) > 200 else content
-        logger.log_with_timestamp('FILE_UPLOAD', f'Content sample: {content_sample}')
-        
-        # Reset file pointer for FileService
-        file.seek(0)
-        
-        # process and save - Đã chuyển về gọi hàm đồng bộ
-        logger.log_with_timestamp('FILE_UPLOAD', 'Saving to Supabase...')
-        file_id = service.save_file_and_chunks_to_supabase(user_id, file, content)
-        logger.log_with_timestamp('FILE_UPLOAD', f'Successfully saved file with ID: {file_id}')
-        return jsonify({'success': True, 'file_id': file_id, 'filename': file.filename})
+        # Extraction, chunking and embedding continue in the background
+        path = request.claim_upload(file)
+        job = ingestion_service.submit(user_id, file.filename, file.content_type, path)
+        logger.log_with_timestamp('FILE_UPLOAD', f'Queued file with ID: {job.file_id}')
+        return jsonify({'success': True, 'file_id': job.file_id, 'filename': file.filename, 'status': job.status}), 202
+    except IngestionQueueFull as e:
+        logger.log_with_timestamp('FILE_UPLOAD_ERROR', str(e))
+        return jsonify({'error': str(e)}), 503
+    except ExtractionError as e:
+        logger.log_with_timestamp('FILE_UPLOAD_ERROR', str(e))
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         error_trace = traceback.format_exc()
         logger.log_with_timestamp('FILE_UPLOAD_ERROR', f'Error: {str(e)}\nTraceback: {error_trace}')
         return jsonify({'error': str(e)}), 500
 
+@file_bp.route('/<uuid:file_id>/status', methods=['GET'])
+def file_status(file_id):
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Missing user_id'}), 400
+    try:
+        status = ingestion_service.get_status(str(file_id), user_id)
+        if status is None:
+            return jsonify({'error': 'File not found'}), 404
+        return jsonify(status)
+    except Exception as e:
+        logger.log_with_timestamp('FILE_ROUTE_ERROR', str(e))
+        return jsonify({'error': str(e)}), 500
+
+@file_bp.route('/<uuid:file_id>/cancel', methods=['POST'])
+def cancel_file(file_id):
+    user_id = request.args.get('user_id') or request.form.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Missing user_id'}), 400
+    if not ingestion_service.cancel(str(file_id), user_id):
+        return jsonify({'error': 'No ingestion in progress for this file'}), 409
+    return jsonify({'success': True, 'status': 'cancelling'})
+
 @file_bp.route('/list', methods=['GET'])
 def list_files():
     user_id = request.args.get('user_id')
@@ -105,11 +101,21 @@ def delete_file(file_id):
     if not user_id:
         return jsonify({'error': 'Missing user_id'}), 400
     try:
-        # delete metadata (cascade deletes chunks)
-        res = service.supabase.table('user_files').delete().eq('id', str(file_id)).eq('user_id', user_id).execute()
-        if res.error:
-            raise Exception(res.error.message)
+        # stop a running ingestion first so it doesn't keep inserting chunks
+        ingestion_service.cancel(str(file_id), user_id)
+        # delete metadata (cascade deletes chunks that no other file references)
+        service.delete_file(str(file_id), user_id)
         return jsonify({'success': True})
     except Exception as e:
         logger.log_with_timestamp('FILE_ROUTE_ERROR', str(e))
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@file_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Embedding model, vector cache, re-indexing and outbound HTTP metrics of this process"""
+    return jsonify({
+        'embedding': get_embedding_service().get_metrics(),
+        'vector_cache': vector_indexes.get_metrics(),
+        'reindex': reindexer.get_status(),
+        'http_client': get_http_client().get_stats()
+    })
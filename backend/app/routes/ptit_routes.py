@@ -7,6 +7,16 @@ from ..utils.logger import Logger
 ptit_bp = Blueprint('ptit', __name__)
 logger = Logger()
 
+def snapshot_response(snapshot):
+    """JSON response for a stored timetable/exam snapshot"""
+    index, fetched_at = snapshot
+    return jsonify({
+        'success': True,
+        'data': index.to_api(),
+        'source': 'snapshot',
+        'fetched_at': fetched_at.isoformat()
+    })
+
 auth_service = PTITAuthService()
 schedule_service = ScheduleService(auth_service)
 exam_schedule_service = ExamScheduleService(auth_service)
@@ -43,6 +53,16 @@ async def get_schedule():
                 'error': 'Not authenticated. Please log in first.'
             }), 401
 
+        # ?source=snapshot answers from the stored snapshot without calling UIS
+        if request.args.get('source') == 'snapshot':
+            snapshot = await schedule_service.get_snapshot(None)
+            if not snapshot:
+                return jsonify({
+                    'success': False,
+                    'error': 'No schedule snapshot available'
+                }), 404
+            return snapshot_response(snapshot)
+
         # Get current semester schedule
         schedule_data = await schedule_service.get_schedule_by_semester(None)
         if not schedule_data:
@@ -53,11 +73,16 @@ async def get_schedule():
 
         return jsonify({
             'success': True,
-            'data': schedule_data
+            'data': schedule_data,
+            'source': 'uis'
         })
 
     except Exception as e:
         logger.log_with_timestamp("SCHEDULE ERROR", str(e))
+        # UIS unavailable: fall back to the last snapshot
+        snapshot = await schedule_service.get_snapshot(None)
+        if snapshot:
+            return snapshot_response(snapshot)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -76,6 +101,16 @@ async def get_exam_schedule():
         # Get parameters with defaults
         hoc_ky = request.args.get('semester', None)
         is_giua_ky = request.args.get('is_midterm', 'false').lower() == 'true'
+
+        # ?source=snapshot answers from the stored snapshot without calling UIS
+        if request.args.get('source') == 'snapshot':
+            snapshot = await exam_schedule_service.get_snapshot(hoc_ky, is_giua_ky)
+            if not snapshot:
+                return jsonify({
+                    'success': False,
+                    'error': 'No exam schedule snapshot available'
+                }), 404
+            return snapshot_response(snapshot)
         
         # Get exam schedule data
         exam_data = await exam_schedule_service.get_exam_schedule_by_semester(hoc_ky, is_giua_ky)
@@ -87,11 +122,19 @@ async def get_exam_schedule():
 
         return jsonify({
             'success': True,
-            'data': exam_data
+            'data': exam_data,
+            'source': 'uis'
         })
 
     except Exception as e:
         logger.log_with_timestamp("EXAM SCHEDULE ERROR", str(e))
+        # UIS unavailable: fall back to the last snapshot
+        snapshot = await exam_schedule_service.get_snapshot(
+            request.args.get('semester', None),
+            request.args.get('is_midterm', 'false').lower() == 'true'
+        )
+        if snapshot:
+            return snapshot_response(snapshot)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -1,6 +1,8 @@
 import asyncio
 from openai import OpenAI
 from .file_service import FileService
+from .context_packer import ContextPacker
+from .file_outline import is_overview_question
 from .web_search_service import WebSearchService
 from .web_scraper_service import WebScraperService
 import os
@@ -8,6 +10,7 @@ import httpx
 from ..utils.logger import Logger
 import zlib
 from ..config.agents import get_agent
+from ..config.settings import CONTEXT_TOKEN_BUDGET, FILE_SUMMARY_MODEL
 import json
 
 logger = Logger()
@@ -34,6 +37,9 @@ class AiService:
                 http_client=http_client
             )
             
+        # Shares the process-wide embedding model
+        self.file_service = FileService()
+        self.context_packer = ContextPacker(self.file_service.embeddings.count_tokens)
         # Initialize web search service
         self.web_search_service = WebSearchService()
         # Initialize web scraper service
@@ -143,15 +149,91 @@ class AiService:
                 error_response = str(error_response)
             return error_response, conversation_history
 
-    async def chat_with_file_context(self, message, file_id, conversation_history=None, agent_id=None):
+    def stream_chat_with_ai(self, message, conversation_history=None, agent_id=None):
+        """
+        Stream the AI model's response piece by piece.
+        
+        Args:
+            message (str): The user's message
+            conversation_history (list, optional): Previous messages in the conversation
+            agent_id (str, optional): ID of the agent to use
+        
+        Yields:
+            str: Incremental pieces of the AI's response
+        """
+        if conversation_history is None:
+            conversation_history = []
+        
+        # Get agent configuration
+        agent_config = get_agent(agent_id)
+        model = agent_config["model"]
+        temperature = agent_config.get("temperature", 0.7)
+        
+        logger.log_with_timestamp(
+            'AI_SERVICE', 
+            f'Streaming with agent: {agent_config["display_name"]}',
+            f'Model: {model}, Temperature: {temperature}'
+        )
+        
+        messages = conversation_history + [{"role": "user", "content": message}]
+        
+        try:
+            stream = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            logger.log_with_timestamp('AI_SERVICE_ERROR', f'Streaming error: {str(e)}')
+            raise
+
+    def summarize_file(self, file_id):
+        """
+        Write a short LLM summary of a file from its outline, for overview questions.
+
+        Args:
+            file_id (str): A ready file that owns its chunks
+
+        Returns:
+            str: The summary, or None when the file has no outline
+        """
+        overview = self.file_service.get_file_overview(file_id)
+        if not overview:
+            return None
+        model = FILE_SUMMARY_MODEL or get_agent(None)["model"]
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": "You summarize study documents. From the outline, keywords and opening text below, write a summary of 3 to 5 sentences saying what the document is about and what it covers, in the language of the document."},
+                {"role": "user", "content": overview}
+            ],
+            temperature=0.3,
+        )
+        if not (response and getattr(response, 'choices', None)):
+            raise ValueError(f'Invalid response structure: {response}')
+        summary = (response.choices[0].message.content or '').strip()
+        if summary:
+            self.file_service.save_file_summary(file_id, summary)
+            logger.log_with_timestamp('AI_SERVICE', f'Summary of {file_id} written with {model}', f'{len(summary)} characters')
+        return summary or None
+
+    async def chat_with_file_context(self, message, file_id, conversation_history=None, agent_id=None, user_id=None):
         """
         Handle user message with file context: retrieve relevant chunks and query AI.
         
         Args:
             message (str): The user's message
-            file_id (str): ID of the file to use as context
+            file_id (str): ID of the file to use as context, None to search all files of user_id
             conversation_history (list, optional): Previous messages in the conversation
             agent_id (str, optional): ID of the agent to use
+            user_id (str, optional): Owner of the files, for questions across all of them
+
+        Returns:
+            tuple: (response, conversation history, names of the files the excerpts come from)
         """
         if conversation_history is None:
             conversation_history = []
@@ -168,23 +250,47 @@ class AiService:
             f'Model: {model}, Temperature: {temperature}'
         )
             
+        sources = []
         try:
+            hits = []
+            overview = None
+            if file_id and is_overview_question(message):
+                # Câu hỏi tổng quát về cả file: dùng outline/tóm tắt tính sẵn lúc ingest, không cần tìm kiếm
+                overview = self.file_service.get_file_overview(file_id)
             # Retrieve relevant chunks
-            file_service = FileService()
             # Bỏ từ khóa await vì search_relevant_chunks_in_supabase không phải là hàm async
-            chunks = file_service.search_relevant_chunks_in_supabase(message, file_id)
+            if overview:
+                logger.log_with_timestamp('AI_SERVICE', f'Answering from the outline of {file_id}')
+            elif file_id:
+                hits = self.file_service.search_chunk_hits(message, file_id) or []
+                if not hits:
+                    # Không tìm thấy đoạn nào phù hợp: outline thay cho các chunks ngẫu nhiên
+                    overview = self.file_service.get_file_overview(file_id)
+            else:
+                # Tìm trên tất cả các file của người dùng, mỗi đoạn trích kèm tên file
+                hits = self.file_service.search_user_chunk_hits(message, user_id) or []
             
-            # Kiểm tra xem chunks có phải là None không
-            if chunks is None:
-                chunks = []
-                
             # Log thông tin chunks để debug
-            logger.log_with_timestamp('AI_SERVICE', f'Retrieved {len(chunks)} chunks for query: "{message[:30]}..."')
+            logger.log_with_timestamp('AI_SERVICE', f'Retrieved {len(hits)} chunks for query: "{message[:30]}..."')
+
+            # Gộp các chunks liền kề, bỏ phần lặp lại và giới hạn theo ngân sách token của agent
+            packed = self.context_packer.pack(hits, agent_config.get("context_tokens", CONTEXT_TOKEN_BUDGET))
+            logger.log_with_timestamp(
+                'AI_SERVICE',
+                f'Packed {packed.chunks_used}/{packed.chunks_retrieved} chunks into {packed.passages} passages',
+                f'{packed.tokens} tokens, saved {packed.tokens_saved} of {packed.retrieved_tokens}'
+            )
                 
             # Build system prompt
-            if chunks:
-                context = "\n\n---\n\n".join(chunks)
+            if overview:
+                system_content = f"You are a helpful study assistant. User uploaded a file and asks about it.\nHere is an overview of the file (outline, keywords and summary or opening text):\n{overview}\nAnswer based only on the above. If the question needs details the overview doesn't have, say so and suggest asking about a specific section."
+            elif packed.text and file_id:
+                context = packed.text
                 system_content = f"You are a helpful study assistant. User uploaded a file and asks about its content.\nHere are relevant excerpts from the file:\n{context}\nAnswer based only on the above."
+            elif packed.text:
+                # Chỉ các file có đoạn trích thực sự nằm trong prompt
+                sources = packed.sources
+                system_content = f"You are a helpful study assistant. User uploaded several files and asks about their content.\nHere are relevant excerpts, each starting with [file name]:\n{packed.text}\nAnswer based only on the above and name the file each piece of information comes from."
             else:
                 system_content = "You are a helpful study assistant. User asked about an uploaded file, but no relevant content was found. Please inform them you cannot find info."
                 
@@ -214,14 +320,14 @@ class AiService:
             # Update history
             conversation_history.append({"role":"user","content":message})
             conversation_history.append({"role":"assistant","content":ai_response})
-            return ai_response, conversation_history
+            return ai_response, conversation_history, sources
             
         except Exception as e:
             logger.log_with_timestamp('AI_SERVICE_ERROR', f'Error in chat_with_file_context: {str(e)}')
             error_response = "Sorry, I encountered an error while processing your request."
             conversation_history.append({"role":"user","content":message})
             conversation_history.append({"role":"assistant","content":error_response})
-            return error_response, conversation_history
+            return error_response, conversation_history, sources
 
     async def chat_with_web_search(self, message, conversation_history=None, agent_id=None, chat_id=None):
         """
@@ -0,0 +1,128 @@
+"""
+BM25 keyword index of a file's chunks.
+
+Tokens are lower-cased and folded to ASCII with unidecode, so "lập lịch" and
+"lap lich" match the same chunks. The index is built while a file is ingested,
+persisted as JSON next to the chunks and loaded together with the vector index.
+"""
+import math
+import re
+import sys
+from collections import Counter
+import numpy as np
+from unidecode import unidecode
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall(unidecode(text.lower())) if len(token) > 1]
+
+
+class BM25Builder:
+    """Collects term frequencies chunk by chunk"""
+
+    def __init__(self):
+        self.doc_ids = []
+        self.doc_lengths = []
+        self.postings = {}
+
+    def add(self, doc_id, text):
+        tokens = tokenize(text)
+        position = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            self.postings.setdefault(term, []).append((position, tf))
+
+    def build(self):
+        postings = {
+            term: (np.array([p for p, _ in entries], dtype=np.int32), np.array([tf for _, tf in entries], dtype=np.float32))
+            for term, entries in self.postings.items()
+        }
+        return BM25Index(self.doc_ids, self.doc_lengths, postings)
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring.
+
+    Args:
+        doc_ids (list): Chunk index of each document
+        doc_lengths (list): Token count of each document
+        postings (dict): term -> (document positions, term frequencies) arrays
+    """
+
+    def __init__(self, doc_ids, doc_lengths, postings, k1=1.5, b=0.75):
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self.avg_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+
+    @property
+    def nbytes(self):
+        return (self.doc_ids.nbytes + self.doc_lengths.nbytes
+                + sum(sys.getsizeof(term) + docs.nbytes + tfs.nbytes for term, (docs, tfs) in self.postings.items()))
+
+    def search(self, query, top_k=10):
+        """
+        Top-k documents for a query.
+
+        Returns:
+            list: (score, document position) pairs, best first, only positive scores
+        """
+        count = len(self.doc_ids)
+        if not count:
+            return []
+        scores = np.zeros(count, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / (self.avg_length or 1.0))
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            docs, tfs = posting
+            idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        k = min(top_k, len(matched))
+        best = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        best = best[np.argsort(-scores[best])]
+        return [(float(scores[position]), int(position)) for position in best]
+
+    def to_compact(self):
+        """JSON-serializable form for the file_keyword_indexes table"""
+        return {
+            'doc_ids': self.doc_ids.tolist(),
+            'doc_lengths': self.doc_lengths.astype(int).tolist(),
+            'postings': {term: [docs.tolist(), tfs.astype(int).tolist()] for term, (docs, tfs) in self.postings.items()}
+        }
+
+    @classmethod
+    def from_compact(cls, compact):
+        postings = {
+            term: (np.array(docs, dtype=np.int32), np.array(tfs, dtype=np.float32))
+            for term, (docs, tfs) in compact.get('postings', {}).items()
+        }
+        return cls(compact.get('doc_ids', []), compact.get('doc_lengths', []), postings)
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Merge ranked lists of ids into one ranking.
+
+    Args:
+        rankings (list): Lists of ids, best first
+        k (int): Damping constant of RRF
+
+    Returns:
+        list: ids ordered by fused score
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
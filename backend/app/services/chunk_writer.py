@@ -0,0 +1,131 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from ..config.settings import CHUNK_INSERT_MAX_BYTES, CHUNK_INSERT_CONCURRENCY, CHUNK_INSERT_RETRIES
+from ..utils.logger import Logger
+
+logger = Logger()
+
+
+def _record_bytes(record):
+    """Rough JSON size of a record, without serializing it"""
+    return sum(len(str(value)) + len(key) + 6 for key, value in record.items())
+
+
+class ChunkWriter:
+    """
+    Bulk writer for file_chunks rows.
+
+    Records are grouped into batches of about max_batch_bytes, at most
+    max_in_flight batches are sent at once on worker threads while the caller
+    keeps producing records. Batches are upserted on (file_id, embedding_version,
+    chunk_index), so a retried batch that had in fact been written doesn't create duplicates.
+
+    Use as a context manager or call close(): it waits for every batch and raises
+    the first error, so the file is only marked ready when all chunks committed.
+
+    Args:
+        client: Supabase client
+        table (str): Table to write to
+        on_conflict (str): Unique columns of a record
+    """
+
+    def __init__(self, client, table='file_chunks', on_conflict='file_id,embedding_version,chunk_index',
+                 max_batch_bytes=CHUNK_INSERT_MAX_BYTES, max_in_flight=CHUNK_INSERT_CONCURRENCY,
+                 retries=CHUNK_INSERT_RETRIES, backoff=0.5):
+        self.client = client
+        self.table = table
+        self.on_conflict = on_conflict
+        self.max_batch_bytes = max_batch_bytes
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='chunk-writer')
+        self._in_flight = set()
+        self._batch = []
+        self._batch_bytes = 0
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.committed = 0
+        self.batches = 0
+        self.bytes = 0
+        self.retried = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, record):
+        size = _record_bytes(record)
+        if self._batch and self._batch_bytes + size > self.max_batch_bytes:
+            self._submit()
+        self._batch.append(record)
+        self._batch_bytes += size
+
+    def _submit(self):
+        batch, size = self._batch, self._batch_bytes
+        self._batch, self._batch_bytes = [], 0
+        # Bound the batches held in memory and in flight
+        while len(self._in_flight) >= self.max_in_flight:
+            done, self._in_flight = wait(self._in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+        self._in_flight.add(self._executor.submit(self._send, batch, size))
+
+    def _send(self, batch, size):
+        for attempt in range(self.retries + 1):
+            try:
+                self.client.table(self.table).upsert(batch, on_conflict=self.on_conflict).execute()
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt * (1 + random.random())
+                logger.log_with_timestamp(
+                    'CHUNK_WRITER',
+                    f'Batch of {len(batch)} rows failed ({str(e)}), retry {attempt + 1}/{self.retries} in {delay:.1f}s'
+                )
+                with self._lock:
+                    self.retried += 1
+                time.sleep(delay)
+        with self._lock:
+            self.committed += len(batch)
+            self.batches += 1
+            self.bytes += size
+
+    def close(self):
+        """Send the last batch and wait for all of them, raising the first failure"""
+        try:
+            if self._batch:
+                self._submit()
+            for future in self._in_flight:
+                future.result()
+            self._in_flight = set()
+        except Exception:
+            self.abort()
+            raise
+        self._executor.shutdown()
+
+    def abort(self):
+        """Drop queued batches and wait for the ones being sent"""
+        self._batch = []
+        for future in self._in_flight:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+
+    def get_stats(self):
+        seconds = time.perf_counter() - self._started
+        return {
+            'rows': self.committed,
+            'batches': self.batches,
+            'bytes': self.bytes,
+            'retries': self.retried,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(self.committed / seconds, 1) if seconds > 0 else None
+        }
@@ -0,0 +1,250 @@
+"""
+Structure-aware chunking of extracted document text.
+
+Text is split into sentences (paragraph breaks, bullet lines, heading lines and
+sentence punctuation, with Vietnamese and English abbreviations kept intact) and packed
+into windows measured in tokens of the embedding model. Every chunk records
+on which pages it lies. Chunks don't repeat each other's text: neighbouring
+chunks are joined again by chunk_index when a prompt is packed
+(see context_packer.py).
+"""
+import math
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from ..config.settings import CHUNK_MAX_TOKENS
+from .file_outline import heading_level
+
+# Paragraph break, a line starting a bullet/numbered item, or the whitespace after sentence punctuation
+_BOUNDARY = re.compile(
+    r'(?P<para>\n[ \t\r]*\n\s*)'
+    r'|(?P<bullet>\n(?=[ \t]*(?:[•\-\*\+–]|\d{1,2}(?:\.\d{1,2})*[.)])\s))'
+    r'|(?P<sent>(?<=[.!?…])["\'”’)\]]*\s+)'
+)
+_WORD = re.compile(r'\S+')
+# "1." or "2.3." alone at the start of a line numbers an item, it doesn't end a sentence
+_ITEM_NUMBER = re.compile(r'(?:\d{1,3}\.)+')
+# Characters that can open a new sentence besides upper-case letters and digits
+_OPENERS = set('"“\'‘([•-–')
+# A dot after these doesn't end the sentence
+ABBREVIATIONS = {
+    'tp', 'ths', 'ts', 'pgs', 'gs', 'cn', 'ks', 'bs', 'th', 'tr', 'st', 'vd', 'v.v', 'q', 'p',
+    'đh', 'đhqg', 'nxb', 'gv', 'sv', 'tt', 'hcm',
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'e.g', 'i.e', 'etc', 'fig', 'no', 'vs', 'eq', 'ch', 'sec',
+}
+_SEPARATORS = {'para': '\n\n', 'bullet': '\n', 'sent': ' '}
+# Unfinished text kept between pieces; longer runs without a boundary are cut here
+_MAX_CARRY = 20000
+
+
+@dataclass
+class Chunk:
+    """A window of whole sentences"""
+    index: int
+    text: str
+    page_start: int
+    page_end: int
+    token_count: int
+
+    def to_record(self):
+        return {
+            'chunk_index': self.index,
+            'content': self.text,
+            'page_start': self.page_start,
+            'page_end': self.page_end,
+            'token_count': self.token_count
+        }
+
+
+@dataclass
+class _Segment:
+    text: str
+    separator: str
+    page: int = None
+    tokens: int = 0
+
+
+def _ends_with_abbreviation(text, end):
+    """Whether the word right before text[end] is an abbreviation or an initial"""
+    words = text[max(0, end - 12):end].split()
+    word = words[-1].rstrip('.!?…') if words else ''
+    if len(word) == 1 and word.isalpha():
+        return True
+    return word.lower() in ABBREVIATIONS
+
+
+def split_sentences(text, separator='\n\n'):
+    """
+    Split text into sentences.
+
+    Args:
+        text (str): Text to split
+        separator (str): Separator in front of the first sentence
+
+    Returns:
+        list: (start, end, separator) with whitespace trimmed, separator is what
+        divides the sentence from the previous one ('\\n\\n', '\\n' or ' ')
+    """
+    segments = []
+    pos = 0
+    for match in _BOUNDARY.finditer(text):
+        kind = match.lastgroup
+        # Spaces before a blank line make the paragraph break look like a sentence break
+        if kind == 'sent' and match.group().count('\n') >= 2:
+            kind = 'para'
+        if kind == 'sent':
+            next_char = text[match.end():match.end() + 1]
+            if next_char and not (next_char.isupper() or next_char.isdigit() or next_char in _OPENERS):
+                continue
+            if _ends_with_abbreviation(text, match.start()):
+                continue
+            line_start = text.rfind('\n', 0, match.start()) + 1
+            if _ITEM_NUMBER.fullmatch(text[line_start:match.start()].strip()):
+                continue
+        _append_sentence(segments, text, pos, match.start(), separator)
+        separator = _SEPARATORS[kind]
+        pos = match.end()
+    _append_sentence(segments, text, pos, len(text), separator)
+    return segments
+
+
+def _append_sentence(segments, text, start, end, separator):
+    """
+    Append a sentence, taking out its heading lines as paragraphs of their own.
+
+    PDF pages separate lines with single line breaks, so a heading and the text
+    under it come as one sentence; whitespace is collapsed later, and the heading
+    would be lost for the outline and glued to the next sentence.
+    """
+    line_start = start
+    newline = text.find('\n', line_start, end)
+    while newline != -1:
+        if heading_level(text[line_start:newline]) is not None:
+            _append_trimmed(segments, text, start, line_start, separator)
+            _append_trimmed(segments, text, line_start, newline, '\n\n')
+            start, separator = newline + 1, '\n\n'
+        line_start = newline + 1
+        newline = text.find('\n', line_start, end)
+    _append_trimmed(segments, text, start, end, separator)
+
+
+def _append_trimmed(segments, text, start, end, separator):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if start < end:
+        segments.append((start, end, separator))
+
+
+class Chunker:
+    """
+    Streaming chunker.
+
+    Args:
+        count_tokens (callable): Returns the token count of each text in a list
+        max_tokens (int): Largest chunk, in tokens
+    """
+
+    def __init__(self, count_tokens, max_tokens=CHUNK_MAX_TOKENS):
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self._buffer = ''
+        self._buffer_offset = 0
+        self._buffer_separator = '\n\n'
+        # (offset, page) where each page starts
+        self._page_offsets = []
+        self._page_numbers = []
+        self._current = []
+        self._current_tokens = 0
+        self._index = 0
+
+    def chunks(self, pieces):
+        """
+        Chunk a stream of text pieces.
+
+        Args:
+            pieces (iterable): (page number or None, text) pairs in document order
+
+        Yields:
+            Chunk: Chunks in document order
+        """
+        for page, text in pieces:
+            if page is not None:
+                self._page_offsets.append(self._buffer_offset + len(self._buffer))
+                self._page_numbers.append(page)
+            self._buffer += text
+            yield from self._pack(self._take_segments(final=False))
+        yield from self._pack(self._take_segments(final=True))
+        if self._current:
+            yield self._emit()
+
+    def _page_at(self, offset):
+        i = bisect_right(self._page_offsets, offset) - 1
+        return self._page_numbers[i] if i >= 0 else None
+
+    def _take_segments(self, final):
+        """Split the buffer into sentences, keeping the last, maybe unfinished, one buffered"""
+        spans = split_sentences(self._buffer, self._buffer_separator)
+        if not final and spans and len(self._buffer) - spans[-1][0] <= _MAX_CARRY:
+            spans, carry = spans[:-1], spans[-1]
+        else:
+            final = True
+        segments = [
+            _Segment(' '.join(self._buffer[start:end].split()), separator, self._page_at(self._buffer_offset + start))
+            for start, end, separator in spans
+        ]
+        if final:
+            self._buffer_offset += len(self._buffer)
+            self._buffer = ''
+            self._buffer_separator = '\n\n'
+        else:
+            self._buffer_offset += carry[0]
+            self._buffer = self._buffer[carry[0]:]
+            self._buffer_separator = carry[2]
+        if segments:
+            for segment, tokens in zip(segments, self.count_tokens([s.text for s in segments])):
+                segment.tokens = tokens
+        return segments
+
+    def _split_long(self, segment):
+        """Cut a sentence longer than max_tokens at word boundaries"""
+        words = list(_WORD.finditer(segment.text))
+        parts = math.ceil(segment.tokens / (self.max_tokens * 0.9))
+        per_part = math.ceil(len(words) / parts)
+        for i in range(0, len(words), per_part):
+            group = words[i:i + per_part]
+            yield _Segment(segment.text[group[0].start():group[-1].end()],
+                           segment.separator if i == 0 else ' ', segment.page,
+                           math.ceil(segment.tokens * len(group) / len(words)))
+
+    def _pack(self, segments):
+        for segment in segments:
+            parts = self._split_long(segment) if segment.tokens > self.max_tokens else [segment]
+            for part in parts:
+                full = self._current_tokens + part.tokens > self.max_tokens
+                # Prefer to end a chunk where a paragraph ends
+                paragraph_end = part.separator == '\n\n' and self._current_tokens >= self.max_tokens // 2
+                if self._current and (full or paragraph_end):
+                    yield self._emit()
+                self._current.append(part)
+                self._current_tokens += part.tokens
+
+    def _emit(self):
+        segments = self._current
+        text = segments[0].text
+        for segment in segments[1:]:
+            text += segment.separator + segment.text
+
+        pages = [s.page for s in segments if s.page is not None]
+        chunk = Chunk(
+            index=self._index,
+            text=text,
+            page_start=pages[0] if pages else None,
+            page_end=pages[-1] if pages else None,
+            token_count=self._current_tokens
+        )
+        self._index += 1
+        self._current = []
+        self._current_tokens = 0
+        return chunk
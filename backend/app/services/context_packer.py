@@ -0,0 +1,170 @@
+"""
+Packing of retrieved chunks into the file context of a prompt.
+
+Retrieved chunks often neighbour each other in the document. Chunks from the
+sentence chunker continue one another, and chunks stored with the old 500/400
+character windows repeat 100 characters of each other. Sending them one by one
+pays for the repeated text and the separators between them. The packer merges
+neighbouring chunks into passages, drops the repeated text, orders passages
+by their position in the document and fills a token budget greedily in
+relevance order. Hits from several files carry the file name: chunks are only
+merged within a file, and each passage starts with the name of its file.
+"""
+import math
+from dataclasses import dataclass, field
+from ..config.settings import CONTEXT_TOKEN_BUDGET
+
+SEPARATOR = "\n\n---\n\n"
+# Shortest text overlap that makes two chunks without positions neighbours
+MIN_OVERLAP_CHARS = 20
+
+
+def text_overlap(left, right):
+    """Length of the longest suffix of left that is a prefix of right (at most half of either)"""
+    limit = min(len(left), len(right)) // 2
+    if limit < MIN_OVERLAP_CHARS:
+        return 0
+    probe = right[:MIN_OVERLAP_CHARS]
+    start = left.find(probe, len(left) - limit)
+    while start != -1:
+        length = len(left) - start
+        if right.startswith(left[start:]) and length <= limit:
+            return length
+        start = left.find(probe, start + 1)
+    return 0
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    # Tokens of all retrieved chunks joined as they were before packing
+    retrieved_tokens: int
+    chunks_used: int
+    chunks_retrieved: int
+    passages: int
+    # Sources of the passages in the context, in context order (hits without a source are left out)
+    sources: list = field(default_factory=list)
+
+    @property
+    def tokens_saved(self):
+        return max(0, self.retrieved_tokens - self.tokens)
+
+
+class ContextPacker:
+    """
+    Args:
+        count_tokens (callable): Returns the token count of each text in a list
+        separator (str): Put between passages
+    """
+
+    def __init__(self, count_tokens, separator=SEPARATOR):
+        self.count_tokens = count_tokens
+        self.separator = separator
+
+    def pack(self, hits, budget=CONTEXT_TOKEN_BUDGET):
+        """
+        Build the context of a prompt.
+
+        Args:
+            hits (list): (chunk position or None, text) or (chunk position or None, text, source)
+                tuples, most relevant first
+            budget (int): Largest context in tokens
+
+        Returns:
+            PackedContext: The context and its token accounting
+        """
+        seen = set()
+        sources, positions, texts = [], [], []
+        for hit in hits:
+            position, text = hit[0], hit[1]
+            source = hit[2] if len(hit) > 2 else None
+            if text and (source, text) not in seen:
+                seen.add((source, text))
+                sources.append(source)
+                positions.append(position)
+                texts.append(text)
+        if not texts:
+            return PackedContext('', 0, 0, 0, len(hits), 0)
+
+        counts = self.count_tokens(texts + [self.separator])
+        chunk_tokens, separator_tokens = counts[:-1], counts[-1]
+        successor, overlap = self._neighbours(sources, positions, texts)
+        predecessor = {j: i for i, j in successor.items()}
+
+        selected = set()
+        used = 0
+        for i, text in enumerate(texts):
+            novel = len(text)
+            prev, nxt = predecessor.get(i), successor.get(i)
+            joins_prev = prev in selected
+            joins_next = nxt in selected
+            if joins_prev:
+                novel -= overlap[prev]
+            if joins_next:
+                novel -= overlap[i]
+            cost = math.ceil(chunk_tokens[i] * max(novel, 0) / len(text))
+            # A new passage adds a separator, a chunk bridging two passages removes one
+            if not joins_prev and not joins_next:
+                cost += separator_tokens if selected else 0
+            elif joins_prev and joins_next:
+                cost -= separator_tokens
+            if used + cost <= budget:
+                selected.add(i)
+                used += cost
+
+        # Files in the order of their best hit
+        source_rank = {}
+        for source in sources:
+            source_rank.setdefault(source, len(source_rank))
+
+        passages = []
+        for i in selected:
+            if predecessor.get(i) in selected:
+                continue
+            passage, j = texts[i], i
+            while successor.get(j) in selected:
+                passage += self._join(texts[successor[j]], overlap[j])
+                j = successor[j]
+            # Document order where positions are known, relevance order otherwise
+            key = (source_rank[sources[i]], positions[i] is None, positions[i] if positions[i] is not None else i)
+            if sources[i] is not None:
+                passage = f"[{sources[i]}]\n{passage}"
+            passages.append((key, passage, sources[i]))
+        passages.sort(key=lambda item: item[0])
+
+        text = self.separator.join(passage for _, passage, _ in passages)
+        tokens, retrieved_tokens = self.count_tokens([text, self.separator.join(texts)])
+        used_sources = list(dict.fromkeys(source for _, _, source in passages if source is not None))
+        return PackedContext(text, tokens, retrieved_tokens, len(selected), len(hits), len(passages), used_sources)
+
+    @staticmethod
+    def _join(text, overlap):
+        return text[overlap:] if overlap else "\n" + text
+
+    @staticmethod
+    def _neighbours(sources, positions, texts):
+        """
+        successor[i] = j when chunk j continues chunk i in the document,
+        overlap[i] = characters chunk j repeats from the end of chunk i.
+        """
+        by_position = {(sources[i], position): i for i, position in enumerate(positions) if position is not None}
+        successor, overlap = {}, {}
+        taken = set()
+        for i, text in enumerate(texts):
+            if positions[i] is not None:
+                j = by_position.get((sources[i], positions[i] + 1))
+                if j is not None:
+                    successor[i], overlap[i] = j, text_overlap(text, texts[j])
+                    taken.add(j)
+                continue
+            for j, other in enumerate(texts):
+                if (j == i or j in taken or positions[j] is not None or sources[j] != sources[i]
+                        or successor.get(j) == i):
+                    continue
+                length = text_overlap(text, other)
+                if length:
+                    successor[i], overlap[i] = j, length
+                    taken.add(j)
+                    break
+        return successor, overlap
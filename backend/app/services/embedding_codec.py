@@ -0,0 +1,76 @@
+"""
+Compact encodings of chunk embeddings.
+
+- to_pgvector: pgvector text literal with 6 significant digits, about half the
+  size of a JSON list of Python floats and still accepted by vector columns and
+  the match_file_chunks RPC.
+- pack/unpack: float16 or int8 (scalar quantized, one float32 scale per vector)
+  bytes in base64, stored in file_chunks.embedding_q. unpack returns a NumPy view
+  of the decoded bytes (np.frombuffer), without copying them again.
+
+Quantized vectors are meant for unit-length embeddings: cosine similarity is
+scale * (q . query) for int8 and a plain dot product for float16.
+"""
+import base64
+import struct
+import numpy as np
+
+QUANTIZATIONS = ('none', 'float16', 'int8')
+QUANTIZED_DTYPES = {'float16': np.float16, 'int8': np.int8}
+# First byte of a packed vector
+_TAGS = {'float16': 1, 'int8': 2}
+_MODES = {tag: mode for mode, tag in _TAGS.items()}
+_SCALE = struct.Struct('<f')
+
+
+def to_pgvector(vector):
+    """pgvector text literal of a vector"""
+    return '[' + ','.join(f'{value:.6g}' for value in np.asarray(vector, dtype=np.float32)) + ']'
+
+
+def quantize(vectors, mode):
+    """
+    Quantize a (n, dimension) float32 matrix.
+
+    Returns:
+        tuple: (matrix of the mode's dtype, float32 scale per row)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.ones(len(vectors), dtype=np.float32)
+    if mode == 'float16':
+        return vectors.astype(np.float16), scales
+    if mode == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.rint(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f'Unknown quantization {mode!r}')
+
+
+def pack(vector, mode):
+    """Base64 of one quantized vector: tag byte, float32 scale (int8 only), values"""
+    values, scales = quantize(np.asarray(vector, dtype=np.float32)[None, :], mode)
+    header = bytes([_TAGS[mode]])
+    if mode == 'int8':
+        header += _SCALE.pack(float(scales[0]))
+    return base64.b64encode(header + values.tobytes()).decode('ascii')
+
+
+def unpack(value):
+    """
+    Decode a packed vector.
+
+    Returns:
+        tuple: (mode, read-only array view of the values, scale)
+    """
+    raw = base64.b64decode(value)
+    mode = _MODES[raw[0]]
+    if mode == 'int8':
+        scale = _SCALE.unpack_from(raw, 1)[0]
+        return mode, np.frombuffer(raw, dtype=np.int8, offset=1 + _SCALE.size), scale
+    return mode, np.frombuffer(raw, dtype=np.float16, offset=1), 1.0
+
+
+def unpack_float32(value):
+    """A packed vector back as float32"""
+    _, values, scale = unpack(value)
+    return values.astype(np.float32) * np.float32(scale)
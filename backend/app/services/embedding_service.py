@@ -0,0 +1,289 @@
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+from ..config.settings import (
+    EMBEDDING_MODEL, EMBEDDING_DIMENSION, EMBEDDING_BATCH_SIZE, QUERY_EMBEDDING_CACHE_SIZE,
+    EMBEDDING_BACKEND, ONNX_MODEL_DIR, ONNX_QUANTIZE, ONNX_INTRA_OP_THREADS
+)
+from ..utils.logger import Logger
+
+logger = Logger()
+
+
+def _rss_bytes():
+    """Resident set size of the process, 0 where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def normalize_query(text, fold_case=True):
+    """Cache key form of a query: NFC, single spaces, lower case if fold_case"""
+    text = unicodedata.normalize('NFC', text or '')
+    return ' '.join((text.lower() if fold_case else text).split())
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU of query embeddings keyed by (model version, normalized text).
+
+    Values are read-only float32 arrays, so callers can't change a cached vector.
+    """
+
+    def __init__(self, max_entries=QUERY_EMBEDDING_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, key, embedding):
+        if self.max_entries <= 0:
+            return
+        embedding.setflags(write=False)
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_metrics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None
+            }
+
+
+class EmbeddingService:
+    """
+    Process-wide sentence-transformers model, run by PyTorch or ONNX Runtime.
+
+    The model is loaded on first use (or by warm_up at startup) and shared by every
+    caller. Loading is guarded by a lock so concurrent first requests load it once,
+    and encode calls are serialized because the fast tokenizer of the model cannot
+    be used from several threads at the same time. Query embeddings go through
+    embed_query, which answers repeated questions from a shared LRU cache.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL, dimension=EMBEDDING_DIMENSION, backend=EMBEDDING_BACKEND):
+        self.model_name = model_name
+        self._dimension = dimension
+        self.backend = backend
+        # Stored with every chunk this service embeds (file_chunks.embedding_version)
+        self.embedding_version = model_name
+        # Part of every query cache key, vectors of another model must never be reused
+        self.model_version = f'{model_name}:{self._backend_label()}'
+        self.query_cache = QueryEmbeddingCache()
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._encode_lock = threading.Lock()
+        self.metrics = {
+            'model': model_name,
+            'backend': self._backend_label(),
+            'loaded': False,
+            'loaded_at': None,
+            'load_seconds': None,
+            'load_rss_bytes': None,
+            'encode_calls': 0,
+            'encoded_texts': 0,
+            'encode_seconds': 0.0
+        }
+
+    @property
+    def dimension(self):
+        """Length of the vectors, read from the model when not configured"""
+        if self._dimension is None:
+            self._dimension = self.model.get_sentence_embedding_dimension()
+        return self._dimension
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    def _backend_label(self):
+        if self.backend == 'onnx':
+            return 'onnx-int8' if ONNX_QUANTIZE else 'onnx'
+        return 'torch'
+
+    def _create_model(self):
+        if self.backend == 'onnx':
+            try:
+                from .onnx_embedding import load_onnx_model
+                return load_onnx_model(self.model_name, ONNX_MODEL_DIR, ONNX_QUANTIZE, ONNX_INTRA_OP_THREADS)
+            except ImportError as e:
+                logger.log_with_timestamp('EMBEDDING_SERVICE_ERROR', f'onnxruntime not available ({e}), using PyTorch')
+                self.backend = 'torch'
+                self.model_version = f'{self.model_name}:torch'
+                self.metrics['backend'] = 'torch'
+
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(self.model_name)
+
+    def _load(self):
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        try:
+            model = self._create_model()
+        except Exception as e:
+            logger.log_with_timestamp('EMBEDDING_SERVICE_ERROR', f'Failed to load {self.model_name}: {e}')
+            raise
+        load_seconds = time.perf_counter() - started
+
+        self.metrics.update({
+            'loaded': True,
+            'loaded_at': datetime.now().isoformat(),
+            'load_seconds': round(load_seconds, 3),
+            'load_rss_bytes': max(0, _rss_bytes() - rss_before)
+        })
+        logger.log_with_timestamp(
+            'EMBEDDING_SERVICE',
+            f'Loaded {self.model_name} ({self.metrics["backend"]}) in {load_seconds:.2f}s',
+            f"RSS +{self.metrics['load_rss_bytes'] / 2**20:.0f} MiB"
+        )
+        return model
+
+    def warm_up(self):
+        """Load the model and run one encode so the first request doesn't pay for it"""
+        self.encode(["warm up"])
+        logger.log_with_timestamp('EMBEDDING_SERVICE', 'Warm-up finished')
+
+    def encode(self, texts, **kwargs):
+        """Encode a list of texts with the shared model
+
+        Args:
+            texts (list): Texts to encode
+            **kwargs: Passed to SentenceTransformer.encode
+
+        Returns:
+            numpy.ndarray: One embedding per text
+        """
+        model = self.model
+        started = time.perf_counter()
+        with self._encode_lock:
+            embeddings = model.encode(texts, **kwargs)
+            self.metrics['encode_calls'] += 1
+            self.metrics['encoded_texts'] += len(texts)
+            self.metrics['encode_seconds'] += time.perf_counter() - started
+        return embeddings
+
+    def embed_batch(self, texts, batch_size=EMBEDDING_BATCH_SIZE):
+        """Embed texts with batched forward passes
+
+        Args:
+            texts (list): Texts to embed
+            batch_size (int): Texts per forward pass
+
+        Returns:
+            numpy.ndarray: (len(texts), dimension) float32 array of unit-length rows
+        """
+        # Handle empty or very short text
+        texts = [text if text and len(text.strip()) >= 3 else "empty document" for text in texts]
+        embeddings = self.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def embed(self, text):
+        """Embed a single text, returned as a list for Supabase"""
+        return self.embed_batch([text])[0].tolist()
+
+    def embed_query(self, text):
+        """Embed a user query, reusing the embedding of the same normalized text
+
+        Shared by every query-time caller (retrieval, classifiers, semantic caches)
+        so a repeated question costs no forward pass. The normalized text is only the
+        cache key, the model embeds the query as typed; case is folded in the key only
+        for models whose tokenizer lower-cases anyway.
+
+        Args:
+            text (str): Query text
+
+        Returns:
+            numpy.ndarray: Read-only float32 unit vector
+        """
+        key = (self.model_version, normalize_query(text, self.uncased))
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            embedding = self.embed_batch([text])[0]
+            self.query_cache.put(key, embedding)
+        return embedding
+
+    def count_tokens(self, texts):
+        """Number of model tokens of each text, without special tokens"""
+        tokenizer = getattr(self.model, 'tokenizer', None)
+        if tokenizer is None:
+            # Rough estimate for models without a Hugging Face tokenizer
+            return [max(1, len(text) // 4) for text in texts]
+        with self._encode_lock:
+            encoded = tokenizer(texts, add_special_tokens=False, return_attention_mask=False,
+                                return_token_type_ids=False)['input_ids']
+        return [len(ids) for ids in encoded]
+
+    @property
+    def uncased(self):
+        """Whether the tokenizer lower-cases its input, so case doesn't change embeddings"""
+        return bool(getattr(getattr(self.model, 'tokenizer', None), 'do_lower_case', False))
+
+    @property
+    def max_tokens(self):
+        """Longest input the model reads, longer texts are truncated"""
+        return getattr(self.model, 'max_seq_length', 256) - 2
+
+    def get_metrics(self):
+        metrics = dict(self.metrics)
+        metrics['encode_seconds'] = round(metrics['encode_seconds'], 3)
+        metrics['query_cache'] = self.query_cache.get_metrics()
+        return metrics
+
+
+_embedding_services = {}
+_embedding_service_lock = threading.Lock()
+
+def get_embedding_service(model_name=EMBEDDING_MODEL):
+    """
+    Return the process-wide EmbeddingService of a model, creating it on first call.
+
+    Models other than EMBEDDING_MODEL are only needed to search files whose chunks
+    were embedded by them and haven't been re-indexed yet (see reindexer.py).
+    """
+    service = _embedding_services.get(model_name)
+    if service is None:
+        with _embedding_service_lock:
+            service = _embedding_services.get(model_name)
+            if service is None:
+                dimension = EMBEDDING_DIMENSION if model_name == EMBEDDING_MODEL else None
+                service = _embedding_services[model_name] = EmbeddingService(model_name, dimension)
+    return service
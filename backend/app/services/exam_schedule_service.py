@@ -1,5 +1,10 @@
+import asyncio
 from datetime import datetime, timedelta
-import httpx
+from unidecode import unidecode
+from .schedule_records import ExamRecord, ExamIndex
+from .uis_paginator import UISPaginator
+from .timetable_cache import timetable_cache
+from .timetable_snapshots import timetable_snapshots
 from ..utils.logger import Logger
 
 logger = Logger()
@@ -9,6 +14,9 @@ class ExamScheduleService:
         self.base_url = "https://uis.ptithcm.edu.vn/api/epm"
         self.auth_service = auth_service
         self.schedule_service = schedule_service
+        self.cache = timetable_cache
+        self.snapshots = timetable_snapshots
+        self.paginator = UISPaginator()
         
     def set_auth_service(self, auth_service):
         """Set the authentication service for token management
@@ -34,18 +42,16 @@ class ExamScheduleService:
         """
         return self.auth_service is not None and self.auth_service.access_token is not None
         
-    async def get_exam_schedule_by_semester(self, hoc_ky=None, is_giua_ky=False):
-        """Get exam schedule data for a specific semester
+    def _exam_request(self, hoc_ky, is_giua_ky):
+        """Build the URL, headers and filter of the exam schedule endpoint
 
         Args:
             hoc_ky (str): Semester ID, will use current semester if None
             is_giua_ky (bool): Whether to get midterm or final exam schedule
 
         Returns:
-            dict: Exam schedule data
+            tuple: (url, headers, filter)
         """
-        logger.log_with_timestamp("EXAM SCHEDULE API", f"Getting exam schedule for semester: {hoc_ky}, midterm: {is_giua_ky}")
-        
         if not self.check_auth():
             logger.log_with_timestamp("EXAM SCHEDULE API", "No auth token found, getting current semester...")
             current_semester, error = self.auth_service.get_current_semester()
@@ -60,45 +66,163 @@ class ExamScheduleService:
             "Authorization": f"Bearer {self.auth_service.access_token}",
             "Content-Type": "application/json"
         }
-        payload = {
-            "filter": {
-                "hoc_ky": hoc_ky,
-                "is_giua_ky": is_giua_ky
-            },
-            "additional": {
-                "paging": {
-                    "limit": 100,
-                    "page": 1
-                },
-                "ordering": [{
-                    "name": None,
-                    "order_type": None
-                }]
-            }
+        filter = {
+            "hoc_ky": hoc_ky,
+            "is_giua_ky": is_giua_ky
         }
+        return url, headers, filter
+
+    async def get_exam_schedule_by_semester(self, hoc_ky=None, is_giua_ky=False):
+        """Get exam schedule data for a specific semester
+
+        Args:
+            hoc_ky (str): Semester ID, will use current semester if None
+            is_giua_ky (bool): Whether to get midterm or final exam schedule
+
+        Returns:
+            dict: Exam schedule data, all pages merged
+        """
+        hoc_ky = await self._resolve_semester(hoc_ky)
+        logger.log_with_timestamp("EXAM SCHEDULE API", f"Getting exam schedule for semester: {hoc_ky}, midterm: {is_giua_ky}")
+        url, headers, filter = self._exam_request(hoc_ky, is_giua_ky)
 
         try:
-            async with httpx.AsyncClient() as client:
-                logger.log_with_timestamp("EXAM SCHEDULE API", f"Sending request to {url} with semester {hoc_ky}")
-                response = await client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                
-                logger.log_with_timestamp("EXAM SCHEDULE API", f"Received response: Status {response.status_code}")
-                
-                if data.get('data'):
-                    exams = data['data'].get('ds_lich_thi', [])
-                    logger.log_with_timestamp("EXAM SCHEDULE API", f"Total exams: {len(exams)}")
-                    
-                    for exam in exams:
-                        logger.log_with_timestamp("EXAM SCHEDULE API", 
-                            f"Exam: {exam.get('ten_mon')} | Date: {exam.get('ngay_thi')} | Room: {exam.get('ma_phong')}")
-                
-                return data
+            logger.log_with_timestamp("EXAM SCHEDULE API", f"Sending request to {url} with semester {filter['hoc_ky']}")
+            data = await self.paginator.fetch_all(url, headers, filter, 'ds_lich_thi')
+            
+            exams = data['data'].get('ds_lich_thi', [])
+            logger.log_with_timestamp("EXAM SCHEDULE API", f"Total exams: {len(exams)}")
+            
+            for exam in exams:
+                logger.log_with_timestamp("EXAM SCHEDULE API", 
+                    f"Exam: {exam.get('ten_mon')} | Date: {exam.get('ngay_thi')} | Room: {exam.get('ma_phong')}")
+            
+            username = getattr(self.auth_service, 'username', None)
+            if username:
+                self.snapshots.save(('exam', username, hoc_ky, is_giua_ky), ExamIndex.from_api(data))
+            return data
         except Exception as e:
             logger.log_with_timestamp("EXAM SCHEDULE ERROR", f"Error getting exam schedule: {str(e)}")
             raise
             
+    async def get_exam_index(self, hoc_ky=None, is_giua_ky=False):
+        """Get the compact exam index for a semester, cached per user
+
+        Args:
+            hoc_ky (str): Semester ID, will use current semester if None
+            is_giua_ky (bool): Whether to get midterm or final exam schedule
+
+        Returns:
+            ExamIndex: Date-sorted exams for the semester
+        """
+        hoc_ky = await self._resolve_semester(hoc_ky)
+        username = getattr(self.auth_service, 'username', None)
+        cache_key = ('exam', username, hoc_ky, is_giua_ky)
+        snapshot = None
+        if username:
+            exam_index = self.cache.get(cache_key)
+            if exam_index is not None:
+                logger.log_with_timestamp("EXAM SCHEDULE CACHE", f"Hit for {username}, semester {hoc_ky}, midterm: {is_giua_ky}")
+                return exam_index
+
+            # Cold cache: a recent snapshot saves the UIS round trip
+            snapshot = await self.snapshots.load_async(cache_key)
+            if snapshot and self.snapshots.is_fresh(snapshot[1]):
+                self.cache.put(cache_key, snapshot[0])
+                return snapshot[0]
+
+        url, headers, filter = self._exam_request(hoc_ky, is_giua_ky)
+        exams = []
+        try:
+            # Records are compacted page by page as they arrive
+            async for page_data in self.paginator.iter_pages(url, headers, filter, 'ds_lich_thi'):
+                for exam in page_data.get('ds_lich_thi', []):
+                    record = ExamRecord.from_api(exam)
+                    if record:
+                        exams.append(record)
+        except Exception as e:
+            logger.log_with_timestamp("EXAM SCHEDULE ERROR", f"Error getting exam schedule: {str(e)}")
+            if snapshot:
+                logger.log_with_timestamp("EXAM SCHEDULE SNAPSHOT", f"UIS unavailable, serving snapshot from {snapshot[1].isoformat()}")
+                return snapshot[0]
+            raise
+        exam_index = ExamIndex(exams)
+
+        if username:
+            self.cache.put(cache_key, exam_index)
+            self.snapshots.save(cache_key, exam_index)
+        return exam_index
+
+    async def _resolve_semester(self, hoc_ky):
+        # Cache and snapshot keys always name the semester, so None and the current ID share entries
+        if self.auth_service is None:
+            return hoc_ky
+        return await self.auth_service.resolve_semester(hoc_ky)
+
+    async def get_snapshot(self, hoc_ky=None, is_giua_ky=False):
+        """Get the stored exam schedule snapshot of the logged in user
+
+        Args:
+            hoc_ky (str): Semester ID, None for the current semester
+            is_giua_ky (bool): Whether to get midterm or final exam schedule
+
+        Returns:
+            tuple: (ExamIndex, fetched_at datetime) or None if there is no snapshot
+        """
+        username = getattr(self.auth_service, 'username', None)
+        if not username:
+            return None
+        hoc_ky = await self._resolve_semester(hoc_ky)
+        return await self.snapshots.load_async(('exam', username, hoc_ky, is_giua_ky))
+
+    async def get_aggregate_exam_index(self, semesters, include_midterm=True, include_final=True):
+        """Get one exam index over several semesters and exam periods
+
+        Every (semester, midterm/final) part is fetched concurrently through
+        get_exam_index, so each part is cached on its own and a repeated query
+        only fetches the parts that are missing.
+
+        Args:
+            semesters (list): Semester IDs
+            include_midterm (bool): Whether to include midterm exams
+            include_final (bool): Whether to include final exams
+
+        Returns:
+            ExamIndex: Date-sorted exams of every part, without duplicates
+        """
+        periods = [is_giua_ky for is_giua_ky, included in ((True, include_midterm), (False, include_final)) if included]
+        parts = [(hoc_ky, is_giua_ky) for hoc_ky in semesters for is_giua_ky in periods]
+        logger.log_with_timestamp("EXAM SCHEDULE API", f"Aggregating {len(parts)} exam lists: {parts}")
+
+        indexes = await asyncio.gather(*(self.get_exam_index(hoc_ky, is_giua_ky) for hoc_ky, is_giua_ky in parts))
+        exam_index = ExamIndex.merge(indexes)
+
+        logger.log_with_timestamp("EXAM SCHEDULE API",
+            f"Merged {sum(len(index) for index in indexes)} exams into {len(exam_index)}")
+        return exam_index
+
+    def parse_exam_scope(self, question):
+        """Work out which exam periods and semesters a question is about
+
+        Args:
+            question (str): User's question about exam schedule
+
+        Returns:
+            tuple: (include_midterm, include_final, whole_year)
+        """
+        text = unidecode(question.lower())
+        midterm = 'giua ky' in text or 'giua hoc ky' in text
+        final = 'cuoi ky' in text or 'cuoi hoc ky' in text
+        every_exam = any(term in text for term in ['tat ca', 'toan bo', 'ca hai'])
+        whole_year = any(term in text for term in ['nam nay', 'ca nam', 'nam hoc', 'cac hoc ky', 'cac ky'])
+
+        if every_exam or (midterm and final):
+            return True, True, whole_year
+        if midterm:
+            return True, False, whole_year
+        # Final exams unless the question says otherwise
+        return False, True, whole_year
+
     def get_exams_by_date(self, exam_data, date_str):
         """Get exams for a specific date
 
@@ -204,52 +328,56 @@ class ExamScheduleService:
         result = ""
         
         for i, exam in enumerate(exams, 1):
-            # Get the key exam information
-            ten_mon = exam.get('ten_mon', 'N/A')
-            ma_mon = exam.get('ma_mon', 'N/A')
-            ky_thi = exam.get('ky_thi', 'N/A')
-            hinh_thuc_thi = exam.get('hinh_thuc_thi', 'N/A')
-            so_phut = exam.get('so_phut', 'N/A')
-            gio_bat_dau = exam.get('gio_bat_dau', 'N/A')
-            ngay_thi = exam.get('ngay_thi', 'N/A')
-            dia_diem_thi = exam.get('dia_diem_thi', 'N/A')
-            ma_phong = exam.get('ma_phong', 'N/A')
-            ten_mon_eg = exam.get('ten_mon_eg', '')
+            # Raw UIS entries are still accepted
+            if isinstance(exam, dict):
+                exam = ExamRecord.from_api(exam)
+                if exam is None:
+                    continue
             
             # Format the exam entry
             if is_list:
-                result += f"{i}. {ten_mon} ({ma_mon})\n"
+                result += f"{i}. {exam.subject or 'N/A'} ({exam.code or 'N/A'})\n"
             else:
-                result += f"{ten_mon} ({ma_mon})\n"
+                result += f"{exam.subject or 'N/A'} ({exam.code or 'N/A'})\n"
                 
             # Add English subject name if available
-            if ten_mon_eg:
-                result += f"   {ten_mon_eg}\n"
+            if exam.subject_en:
+                result += f"   {exam.subject_en}\n"
                 
             # Add exam details
-            result += f"   {ky_thi}\n"
-            result += f"   Hình thức: {hinh_thuc_thi}\n"
-            result += f"   Thời gian: {gio_bat_dau}, {so_phut} phút, ngày {ngay_thi}\n"
-            result += f"   Phòng thi: {ma_phong}, {dia_diem_thi}\n\n"
+            result += f"   {exam.exam_kind or 'N/A'}\n"
+            result += f"   Hình thức: {exam.exam_format or 'N/A'}\n"
+            result += f"   Thời gian: {exam.start_time or 'N/A'}, {exam.duration or 'N/A'} phút, ngày {exam.date_label}\n"
+            result += f"   Phòng thi: {exam.room or 'N/A'}, {exam.location or 'N/A'}\n\n"
             
         return result
     
-    async def process_exam_query(self, question, hoc_ky=None, is_giua_ky=False):
+    async def process_exam_query(self, question, hoc_ky=None, is_giua_ky=False, semesters=None):
         """Process an exam schedule query and return formatted results
         
         Args:
             question (str): User's question about exam schedule
             hoc_ky (str): Semester ID, will use current semester if None
-            is_giua_ky (bool): Whether to get midterm or final exam schedule
+            is_giua_ky (bool): Only get the midterm exam schedule
+            semesters (list, optional): Semester IDs to search when the question
+                is about the whole academic year
             
         Returns:
             dict: Exam schedule information with formatted text
         """
+        include_midterm, include_final, whole_year = self.parse_exam_scope(question)
+        if is_giua_ky:
+            include_midterm, include_final = True, False
+        semester_ids = semesters if whole_year and semesters else [hoc_ky]
+
         # Get the complete exam schedule
-        exam_data = await self.get_exam_schedule_by_semester(hoc_ky, is_giua_ky)
+        if len(semester_ids) == 1 and include_midterm != include_final:
+            exam_index = await self.get_exam_index(semester_ids[0], include_midterm)
+        else:
+            exam_index = await self.get_aggregate_exam_index(semester_ids, include_midterm, include_final)
         
         # Default response (return all exams)
-        exams_to_display = exam_data['data']['ds_lich_thi'] if exam_data.get('data') and exam_data['data'].get('ds_lich_thi') else []
+        exams_to_display = exam_index.exams
         filter_type = "all"
         filter_value = ""
         
@@ -262,21 +390,24 @@ class ExamScheduleService:
             
             logger.log_with_timestamp("EXAM SCHEDULE", f"Date extraction result: {date_type}, {original_text}")
             
+            # No date in the question: keep every exam
+            if original_text == 'default':
+                pass
             # Handle date ranges (weeks, months)
-            if isinstance(date_info, tuple):
+            elif isinstance(date_info, tuple):
                 start_date, end_date = date_info
                 logger.log_with_timestamp("EXAM SCHEDULE", 
                                          f"Date range detected: {start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}")
                 
                 # Get exams within the date range
-                exams_to_display = self.get_exams_by_date_range(exam_data, start_date, end_date)
+                exams_to_display = exam_index.between(start_date, end_date)
                 filter_type = "date_range"
                 filter_value = f"{start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}"
             else:
                 # Single date
                 logger.log_with_timestamp("EXAM SCHEDULE", f"Single date: {date_info.strftime('%d/%m/%Y')}")
                 date_str = date_info.strftime('%d/%m/%Y')
-                exams_to_display = self.get_exams_by_date(exam_data, date_str)
+                exams_to_display = exam_index.on(date_info)
                 filter_type = "date"
                 filter_value = date_str
         else:
@@ -306,7 +437,7 @@ class ExamScheduleService:
                     try:
                         # Format date as DD/MM/YYYY
                         date_str = f"{day:02d}/{month:02d}/{year}"
-                        exams_to_display = self.get_exams_by_date(exam_data, date_str)
+                        exams_to_display = exam_index.on(datetime(year, month, day).date())
                         filter_type = "date"
                         filter_value = date_str
                         break
@@ -325,7 +456,7 @@ class ExamScheduleService:
                         if len(parts) > 1:
                             subject_keyword = parts[1].strip().split()[0].strip()
                             if len(subject_keyword) > 2:  # Avoid too short keywords
-                                exams_to_display = self.get_exams_by_subject(exam_data, subject_keyword)
+                                exams_to_display = exam_index.by_subject(subject_keyword)
                                 filter_type = "subject"
                                 filter_value = subject_keyword
                                 break
@@ -338,5 +469,9 @@ class ExamScheduleService:
             'filter_type': filter_type,
             'filter_value': filter_value,
             'exam_count': len(exams_to_display),
-            'is_midterm': is_giua_ky
+            'exams': [exam.to_dict() for exam in exams_to_display],
+            'is_midterm': include_midterm and not include_final,
+            'include_midterm': include_midterm,
+            'include_final': include_final,
+            'semesters': semester_ids
         } 
\ No newline at end of file
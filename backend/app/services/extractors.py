@@ -0,0 +1,324 @@
+"""
+Streaming text extraction for uploaded files.
+
+Extractors yield text piece by piece (a page, a slide, rows of a sheet, a block
+of a text file) together with its page number, so the chunker can consume a
+document without the whole text ever being in memory. Slides and sheets are
+numbered like pages.
+"""
+import codecs
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from ..config.settings import (
+    PDF_MAX_PAGES, PDF_MAX_BYTES, PDF_EXTRACT_WORKERS, PDF_PARALLEL_MIN_PAGES, PDF_PAGES_PER_TASK,
+    DOCX_MAX_BYTES, XLSX_MAX_BYTES, PPTX_MAX_BYTES, XLSX_MAX_ROWS
+)
+from ..utils.logger import Logger
+
+logger = Logger()
+
+TEXT_BLOCK_SIZE = 64 * 1024
+
+DOCX_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+XLSX_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+PPTX_TYPE = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+# Browsers send application/octet-stream for some uploads, the extension decides then
+_EXTENSION_TYPES = {'.pdf': 'application/pdf', '.docx': DOCX_TYPE, '.xlsx': XLSX_TYPE, '.pptx': PPTX_TYPE}
+
+
+class ExtractionError(Exception):
+    """The file can't be extracted (too large, unreadable)"""
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    """Process pool shared by every PDF extraction, created on first large PDF"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Spawned, not forked: by now other threads (ingestion pool, HTTP client
+                # loop, snapshot writers) may hold locks a forked child would inherit held
+                _pool = ProcessPoolExecutor(
+                    max_workers=PDF_EXTRACT_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _pool
+
+
+def _check_size(path, limit, kind):
+    file_size = os.path.getsize(path)
+    if file_size > limit:
+        raise ExtractionError(f'{kind} is {file_size} bytes, the limit is {limit}')
+
+
+def _extract_page_range(path, start, end):
+    """Extract pages [start, end) in a worker process, which opens the PDF itself"""
+    import PyPDF2
+
+    with open(path, 'rb') as pdf_file:
+        reader = PyPDF2.PdfReader(pdf_file)
+        return [(reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+def iter_pdf_pages(path, on_progress=None):
+    """
+    Yield the text of every page of a PDF, in page order.
+
+    Small documents are read in this process. From PDF_PARALLEL_MIN_PAGES pages on
+    (and with more than one worker), ranges of PDF_PAGES_PER_TASK pages are
+    extracted by the process pool with at most two ranges per worker in flight,
+    so finished pages never pile up.
+
+    Args:
+        path (str): Path of the PDF
+        on_progress (callable, optional): Called with the fraction of pages done
+
+    Yields:
+        tuple: (page number from 1, page text followed by a newline)
+    """
+    import PyPDF2
+
+    _check_size(path, PDF_MAX_BYTES, 'PDF')
+
+    with open(path, 'rb') as pdf_file:
+        reader = PyPDF2.PdfReader(pdf_file)
+        page_count = len(reader.pages)
+        if page_count > PDF_MAX_PAGES:
+            logger.log_with_timestamp('PDF_EXTRACT', f'{page_count} pages, only the first {PDF_MAX_PAGES} are extracted')
+            page_count = PDF_MAX_PAGES
+
+        if page_count < PDF_PARALLEL_MIN_PAGES or PDF_EXTRACT_WORKERS < 2:
+            for i in range(page_count):
+                yield i + 1, (reader.pages[i].extract_text() or "") + "\n"
+                if on_progress:
+                    on_progress((i + 1) / page_count)
+            return
+
+    logger.log_with_timestamp('PDF_EXTRACT', f'Extracting {page_count} pages with {PDF_EXTRACT_WORKERS} processes')
+    pool = _get_pool()
+    ranges = deque((start, min(start + PDF_PAGES_PER_TASK, page_count))
+                   for start in range(0, page_count, PDF_PAGES_PER_TASK))
+    in_flight = deque()
+    pages_done = 0
+    try:
+        while ranges or in_flight:
+            while ranges and len(in_flight) < PDF_EXTRACT_WORKERS * 2:
+                start, end = ranges.popleft()
+                in_flight.append(pool.submit(_extract_page_range, path, start, end))
+            for text in in_flight.popleft().result():
+                pages_done += 1
+                yield pages_done, text + "\n"
+            if on_progress:
+                on_progress(pages_done / page_count)
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+def iter_docx(path, on_progress=None):
+    """Yield (None, text) for the paragraphs and tables of a DOCX, in document order"""
+    from docx import Document
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    _check_size(path, DOCX_MAX_BYTES, 'DOCX')
+    document = Document(path)
+    body = list(document.element.body.iterchildren())
+    block = ''
+    for i, element in enumerate(body):
+        tag = element.tag.rsplit('}', 1)[-1]
+        if tag == 'p':
+            text = Paragraph(element, document).text.strip()
+        elif tag == 'tbl':
+            # One line per table row, cells separated like in a sheet
+            text = '\n\n'.join(
+                ' | '.join(cell.text.strip() for cell in row.cells)
+                for row in Table(element, document).rows
+            )
+        else:
+            continue
+        if text:
+            block += text + '\n\n'
+        if len(block) >= TEXT_BLOCK_SIZE:
+            yield None, block
+            block = ''
+            if on_progress:
+                on_progress((i + 1) / len(body))
+    if block:
+        yield None, block
+
+
+def _format_row(values, headers):
+    cells = []
+    for i, value in enumerate(values):
+        if value is None or str(value).strip() == '':
+            continue
+        header = headers[i] if i < len(headers) and headers[i] else None
+        cells.append(f'{header}: {value}' if header else str(value))
+    return '; '.join(cells)
+
+
+def iter_xlsx(path, on_progress=None):
+    """
+    Yield (sheet number, text) for a workbook, rows read one at a time in read-only mode.
+
+    The first non-empty row of a sheet is taken as its header, later rows become
+    "header: value; ..." lines so every chunk keeps the meaning of its cells.
+    """
+    import openpyxl
+
+    _check_size(path, XLSX_MAX_BYTES, 'XLSX')
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheets = workbook.worksheets
+        rows_read = 0
+        for sheet_no, sheet in enumerate(sheets, start=1):
+            block = f'{sheet.title}\n\n'
+            headers = None
+            for values in sheet.iter_rows(values_only=True):
+                if rows_read >= XLSX_MAX_ROWS:
+                    logger.log_with_timestamp('XLSX_EXTRACT', f'Stopped after {XLSX_MAX_ROWS} rows')
+                    break
+                rows_read += 1
+                if headers is None:
+                    if any(value is not None for value in values):
+                        headers = [str(value).strip() if value is not None else '' for value in values]
+                    continue
+                line = _format_row(values, headers)
+                if line:
+                    block += line + '\n\n'
+                if len(block) >= TEXT_BLOCK_SIZE:
+                    yield sheet_no, block
+                    block = ''
+            if block.strip():
+                yield sheet_no, block
+            if on_progress:
+                on_progress(sheet_no / len(sheets))
+            if rows_read >= XLSX_MAX_ROWS:
+                break
+    finally:
+        workbook.close()
+
+
+def iter_pptx(path, on_progress=None):
+    """Yield (slide number, text of the slide's shapes, tables and notes) for a presentation"""
+    from pptx import Presentation
+
+    _check_size(path, PPTX_MAX_BYTES, 'PPTX')
+    slides = Presentation(path).slides
+    slide_count = len(slides)
+    for slide_no, slide in enumerate(slides, start=1):
+        parts = []
+        for shape in slide.shapes:
+            if getattr(shape, 'has_text_frame', False) and shape.has_text_frame:
+                parts.extend(p.text.strip() for p in shape.text_frame.paragraphs)
+            elif getattr(shape, 'has_table', False) and shape.has_table:
+                parts.extend(' | '.join(cell.text.strip() for cell in row.cells) for row in shape.table.rows)
+        if slide.has_notes_slide:
+            parts.append(slide.notes_slide.notes_text_frame.text.strip())
+        text = '\n\n'.join(part for part in parts if part)
+        if text:
+            yield slide_no, text + '\n\n'
+        if on_progress:
+            on_progress(slide_no / slide_count)
+
+
+def iter_text_file(path, on_progress=None):
+    """Yield (None, text) for each decoded block of a text file, invalid UTF-8 is dropped"""
+    file_size = max(os.path.getsize(path), 1)
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    read = 0
+    with open(path, 'rb') as text_file:
+        while True:
+            block = text_file.read(TEXT_BLOCK_SIZE)
+            if not block:
+                break
+            read += len(block)
+            yield None, decoder.decode(block)
+            if on_progress:
+                on_progress(read / file_size)
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield None, tail
+
+
+def _is_binary(path, sample_size=8192):
+    """NUL bytes don't occur in text files, but do in zip containers and other binaries"""
+    with open(path, 'rb') as f:
+        return b'\x00' in f.read(sample_size)
+
+
+def _resolve_type(path, content_type):
+    if content_type not in _EXTENSION_TYPES.values():
+        content_type = _EXTENSION_TYPES.get(os.path.splitext(path)[1].lower(), content_type)
+    return content_type
+
+
+def validate_upload(path, content_type):
+    """
+    Cheap checks run before an upload is queued: the size limit of its format and
+    the page count of PDFs (read from the page tree, no text is extracted).
+
+    Raises:
+        ExtractionError: The file is over a limit
+    """
+    content_type = _resolve_type(path, content_type)
+    limits = {'application/pdf': (PDF_MAX_BYTES, 'PDF'), DOCX_TYPE: (DOCX_MAX_BYTES, 'DOCX'),
+              XLSX_TYPE: (XLSX_MAX_BYTES, 'XLSX'), PPTX_TYPE: (PPTX_MAX_BYTES, 'PPTX')}
+    if content_type in limits:
+        _check_size(path, *limits[content_type])
+    if content_type == 'application/pdf':
+        try:
+            import PyPDF2
+        except ImportError:
+            return
+        try:
+            with open(path, 'rb') as pdf_file:
+                page_count = len(PyPDF2.PdfReader(pdf_file).pages)
+        except Exception as e:
+            raise ExtractionError(f'Unreadable PDF: {e}')
+        if page_count > PDF_MAX_PAGES:
+            raise ExtractionError(f'PDF has {page_count} pages, the limit is {PDF_MAX_PAGES}')
+
+
+def iter_file_text(path, content_type, on_progress=None):
+    """
+    Stream the text of an uploaded file piece by piece.
+
+    Args:
+        path (str): Path of the saved upload
+        content_type (str): MIME type sent with the upload
+        on_progress (callable, optional): Called with the fraction of the file done
+
+    Returns:
+        iterator: (page number or None, text) for consecutive pieces of the text
+
+    Raises:
+        ExtractionError: For binary files of an unsupported type
+    """
+    content_type = _resolve_type(path, content_type)
+
+    # PDF files should be processed differently than text files
+    if content_type == 'application/pdf':
+        try:
+            import PyPDF2  # noqa: F401
+            return iter_pdf_pages(path, on_progress)
+        except ImportError:
+            logger.log_with_timestamp('PDF_EXTRACT_ERROR', 'PyPDF2 library not installed, trying fallback method')
+    elif content_type == DOCX_TYPE:
+        return iter_docx(path, on_progress)
+    elif content_type == XLSX_TYPE:
+        return iter_xlsx(path, on_progress)
+    elif content_type == PPTX_TYPE:
+        return iter_pptx(path, on_progress)
+
+    # Decoding a binary file as text would only embed garbage
+    if _is_binary(path):
+        raise ExtractionError(f'Unsupported file type: {content_type}')
+    return iter_text_file(path, on_progress)
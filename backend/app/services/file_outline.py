@@ -0,0 +1,258 @@
+"""
+Per-file outline built while a file is ingested.
+
+The outline is a small JSON document: the section headings with the pages and
+chunks they span, the page range, the most widespread keywords and the opening
+text of the file. It is stored in file_outlines together with an optional LLM
+summary, and answers broad questions ("file này nói về gì?") and questions for
+which search finds nothing, instead of a random sample of chunks.
+
+Headings are recognised from the extracted text alone: markdown headings,
+numbered sections ("2.1 Lập lịch CPU", "Chương 3", "II."), and short lines in
+capitals. Lines repeated on many pages (running headers) are dropped.
+"""
+import re
+import threading
+from collections import Counter, OrderedDict
+from unidecode import unidecode
+from ..config.settings import OUTLINE_MAX_SECTIONS, OUTLINE_MAX_KEYWORDS, OUTLINE_LEAD_CHARS
+
+_MARKDOWN = re.compile(r'^(#{1,6})\s+(.+)$')
+_CHAPTER = re.compile(r'^(chương|chuong|chapter|phần|phan|part)\s+[\dIVXLC]+\b', re.I)
+_SECTION = re.compile(r'^(bài|bai|lesson|mục|muc|section)\s+[\dIVXLC]+\b', re.I)
+_NUMBERED = re.compile(r'^(\d{1,2}(?:\.\d{1,2}){0,3})\.?\s+([^\W\d_])')
+# Dot leaders of a table of contents line
+_LEADERS = re.compile(r'\.{4,}|…{2,}')
+_ROMAN = re.compile(r'^[IVX]{1,4}\.\s+\S')
+_WORD = re.compile(r'\w+')
+_PHRASE_BREAK = re.compile(r'[.,;:!?()\[\]"“”\n|]')
+_MAX_HEADING_CHARS = 100
+_MAX_HEADING_WORDS = 14
+# A title seen on more pages than this is a running header or footer
+_MAX_REPEATS = 2
+# Distinct keyword candidates kept while counting, the rarest are dropped beyond it
+_MAX_TERMS = 200000
+# Outlines of recently asked files kept in memory
+_CACHE_SIZE = 256
+
+STOPWORDS = {
+    'và', 'của', 'các', 'những', 'được', 'cho', 'với', 'là', 'có', 'trong', 'này', 'một', 'không',
+    'để', 'khi', 'thì', 'đã', 'sẽ', 'từ', 'theo', 'như', 'cũng', 'nhiều', 'nên', 'vào', 'ra', 'tại',
+    'đến', 'về', 'trên', 'dưới', 'hay', 'hoặc', 'nếu', 'mà', 'bởi', 'vì', 'còn', 'rất', 'đó', 'thể',
+    'sau', 'trước', 'giữa', 'nhưng', 'đang', 'phải', 'lại', 'chỉ', 'mỗi', 'nào', 'gì', 'ở',
+    'the', 'and', 'for', 'with', 'that', 'this', 'are', 'was', 'were', 'from', 'which', 'have', 'has',
+    'not', 'but', 'can', 'will', 'their', 'its', 'into', 'also', 'been', 'more', 'such', 'than',
+    'other', 'these', 'those', 'each', 'when', 'where', 'there', 'what', 'use', 'used', 'using', 'may',
+    'one', 'two', 'all', 'any', 'some', 'only', 'then', 'they', 'them', 'you', 'your', 'our', 'how',
+}
+
+# Câu hỏi tổng quát về cả file, không cần tìm kiếm đoạn trích (không dấu, chữ thường).
+# Chỉ khi câu hỏi nhắm vào cả file ("tóm tắt file này") hoặc không nêu chủ đề nào
+# ("tóm tắt giúp mình"); "tóm tắt chương 2" hay "overview of scheduling" vẫn tìm kiếm.
+_WHOLE_FILE = r'(file|tai lieu|van ban|bai|slide|sach|pdf|giao trinh)( nay| do)?\b'
+_WHOLE_FILE_EN = r"(this|the) (file|document|pdf|book|paper|slides?|text)\b(?!'s)"
+_POLITE = r'( (giup|cho) (minh|toi|em|to))?( di| nhe| voi| nha)?( (please|pls))?'
+OVERVIEW_PATTERNS = [
+    r'\b' + _WHOLE_FILE + r' (noi|viet|de cap|trinh bay) ve (gi|cai gi|van de gi)',
+    r'\b(tom tat|tom luoc|tong quan|khai quat|dan y|muc luc|noi dung( chinh| tong quat| tong quan)?)'
+    r'( (ve|cua|cho))? ' + _WHOLE_FILE,
+    r'^((hay|giup (minh|toi|em)|cho (minh|toi|em)) )?(tom tat|tom luoc|khai quat|tong quan|dan y|muc luc'
+    r'|noi dung (chinh|tong quat|tong quan)( la gi)?)' + _POLITE + r'[ .?!]*$',
+    r"\bwhat( is|'s) " + _WHOLE_FILE_EN + r'( mainly)? about\b',
+    r'\b(summari[sz]e|(summary|overview|outline|table of contents|main (topics|points|ideas)) of) ' + _WHOLE_FILE_EN,
+    r'^((please|can you|could you) )?(summari[sz]e|summary|overview|outline|table of contents|main (topics|points|ideas))'
+    r'( (it|this))?( please)?[ .?!]*$',
+]
+_OVERVIEW = re.compile('|'.join(OVERVIEW_PATTERNS))
+
+
+def is_overview_question(text):
+    """True for questions about the file as a whole, which the outline answers"""
+    return bool(_OVERVIEW.search(unidecode(text or '').lower()))
+
+
+def heading_level(line):
+    """Level of a heading line (1 = top), or None if the line doesn't look like one"""
+    line = line.strip()
+    match = _MARKDOWN.match(line)
+    if match:
+        return len(match.group(1))
+    if not 3 <= len(line) <= _MAX_HEADING_CHARS or len(line.split()) > _MAX_HEADING_WORDS:
+        return None
+    # Sentences, table rows, spreadsheet rows and table of contents entries aren't headings
+    stripped = line.rstrip(':')
+    if not stripped or stripped[-1] in '.,;' or ' | ' in line or '; ' in line or _LEADERS.search(line):
+        return None
+    if _CHAPTER.match(line):
+        return 1
+    if _SECTION.match(line):
+        return 2
+    match = _NUMBERED.match(line)
+    if match and match.group(2).isupper():
+        return match.group(1).count('.') + 1
+    if _ROMAN.match(line):
+        return 1
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) >= 4 and all(c.isupper() for c in letters):
+        return 1
+    return None
+
+
+def _clean_heading(line):
+    match = _MARKDOWN.match(line.strip())
+    return (match.group(2) if match else line).strip().rstrip(':').strip()
+
+
+class OutlineBuilder:
+    """Collects headings, pages and keywords chunk by chunk, in chunk order"""
+
+    def __init__(self):
+        self.headings = []
+        self.repeats = Counter()
+        self.terms = Counter()
+        self.chunks = 0
+        self.first_page = None
+        self.last_page = None
+        self.lead = ''
+
+    def add(self, chunk_index, text, page_start=None, page_end=None):
+        self.chunks += 1
+        if page_start is not None:
+            self.first_page = page_start if self.first_page is None else min(self.first_page, page_start)
+            self.last_page = max(self.last_page or page_start, page_end or page_start)
+        if len(self.lead) < OUTLINE_LEAD_CHARS:
+            self.lead = (self.lead + '\n\n' + text).strip()[:OUTLINE_LEAD_CHARS]
+
+        for line in text.split('\n'):
+            level = heading_level(line)
+            if level is None:
+                continue
+            title = _clean_heading(line)
+            self.repeats[title] += 1
+            if self.repeats[title] == 1:
+                self.headings.append({'title': title, 'level': level, 'chunk': chunk_index, 'page': page_start})
+
+        # Keywords count the chunks they appear in, so one long list doesn't dominate
+        terms = set()
+        for phrase in _PHRASE_BREAK.split(text.lower()):
+            words = [word for word in _WORD.findall(phrase) if not word.isdigit()]
+            terms.update(word for word in words if len(word) > 2 and word not in STOPWORDS)
+            # Vietnamese words are mostly two syllables
+            terms.update(f'{a} {b}' for a, b in zip(words, words[1:])
+                         if a not in STOPWORDS and b not in STOPWORDS and not (a.isascii() and b.isascii()))
+        self.terms.update(terms)
+        if len(self.terms) > _MAX_TERMS:
+            self.terms = Counter({term: count for term, count in self.terms.items() if count > 1})
+
+    def _sections(self):
+        headings = [h for h in self.headings if self.repeats[h['title']] <= _MAX_REPEATS]
+        # Too many headings: keep the upper levels only
+        while len(headings) > OUTLINE_MAX_SECTIONS:
+            deepest = max(h['level'] for h in headings)
+            if deepest == min(h['level'] for h in headings):
+                headings = headings[:OUTLINE_MAX_SECTIONS]
+                break
+            headings = [h for h in headings if h['level'] < deepest]
+
+        sections = []
+        for i, heading in enumerate(headings):
+            following = headings[i + 1] if i + 1 < len(headings) else None
+            section = dict(heading)
+            if heading['page'] is not None:
+                end_page = following['page'] if following and following['page'] is not None else self.last_page
+                section['page_end'] = max(heading['page'], end_page or heading['page'])
+            sections.append(section)
+        return sections
+
+    def _keywords(self):
+        ranked = [(term, count) for term, count in self.terms.most_common(OUTLINE_MAX_KEYWORDS * 3) if count > 1]
+        keywords = []
+        for term, count in ranked:
+            # A syllable that mostly occurs inside a frequent two-syllable word adds nothing
+            if ' ' not in term and any(other_count * 2 >= count and term in other.split()
+                                       for other, other_count in ranked if ' ' in other):
+                continue
+            keywords.append(term)
+            if len(keywords) == OUTLINE_MAX_KEYWORDS:
+                break
+        return keywords
+
+    def build(self):
+        """
+        Returns:
+            dict: The outline, as stored in file_outlines.outline
+        """
+        return {
+            'chunks': self.chunks,
+            'pages': [self.first_page, self.last_page] if self.first_page is not None else None,
+            'sections': self._sections(),
+            'keywords': self._keywords(),
+            'lead': self.lead
+        }
+
+
+def render_overview(outline, summary=None, filename=None):
+    """
+    Text of an outline (and summary) for a prompt.
+
+    Returns:
+        str: A few hundred tokens describing the whole file
+    """
+    lines = []
+    if filename:
+        lines.append(f'File: {filename}')
+    if outline.get('pages'):
+        lines.append(f"Pages: {outline['pages'][0]}–{outline['pages'][1]}")
+    if summary:
+        lines.append(f'Summary:\n{summary}')
+    if outline.get('sections'):
+        lines.append('Outline:')
+        for section in outline['sections']:
+            indent = '  ' * (min(section['level'], 4) - 1)
+            pages = ''
+            if section.get('page') is not None:
+                end = section.get('page_end', section['page'])
+                pages = f" (p. {section['page']})" if end == section['page'] else f" (p. {section['page']}–{end})"
+            lines.append(f"{indent}- {section['title']}{pages}")
+    if outline.get('keywords'):
+        lines.append('Keywords: ' + ', '.join(outline['keywords']))
+    if outline.get('lead') and not summary:
+        lines.append(f"Beginning of the file:\n{outline['lead']}")
+    return '\n'.join(lines)
+
+
+class OutlineCache:
+    """
+    LRU of (outline, summary) by the requested file_id.
+
+    Keyed by the file asked about rather than the file owning the chunks, so a hit
+    costs no user_files lookup; linked copies hold their own entry of the same
+    outline, and writes invalidate every file sharing the chunks.
+    """
+
+    def __init__(self, max_entries=_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_id):
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry is not None:
+                self._entries.move_to_end(file_id)
+            return entry
+
+    def put(self, file_id, entry):
+        with self._lock:
+            self._entries[file_id] = entry
+            self._entries.move_to_end(file_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, file_id):
+        with self._lock:
+            self._entries.pop(file_id, None)
+
+
+# Shared by every FileService instance
+outlines = OutlineCache()
@@ -1,105 +1,647 @@
+import hashlib
 import os
+import re
 import uuid
 import random
-from sentence_transformers import SentenceTransformer
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import numpy as np
 from werkzeug.utils import secure_filename
 from ..lib.supabase import supabase
+from ..config.settings import EMBEDDING_BATCH_SIZE, CHUNK_MAX_TOKENS, EMBEDDING_QUANTIZATION, USER_SEARCH_MAX_FILES
+from .embedding_service import get_embedding_service
+from .extractors import iter_file_text
+from .chunker import Chunker
+from .vector_index import FileVectorIndex, vector_indexes, parse_embedding
+from .embedding_codec import QUANTIZED_DTYPES, pack, to_pgvector
+from .bm25_index import BM25Builder, BM25Index, reciprocal_rank_fusion
+from .chunk_writer import ChunkWriter
+from .file_outline import OutlineBuilder, outlines, render_overview
 from ..utils.logger import Logger
 
 logger = Logger()
 
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    """Hex sha256 of a file on disk, read block by block"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
 class FileService:
     def __init__(self):
-        try:
-            # Load sentence-transformers model
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
-            self.embedding_dimension = 384  # Matches the model dimension
-            logger.log_with_timestamp('FILE_SERVICE', 'Sentence transformer model initialized')
-        except Exception as e:
-            logger.log_with_timestamp('FILE_SERVICE_ERROR', f'Failed to initialize model: {e}')
-            raise
+        # The model itself is shared by the whole process and loaded on first use
+        self.embeddings = get_embedding_service()
+        self.embedding_dimension = self.embeddings.dimension
+        self.supabase = supabase
+
+    def _query_embedding(self, text, embedding_version=None):
+        """
+        Embedding of a query by the model of an embedding version, so it is only
+        compared with chunk vectors of the same model
+        """
+        if embedding_version is None or embedding_version == self.embeddings.embedding_version:
+            return self.embeddings.embed_query(text)
+        return get_embedding_service(embedding_version).embed_query(text)
 
-    def _create_embedding(self, text):
-        """Generate proper embedding using sentence-transformers"""
+    def _create_embedding(self, text, embedding_version=None):
+        """
+        Generate the embedding of a query as a pgvector literal for the RPC,
+        repeated queries come from the shared cache
+        """
         try:
-            # Handle empty or very short text
-            if not text or len(text.strip()) < 3:
-                text = "empty document"
-                
-            # Get embedding from the model
-            embedding = self.model.encode(text)
-            # Convert to list for Supabase compatibility
-            return embedding.tolist()
+            return to_pgvector(self._query_embedding(text, embedding_version))
         except Exception as e:
             logger.log_with_timestamp('FILE_SERVICE_ERROR', f'Embedding generation error: {e}')
             # Fallback to zeros in case of error
-            return [0.0] * self.embedding_dimension
+            return to_pgvector(np.zeros(self.embedding_dimension, dtype=np.float32))
 
-    def save_file_and_chunks_to_supabase(self, user_id, file, file_content):
+    def _existing_embeddings(self, hashes):
         """
-        Save file metadata and its text chunks with embeddings into Supabase.
+        Embeddings of the current model already stored for chunks with these content
+        hashes, one per hash, as float32 arrays by hash. The RPC skips NULL and zero
+        vectors; zero vectors are also dropped here, rows stored before it did so
+        must not spread to new uploads.
+        """
+        try:
+            response = supabase.rpc('chunk_embeddings_by_hash', {
+                'p_hashes': list(set(hashes)),
+                'p_embedding_version': self.embeddings.embedding_version
+            }).execute()
+        except Exception as e:
+            logger.log_with_timestamp('FILE_SERVICE_ERROR', f'Failed to look up chunk hashes: {e}')
+            return {}
+        existing = {}
+        for row in response.data or []:
+            if row.get('embedding'):
+                embedding = parse_embedding(row['embedding'])
+                if embedding.any():
+                    existing[row['content_sha256']] = embedding
+        return existing
+
+    def _embed_chunks(self, chunks):
+        """
+        Yield (batch, content hashes, float32 embeddings) for each batch of an
+        iterable of chunks. Chunks whose text is already stored (another copy or an
+        earlier revision of the document) reuse that embedding instead of being encoded.
+        Encoding errors propagate, so the file is marked failed rather than stored
+        with empty vectors.
+        """
+        chunks = iter(chunks)
+        while True:
+            batch = list(islice(chunks, EMBEDDING_BATCH_SIZE))
+            if not batch:
+                return
+            hashes = [text_sha256(chunk.text) for chunk in batch]
+            embeddings = np.zeros((len(batch), self.embedding_dimension), dtype=np.float32)
+            existing = self._existing_embeddings(hashes)
+            missing = []
+            for i, content_hash in enumerate(hashes):
+                if content_hash in existing:
+                    embeddings[i] = existing[content_hash]
+                else:
+                    missing.append(i)
+            if missing:
+                # No fallback: a zero vector stored as the embedding would hide the chunk from
+                # search and be reused by later uploads, the ingestion job fails instead
+                embeddings[missing] = self.embeddings.embed_batch([batch[i].text for i in missing])
+            if len(missing) < len(batch):
+                logger.log_with_timestamp('FILE_SERVICE', f'Reused {len(batch) - len(missing)}/{len(batch)} chunk embeddings')
+            yield batch, hashes, embeddings
+
+    def create_file_record(self, user_id, filename, content_type, file_size, content_sha256=None):
+        """
+        Insert the user_files row in the 'processing' state.
         Returns the generated file_id.
         """
-        # create file_id and temp path
         file_id = str(uuid.uuid4())
-        filename = secure_filename(file.filename)
-        # metadata
-        file_size = len(file_content)
         meta = {
             'id': file_id,
             'user_id': user_id,
-            'filename': filename,
-            'content_type': file.content_type,
+            'filename': secure_filename(filename),
+            'content_type': content_type,
             'file_size_bytes': file_size,
+            'content_sha256': content_sha256,
+            'embedding_version': self.embeddings.embedding_version,
             'status': 'processing'
         }
         
         # Sử dụng phương thức đồng bộ thay vì await
         supabase.table('user_files').insert(meta).execute()
         logger.log_with_timestamp('FILE_SERVICE', f'Metadata inserted for {file_id}')
-        
-        # chunk text
-        chunks = [ file_content[i:i+500] for i in range(0, len(file_content), 400) ]
-        
-        # generate real embeddings using sentence-transformers
-        embeddings = [self._create_embedding(chunk) for chunk in chunks]
-        
-        # prepare records
-        records = []
-        for idx, (chunk, emb) in enumerate(zip(chunks, embeddings)):
-            records.append({
+        return file_id
+
+    def set_file_status(self, file_id, status):
+        supabase.table('user_files').update({'status': status}).eq('id', file_id).execute()
+        # An index loaded while the file was processing would miss chunks
+        vector_indexes.invalidate(file_id)
+
+    def iter_text(self, path, content_type, on_progress=None):
+        """
+        Yield the text of an uploaded file saved at path, piece by piece.
+        """
+        return iter_file_text(path, content_type, on_progress)
+
+    def iter_chunks(self, pieces):
+        """
+        Cut a stream of (page, text) pieces into sentence-aligned chunks sized in
+        model tokens, without joining the whole text first.
+        """
+        max_tokens = min(CHUNK_MAX_TOKENS, self.embeddings.max_tokens)
+        return Chunker(self.embeddings.count_tokens, max_tokens).chunks(pieces)
+
+    def chunk_text(self, file_content):
+        return list(self.iter_chunks([(None, file_content)]))
+
+    def store_chunks(self, file_id, chunks, on_batch=None):
+        """
+        Embed and insert Chunk objects (any iterable) batch by batch. Rows are
+        written by a ChunkWriter while the next batch is embedded, so only a few
+        batches of chunks and vectors are in memory. The keyword index and the
+        outline of the file are built on the way.
+        on_batch(done) is called after every embedded batch with the number of
+        committed chunks and may raise to stop.
+        Returns the number of stored chunks, once every row has committed.
+        """
+        keywords = BM25Builder()
+        outline = OutlineBuilder()
+        with ChunkWriter(supabase) as writer:
+            for batch, hashes, embeddings in self._embed_chunks(chunks):
+                self._write_batch(writer, keywords, file_id, batch, hashes, embeddings)
+                for chunk in batch:
+                    outline.add(chunk.index, chunk.text, chunk.page_start, chunk.page_end)
+                if on_batch:
+                    on_batch(writer.committed)
+        stats = writer.get_stats()
+        logger.log_with_timestamp(
+            'FILE_SERVICE',
+            f"Stored {stats['rows']} chunks of {file_id} in {stats['batches']} batches ({stats['bytes'] / 2**20:.1f} MiB)",
+            f"{stats['seconds']}s, {stats['rows_per_second']} chunks/s, {stats['retries']} retries"
+        )
+        self._save_keyword_index(file_id, keywords.build())
+        self._save_outline(file_id, outline.build())
+        return stats['rows']
+
+    def _write_batch(self, writer, keywords, file_id, batch, hashes, embeddings):
+        for chunk, content_hash, emb in zip(batch, hashes, embeddings):
+            keywords.add(chunk.index, chunk.text)
+            writer.add(self.chunk_record(file_id, {**chunk.to_record(), 'content_sha256': content_hash}, emb))
+
+    def chunk_record(self, file_id, fields, embedding):
+        """
+        file_chunks row of a chunk embedded by the current model.
+
+        Args:
+            file_id (str): File owning the chunk
+            fields (dict): chunk_index, content, pages, token_count and content_sha256 of the chunk
+            embedding (numpy.ndarray): Its float32 embedding
+
+        Returns:
+            dict: Row for ChunkWriter
+        """
+        record = {
+            'file_id': file_id,
+            **fields,
+            'embedding_version': self.embeddings.embedding_version,
+            'embedding': to_pgvector(embedding)
+        }
+        if EMBEDDING_QUANTIZATION in QUANTIZED_DTYPES:
+            record['embedding_q'] = pack(embedding, EMBEDDING_QUANTIZATION)
+        return record
+
+    def _save_keyword_index(self, file_id, keyword_index):
+        # Không lưu được thì index sẽ được dựng lại từ chunks khi tải
+        try:
+            supabase.table('file_keyword_indexes').upsert({
                 'file_id': file_id,
-                'chunk_index': idx,
-                'content': chunk,
-                'embedding': emb
-            })
-            
-        # batch insert
-        for i in range(0, len(records), 100):
-            batch = records[i:i+100]
-            supabase.table('file_chunks').insert(batch).execute()
+                'payload': keyword_index.to_compact()
+            }).execute()
+        except Exception as e:
+            logger.log_with_timestamp('FILE_SERVICE_ERROR', f'Failed to save keyword index of {file_id}: {str(e)}')
+
+    def _load_keyword_index(self, file_id, rows):
+        """The persisted BM25 index of a file, rebuilt from its chunks if there is none"""
+        try:
+            response = supabase.table('file_keyword_indexes').select('payload').eq('file_id', file_id).limit(1).execute()
+            if response.data:
+                return BM25Index.from_compact(response.data[0]['payload'])
+        except Exception as e:
+            logger.log_with_timestamp('FILE_SERVICE_ERROR', f'Failed to load keyword index of {file_id}: {str(e)}')
+        # Files ingested before keyword indexes existed
+        builder = BM25Builder()
+        for row in rows:
+            builder.add(row['chunk_index'], row['content'])
+        return builder.build()
+
+    def _save_outline(self, file_id, outline):
+        # Không lưu được thì outline sẽ được dựng lại từ chunks khi cần
+        try:
+            supabase.table('file_outlines').upsert({'file_id': file_id, 'outline': outline}).execute()
+            outlines.invalidate(file_id)
+        except Exception as e:
+            logger.log_with_timestamp('FILE_SERVICE_ERROR', f'Failed to save outline of {file_id}: {str(e)}')
+
+    def _build_outline(self, file_id, embedding_version, page_size=1000):
+        """Outline of a file ingested before outlines existed, from its chunk rows"""
+        outline = OutlineBuilder()
+        done = 0
+        while True:
+            rows = supabase.table('file_chunks') \
+                .select('chunk_index, content, page_start, page_end') \
+                .eq('file_id', file_id) \
+                .eq('embedding_version', embedding_version) \
+                .order('chunk_index') \
+                .range(done, done + page_size - 1) \
+                .execute().data or []
+            for row in rows:
+                outline.add(row['chunk_index'], row['content'], row.get('page_start'), row.get('page_end'))
+            done += len(rows)
+            if len(rows) < page_size:
+                break
+        if not done:
+            return None
+        outline = outline.build()
+        self._save_outline(file_id, outline)
+        return outline
+
+    def get_file_outline(self, file_id):
+        """
+        Outline and LLM summary of a file, cached in memory after the first read.
+
+        Returns:
+            tuple: (outline dict, summary or None), or None when the file has no chunks
+        """
+        entry = outlines.get(file_id)
+        if entry is not None:
+            return entry
+        chunk_file_id, embedding_version = self.chunk_location(file_id)
+        try:
+            response = supabase.table('file_outlines').select('outline, summary').eq('file_id', chunk_file_id).limit(1).execute()
+            if response.data:
+                entry = (response.data[0]['outline'], response.data[0].get('summary'))
+            else:
+                outline = self._build_outline(chunk_file_id, embedding_version)
+                entry = (outline, None) if outline else None
+        except Exception as e:
+            logger.log_with_timestamp('FILE_SERVICE_ERROR', f'Failed to load outline of {file_id}: {str(e)}')
+            return None
+        if entry is not None:
+            outlines.put(file_id, entry)
+        return entry
+
+    def get_file_overview(self, file_id, filename=None):
+        """Outline and summary of a file as prompt text, None if there is no outline"""
+        entry = self.get_file_outline(file_id)
+        if entry is None:
+            return None
+        outline, summary = entry
+        return render_overview(outline, summary, filename)
+
+    def save_file_summary(self, file_id, summary):
+        """Store the LLM summary next to the outline of the file owning the chunks"""
+        chunk_file_id, _ = self.chunk_location(file_id)
+        supabase.table('file_outlines').update({'summary': summary}).eq('file_id', chunk_file_id).execute()
+        for sharing_id in self._files_sharing_chunks(chunk_file_id):
+            outlines.invalidate(sharing_id)
+
+    def _files_sharing_chunks(self, file_id):
+        """A file owning chunks and the files linked to it"""
+        linked = supabase.table('user_files').select('id').eq('chunk_source_id', file_id).execute().data or []
+        return [file_id] + [file['id'] for file in linked]
+
+    def find_duplicate_file(self, content_sha256, file_id):
+        """
+        A ready file with the same content that owns its chunks, or None.
+        """
+        if not content_sha256:
+            return None
+        response = supabase.table('user_files') \
+            .select('id') \
+            .eq('content_sha256', content_sha256) \
+            .eq('status', 'ready') \
+            .is_('chunk_source_id', 'null') \
+            .neq('id', file_id) \
+            .limit(1) \
+            .execute()
+        return response.data[0]['id'] if response.data else None
+
+    def link_file(self, file_id, source_id):
+        """
+        Point a file at the chunks of an identical file instead of storing a copy.
+        The chunks are only copied (handed over) when the source file is deleted.
+        Returns the number of chunks of the source.
+        """
+        supabase.table('user_files').update({'chunk_source_id': source_id}).eq('id', file_id).execute()
+        _, embedding_version = self.chunk_location(source_id)
+        response = supabase.table('file_chunks') \
+            .select('chunk_index', count='exact') \
+            .eq('file_id', source_id) \
+            .eq('embedding_version', embedding_version) \
+            .limit(1) \
+            .execute()
+        logger.log_with_timestamp('FILE_SERVICE', f'File {file_id} reuses the chunks of {source_id}')
+        return response.count or 0
+
+    def chunk_location(self, file_id):
+        """
+        Where this file's chunks are: the file whose rows in file_chunks hold them
+        and the embedding version that is searched.
+
+        Returns:
+            tuple: (file_id, embedding_version)
+        """
+        try:
+            response = supabase.table('user_files').select('chunk_source_id, embedding_version').eq('id', file_id).limit(1).execute()
+            row = response.data[0] if response.data else {}
+            if row.get('chunk_source_id'):
+                file_id = row['chunk_source_id']
+                response = supabase.table('user_files').select('embedding_version').eq('id', file_id).limit(1).execute()
+                row = response.data[0] if response.data else {}
+            if row.get('embedding_version'):
+                return file_id, row['embedding_version']
+        except Exception as e:
+            logger.log_with_timestamp('FILE_SERVICE_ERROR', f'Failed to resolve chunks of {file_id}: {str(e)}')
+        return file_id, self.embeddings.embedding_version
+
+    def switch_embedding_version(self, file_id, old_version, new_version):
+        """
+        Make the chunk rows of new_version the searched ones, in a single update of
+        user_files, then delete the rows of the old version.
+
+        Returns:
+            bool: False if the file was deleted or switched by someone else meanwhile
+        """
+        response = supabase.table('user_files') \
+            .update({'embedding_version': new_version}) \
+            .eq('id', file_id) \
+            .eq('embedding_version', old_version) \
+            .execute()
+        if not response.data:
+            return False
+        supabase.table('file_chunks').delete().eq('file_id', file_id).neq('embedding_version', new_version).execute()
+        # Files linked to this one search its chunks too
+        for sharing_id in self._files_sharing_chunks(file_id):
+            vector_indexes.invalidate(sharing_id)
+        logger.log_with_timestamp('FILE_SERVICE', f'File {file_id} switched from {old_version} to {new_version}')
+        return True
+
+    def delete_file(self, file_id, user_id):
+        """
+        Delete a user's file. Chunks referenced by identical files are handed over
+        to the oldest of them, otherwise the cascade deletes them.
+        """
+        heirs = supabase.table('user_files') \
+            .select('id') \
+            .eq('chunk_source_id', file_id) \
+            .order('created_at') \
+            .execute().data or []
+        if heirs:
+            owner = supabase.table('user_files').select('id, embedding_version').eq('id', file_id).eq('user_id', user_id).limit(1).execute()
+            if not owner.data:
+                return
+            heir = heirs[0]['id']
+            supabase.table('file_chunks').update({'file_id': heir}).eq('file_id', file_id).execute()
+            supabase.table('file_keyword_indexes').update({'file_id': heir}).eq('file_id', file_id).execute()
+            supabase.table('file_outlines').update({'file_id': heir}).eq('file_id', file_id).execute()
+            supabase.table('user_files').update({'chunk_source_id': heir}).eq('chunk_source_id', file_id).neq('id', heir).execute()
+            supabase.table('user_files').update({
+                'chunk_source_id': None,
+                'embedding_version': owner.data[0].get('embedding_version')
+            }).eq('id', heir).execute()
+            logger.log_with_timestamp('FILE_SERVICE', f'Chunks of {file_id} handed over to {heir}')
+        vector_indexes.invalidate(file_id)
+        outlines.invalidate(file_id)
+        supabase.table('user_files').delete().eq('id', file_id).eq('user_id', user_id).execute()
+
+    def save_file_and_chunks_to_supabase(self, user_id, file, file_content):
+        """
+        Save file metadata and its text chunks with embeddings into Supabase.
+        Returns the generated file_id.
+        """
+        content_sha256 = text_sha256(file_content)
+        file_id = self.create_file_record(user_id, file.filename, file.content_type, len(file_content), content_sha256)
+        source_id = self.find_duplicate_file(content_sha256, file_id)
+        if source_id:
+            total = self.link_file(file_id, source_id)
+        else:
+            total = self.store_chunks(file_id, self.chunk_text(file_content))
             
         # update status
-        supabase.table('user_files').update({'status':'ready'}).eq('id', file_id).execute()
-        logger.log_with_timestamp('FILE_SERVICE', f'File {file_id} saved with {len(records)} chunks')
+        self.set_file_status(file_id, 'ready')
+        logger.log_with_timestamp('FILE_SERVICE', f'File {file_id} saved with {total} chunks')
         return file_id
 
+    def _load_chunk_rows(self, file_id, embedding_version, page_size=1000):
+        """
+        All chunk rows of a file in one embedding version with their embeddings, in chunk order.
+        With quantization on, only the packed vectors are transferred, plus the
+        float vectors of chunks stored before quantization was enabled.
+        """
+        quantized = EMBEDDING_QUANTIZATION in QUANTIZED_DTYPES
+        columns = 'chunk_index, content, embedding_q' if quantized else 'chunk_index, content, embedding'
+        rows = []
+        while True:
+            response = supabase.table('file_chunks') \
+                .select(columns) \
+                .eq('file_id', file_id) \
+                .eq('embedding_version', embedding_version) \
+                .order('chunk_index') \
+                .range(len(rows), len(rows) + page_size - 1) \
+                .execute()
+            data = response.data or []
+            rows.extend(data)
+            if len(data) < page_size:
+                break
+
+        unpacked = {row['chunk_index']: row for row in rows if quantized and not row.get('embedding_q')}
+        missing = list(unpacked)
+        for start in range(0, len(missing), page_size):
+            response = supabase.table('file_chunks') \
+                .select('chunk_index, embedding') \
+                .eq('file_id', file_id) \
+                .eq('embedding_version', embedding_version) \
+                .in_('chunk_index', missing[start:start + page_size]) \
+                .execute()
+            for row in response.data or []:
+                unpacked[row['chunk_index']]['embedding'] = row['embedding']
+        return rows
+
+    def get_vector_index(self, file_id):
+        """
+        Local vector index of a file, loaded from file_chunks on first access.
+        Returns None when the file has no chunks yet or loading fails.
+        """
+        index = vector_indexes.get(file_id)
+        if index is not None:
+            return index
+        try:
+            started = time.perf_counter()
+            chunk_file_id, embedding_version = self.chunk_location(file_id)
+            rows = self._load_chunk_rows(chunk_file_id, embedding_version)
+            if not rows:
+                return None
+            # The dimension of an older model is read from its vectors
+            dimension = self.embedding_dimension if embedding_version == self.embeddings.embedding_version else None
+            index = FileVectorIndex.from_rows(file_id, rows, dimension, self._load_keyword_index(chunk_file_id, rows),
+                                              embedding_version=embedding_version)
+        except Exception as e:
+            logger.log_with_timestamp('FILE_SERVICE_ERROR', f'Failed to load vector index of {file_id}: {str(e)}')
+            return None
+        vector_indexes.put(index)
+        logger.log_with_timestamp(
+            'FILE_SERVICE',
+            f'Loaded vector index of {file_id}: {len(index)} chunks in {time.perf_counter() - started:.2f}s'
+        )
+        return index
+
+    def _local_hits(self, query, file_id, top_k, match_threshold):
+        """
+        Hybrid search in the file's local index: vector and BM25 rankings merged
+        with reciprocal-rank fusion. Returns None when there is no local index.
+
+        Returns:
+            list: (chunk_index, content) pairs, most relevant first
+        """
+        index = self.get_vector_index(file_id)
+        if index is None:
+            return None
+
+        started = time.perf_counter()
+        query_embedding = self._query_embedding(query, index.embedding_version)
+        search_started = time.perf_counter()
+        # Each ranking brings more candidates than needed so fusion can reorder them
+        candidates = top_k * 3
+        vector_rows = [row for _, row in index.search(query_embedding, candidates, match_threshold)]
+        keyword_rows = [row for _, row in index.keyword_search(query, candidates)]
+        rows = reciprocal_rank_fusion([vector_rows, keyword_rows])[:top_k]
+        hits = [(int(index.chunk_indexes[row]), index.contents[row]) for row in rows]
+        search_ms = (time.perf_counter() - search_started) * 1000
+
+        logger.log_with_timestamp(
+            'FILE_SERVICE',
+            f'Local search found {len(hits)} chunks ({len(vector_rows)} vector, {len(keyword_rows)} keyword candidates)',
+            f'Search {search_ms:.2f}ms, total {(time.perf_counter() - started) * 1000:.1f}ms'
+        )
+        return hits
+
+    def _local_search(self, query, file_id, top_k, match_threshold):
+        hits = self._local_hits(query, file_id, top_k, match_threshold)
+        return None if hits is None else [content for _, content in hits]
+
+    def search_chunk_hits(self, query, file_id, top_k=10):
+        """
+        Like search_relevant_chunks_in_supabase, with the position of each chunk
+        in the document where it is known. Empty when the file's local index has
+        no match, instead of a random sample of chunks.
+
+        Returns:
+            list: (chunk_index or None, content) pairs, most relevant first
+        """
+        hits = self._local_hits(query, file_id, top_k, 0.5)
+        if hits is not None:
+            # Nothing found: the caller answers from the file's outline
+            return hits
+        return [(None, content) for content in self.search_relevant_chunks_in_supabase(query, file_id, top_k)]
+
+    def _get_vector_indexes(self, file_ids, max_workers=4):
+        """Local indexes of several files, the ones not cached yet are loaded in parallel"""
+        indexes = {file_id: vector_indexes.get(file_id) for file_id in file_ids}
+        missing = [file_id for file_id, index in indexes.items() if index is None]
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as pool:
+                for file_id, index in zip(missing, pool.map(self.get_vector_index, missing)):
+                    indexes[file_id] = index
+        return {file_id: index for file_id, index in indexes.items() if index is not None}
+
+    def search_user_chunk_hits(self, query, user_id, top_k=10, match_threshold=0.5):
+        """
+        Search all ready files of a user in one pass over their local indexes.
+
+        Each file's index is a shard: vector and BM25 candidates of every shard are
+        ranked together and merged with reciprocal-rank fusion, so the cost is one
+        query for the file list plus in-memory searches.
+
+        Returns:
+            list: (chunk_index, content, filename) tuples, most relevant first
+        """
+        started = time.perf_counter()
+        files = supabase.table('user_files') \
+            .select('id, filename') \
+            .eq('user_id', user_id) \
+            .eq('status', 'ready') \
+            .order('created_at', desc=True) \
+            .limit(USER_SEARCH_MAX_FILES) \
+            .execute().data or []
+        filenames = {f['id']: f.get('filename') or f['id'] for f in files}
+        indexes = self._get_vector_indexes(list(filenames))
+        if not indexes:
+            return []
+
+        # Files not re-indexed yet are searched with the model of their own version
+        query_embeddings = {}
+        candidates = top_k * 3
+        vector_hits, keyword_hits = [], []
+        for file_id, index in indexes.items():
+            if index.embedding_version not in query_embeddings:
+                query_embeddings[index.embedding_version] = self._query_embedding(query, index.embedding_version)
+            query_embedding = query_embeddings[index.embedding_version]
+            vector_hits += [(score, (file_id, row)) for score, row in index.search(query_embedding, candidates, match_threshold)]
+            keyword_hits += [(score, (file_id, row)) for score, row in index.keyword_search(query, candidates)]
+        # BM25 scores use each file's own idf, close enough to pick candidates across files
+        vector_hits.sort(key=lambda hit: hit[0], reverse=True)
+        keyword_hits.sort(key=lambda hit: hit[0], reverse=True)
+        keys = reciprocal_rank_fusion([
+            [key for _, key in vector_hits[:candidates]],
+            [key for _, key in keyword_hits[:candidates]]
+        ])[:top_k]
+
+        hits = []
+        for file_id, row in keys:
+            index = indexes[file_id]
+            hits.append((int(index.chunk_indexes[row]), index.contents[row], filenames[file_id]))
+        logger.log_with_timestamp(
+            'FILE_SERVICE',
+            f'User search over {len(indexes)}/{len(files)} files found {len(hits)} chunks',
+            f'{(time.perf_counter() - started) * 1000:.1f}ms'
+        )
+        return hits
+
     def search_relevant_chunks_in_supabase(self, query, file_id, top_k=10):
         """
-        Query Supabase RPC to retrieve top_k similar chunks for given query and file.
+        Retrieve top_k similar chunks for given query and file, from the local
+        vector index when possible and the Supabase RPC otherwise.
         Returns list of text chunks.
         """
-        # generate embedding for query using sentence-transformers
-        emb = self._create_embedding(query)
+        # Set cosine similarity threshold for semantic matching
+        match_threshold = 0.5  # Higher value for better quality matches
         
-        try:
-            # Set cosine similarity threshold for semantic matching
-            match_threshold = 0.5  # Higher value for better quality matches
+        chunks = self._local_search(query, file_id, top_k, match_threshold)
+        if chunks is not None:
+            if not chunks:
+                logger.log_with_timestamp('FILE_SERVICE', f'No matching chunks found, using fallback')
+                return self._get_fallback_chunks(file_id, top_k)
+            return chunks
             
-            # call RPC for vector search - Cập nhật tham số file_id thành p_file_id để phù hợp với SQL function
-            response = supabase.rpc('match_file_chunks', {
+        # generate embedding for query using the model that embedded the file's chunks
+        chunk_file_id, embedding_version = self.chunk_location(file_id)
+        emb = self._create_embedding(query, embedding_version)
+        
+        try:
+            # call RPC for vector search - chỉ so sánh với vector cùng embedding_version
+            response = supabase.rpc('match_file_chunks_versioned', {
                 'query_embedding': emb,
-                'p_file_id': file_id,  # Đã đổi từ match_file_id thành p_file_id
+                'p_file_id': chunk_file_id,  # Đã đổi từ match_file_id thành p_file_id
+                'p_embedding_version': embedding_version,
                 'match_threshold': match_threshold,
                 'match_count': top_k
             }).execute()
@@ -156,11 +698,19 @@ class FileService:
             
     def _get_fallback_chunks(self, file_id, count=5):
         """
-        Lấy một số chunks ngẫu nhiên từ file khi không tìm được kết quả tương đồng.
+        Khi không tìm được kết quả tương đồng: dùng outline/tóm tắt của file nếu có,
+        nếu không thì lấy một số chunks ngẫu nhiên từ file.
         """
         try:
+            # Một lần đọc (thường đã có trong cache) và prompt ngắn hơn nhiều so với 50 chunks
+            overview = self.get_file_overview(file_id)
+            if overview:
+                return [overview]
+
             # Lấy tất cả các chunks của file và trả về một số ngẫu nhiên
-            response = supabase.table('file_chunks').select('content').eq('file_id', file_id).limit(50).execute()
+            chunk_file_id, embedding_version = self.chunk_location(file_id)
+            response = supabase.table('file_chunks').select('content') \
+                .eq('file_id', chunk_file_id).eq('embedding_version', embedding_version).limit(50).execute()
             
             data = []
             if hasattr(response, 'data'):
@@ -195,52 +745,28 @@ class FileService:
         Bổ sung cho vector search khi cần nhiều kết quả hơn
         """
         try:
-            # Chuẩn bị từ khóa từ query
-            # Loại bỏ stop words và lấy các từ khóa chính
+            # Xếp hạng BM25 trên index của file, không cần truy vấn Supabase
+            index = self.get_vector_index(file_id)
+            if index is not None:
+                return [index.contents[row] for _, row in index.keyword_search(query, limit)]
+
+            # Không có index: một truy vấn duy nhất với OR thay vì một truy vấn cho mỗi từ khóa
             keywords = [word.lower() for word in query.split() if len(word) > 3]
-            
+            # Bỏ các ký tự có nghĩa trong cú pháp filter của PostgREST
+            keywords = [re.sub(r'[,()*%\\]', '', keyword) for keyword in keywords]
+            keywords = [keyword for keyword in keywords if keyword]
             if not keywords:
                 return []
                 
-            # Tạo điều kiện tìm kiếm với phương pháp placeholders an toàn thay vì nối chuỗi trực tiếp
-            # Sử dụng Postgres Full Text Search hoặc ILIKE với escape đúng cách
-            search_results = []
-            
-            # Thực hiện tìm kiếm riêng cho từng từ khóa để tránh lỗi cú pháp SQL
-            for keyword in keywords:
-                # Escape single quotes by doubling them for SQL
-                safe_keyword = keyword.replace("'", "''")
-                
-                try:
-                    # Use parameterized query if available, otherwise escape manually
-                    response = supabase.table('file_chunks') \
-                        .select('content') \
-                        .eq('file_id', file_id) \
-                        .ilike('content', f'%{safe_keyword}%') \
-                        .limit(limit) \
-                        .execute()
-                    
-                    if hasattr(response, 'data') and response.data:
-                        for item in response.data:
-                            if isinstance(item, dict) and 'content' in item:
-                                content = item['content']
-                                if content not in search_results:
-                                    search_results.append(content)
-                                    
-                                    # Stop if we have enough results
-                                    if len(search_results) >= limit:
-                                        break
-                    
-                except Exception as keyword_error:
-                    logger.log_with_timestamp('FILE_SERVICE_ERROR', f'Error in keyword search for term "{safe_keyword}": {str(keyword_error)}')
-                    # Continue to next keyword rather than failing completely
-                    continue
-                    
-                # Stop if we have enough results
-                if len(search_results) >= limit:
-                    break
-            
-            return search_results
+            chunk_file_id, embedding_version = self.chunk_location(file_id)
+            response = supabase.table('file_chunks') \
+                .select('content') \
+                .eq('file_id', chunk_file_id) \
+                .eq('embedding_version', embedding_version) \
+                .or_(','.join(f'content.ilike.*{keyword}*' for keyword in keywords)) \
+                .limit(limit) \
+                .execute()
+            return [item['content'] for item in (response.data or []) if isinstance(item, dict) and 'content' in item]
             
         except Exception as e:
             logger.log_with_timestamp('FILE_SERVICE_ERROR', f'Error in keyword search: {str(e)}')
@@ -256,17 +782,23 @@ class FileService:
             # Set cosine similarity threshold for semantic matching
             match_threshold = 0.5  # Higher value for better quality matches
             
-            # Embed câu query với sentence-transformers
-            embedding = self._create_embedding(query)
+            chunks = self._local_search(query, file_id, top_k, match_threshold)
+            if chunks is not None:
+                return chunks
+            
+            # Embed câu query với model đã tạo embedding cho các chunks của file
+            chunk_file_id, embedding_version = self.chunk_location(file_id)
+            embedding = self._create_embedding(query, embedding_version)
             
             # Vector search với số lượng chunks tăng lên
             response = supabase.rpc(
-                'match_file_chunks',
+                'match_file_chunks_versioned',
                 {
                     'query_embedding': embedding,
                     'match_threshold': match_threshold,
                     'match_count': top_k,
-                    'p_file_id': file_id
+                    'p_file_id': chunk_file_id,
+                    'p_embedding_version': embedding_version
                 }
             ).execute()
             
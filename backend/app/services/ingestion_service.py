@@ -0,0 +1,239 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .file_service import file_sha256
+from .extractors import validate_upload
+from ..config.settings import INGESTION_WORKERS, INGESTION_MAX_PENDING, INGESTION_JOB_TTL, FILE_SUMMARY_ENABLED
+from ..utils.logger import Logger
+
+logger = Logger()
+
+
+class IngestionQueueFull(Exception):
+    """Raised when INGESTION_MAX_PENDING uploads are already waiting or running"""
+
+
+class IngestionCancelled(Exception):
+    """Raised inside a job when its cancellation was requested"""
+
+
+class IngestionJob:
+    """Progress of one uploaded file through extract -> chunk -> embed -> insert"""
+
+    def __init__(self, file_id, user_id, filename, content_type, path, content_sha256=None):
+        self.file_id = file_id
+        self.user_id = user_id
+        self.filename = filename
+        self.content_type = content_type
+        self.path = path
+        self.content_sha256 = content_sha256
+        self.status = 'queued'
+        self.stage = 'queued'
+        self.progress = 0.0
+        self.chunks_total = 0
+        self.chunks_done = 0
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.cancel_event = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in ('ready', 'failed', 'cancelled')
+
+    def update(self, **fields):
+        for key, value in fields.items():
+            setattr(self, key, value)
+        self.updated_at = time.time()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise IngestionCancelled()
+
+    def to_dict(self):
+        return {
+            'file_id': self.file_id,
+            'filename': self.filename,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': round(self.progress, 3),
+            'chunks_total': self.chunks_total,
+            'chunks_done': self.chunks_done,
+            'error': self.error
+        }
+
+
+class IngestionService:
+    """
+    Background ingestion of uploaded files.
+
+    submit() takes over the upload already on disk, inserts the user_files row
+    ('processing') and returns right away; the remaining stages run on a bounded
+    worker pool. Jobs can be polled with get_status() and stopped with cancel().
+    With FILE_SUMMARY_ENABLED, summarizer(file_id) runs on the same pool once a
+    new file is ready, so the file can be used before its summary exists.
+    """
+
+    def __init__(self, file_service, max_workers=INGESTION_WORKERS, max_pending=INGESTION_MAX_PENDING,
+                 summarizer=None):
+        self.file_service = file_service
+        self.summarizer = summarizer
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingestion')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        """Forget finished jobs older than INGESTION_JOB_TTL (caller holds the lock)"""
+        cutoff = time.time() - INGESTION_JOB_TTL
+        for file_id in [fid for fid, job in self._jobs.items() if job.finished and job.updated_at < cutoff]:
+            del self._jobs[file_id]
+
+    def submit(self, user_id, filename, content_type, path):
+        """
+        Queue an uploaded file for ingestion.
+
+        Args:
+            user_id (str): Owner of the file
+            filename (str): Name of the upload
+            content_type (str): MIME type sent with the upload
+            path (str): The upload on disk, owned by the service from now on
+
+        Returns:
+            IngestionJob: The queued job, its file_id is already in user_files
+
+        Raises:
+            IngestionQueueFull: Too many uploads in progress
+            ExtractionError: The file is over a size or page limit
+        """
+        try:
+            with self._lock:
+                self._prune()
+                pending = sum(1 for job in self._jobs.values() if not job.finished)
+                if pending >= self.max_pending:
+                    raise IngestionQueueFull(f'{pending} files are already being processed, please try again later')
+
+            validate_upload(path, content_type)
+            content_sha256 = file_sha256(path)
+            file_id = self.file_service.create_file_record(
+                user_id, filename, content_type, os.path.getsize(path), content_sha256
+            )
+        except Exception:
+            os.remove(path)
+            raise
+
+        job = IngestionJob(file_id, user_id, filename, content_type, path, content_sha256)
+        with self._lock:
+            self._jobs[file_id] = job
+        self._executor.submit(self._run, job)
+        logger.log_with_timestamp('INGESTION', f'Queued {filename} as {file_id}')
+        return job
+
+    def _run(self, job):
+        started = time.perf_counter()
+        try:
+            job.check_cancelled()
+            job.update(status='processing', stage='extract', progress=0.0)
+
+            def on_progress(fraction):
+                # Pages are extracted, chunked and embedded as a stream, so the
+                # share of the file read is the share of the work done
+                job.update(progress=min(fraction, 0.99))
+
+            def on_batch(done):
+                job.update(stage='embed', chunks_done=done)
+                job.check_cancelled()
+
+            # The same document was already ingested (by anyone): reuse its chunks
+            source_id = self.file_service.find_duplicate_file(job.content_sha256, job.file_id)
+            if source_id:
+                job.update(stage='link')
+                total = self.file_service.link_file(job.file_id, source_id)
+                job.update(chunks_done=total)
+            else:
+                pieces = self.file_service.iter_text(job.path, job.content_type, on_progress)
+                chunks = self.file_service.iter_chunks(pieces)
+                total = self.file_service.store_chunks(job.file_id, chunks, on_batch)
+            job.update(chunks_total=total, chunks_done=total)
+            self.file_service.set_file_status(job.file_id, 'ready')
+            job.update(status='ready', stage='done', progress=1.0)
+            logger.log_with_timestamp(
+                'INGESTION',
+                f'File {job.file_id} ready with {job.chunks_done} chunks in {time.perf_counter() - started:.1f}s'
+            )
+            # Linked files share the outline and summary of their source
+            if FILE_SUMMARY_ENABLED and self.summarizer and not source_id:
+                self._executor.submit(self._summarize, job.file_id)
+        except IngestionCancelled:
+            job.update(status='cancelled', stage='cancelled')
+            self._discard(job)
+            logger.log_with_timestamp('INGESTION', f'File {job.file_id} cancelled at {job.chunks_done} chunks')
+        except Exception as e:
+            job.update(status='failed', error=str(e))
+            logger.log_with_timestamp('INGESTION_ERROR', f'File {job.file_id} failed during {job.stage}: {str(e)}')
+            try:
+                self.file_service.set_file_status(job.file_id, 'failed')
+            except Exception as status_error:
+                logger.log_with_timestamp('INGESTION_ERROR', f'Could not mark {job.file_id} as failed: {str(status_error)}')
+        finally:
+            if os.path.exists(job.path):
+                os.remove(job.path)
+
+    def _summarize(self, file_id):
+        try:
+            self.summarizer(file_id)
+        except Exception as e:
+            # The outline is still there for overview questions
+            logger.log_with_timestamp('INGESTION_ERROR', f'Could not summarize {file_id}: {str(e)}')
+
+    def _discard(self, job):
+        """Remove a cancelled file, its chunks are deleted by the cascade"""
+        try:
+            self.file_service.delete_file(job.file_id, job.user_id)
+        except Exception as e:
+            logger.log_with_timestamp('INGESTION_ERROR', f'Could not remove cancelled file {job.file_id}: {str(e)}')
+
+    def get_status(self, file_id, user_id):
+        """
+        Status of a file's ingestion.
+
+        Jobs of other workers or from before a restart are answered from user_files.
+
+        Returns:
+            dict: Job status, or None if the user has no such file
+        """
+        with self._lock:
+            job = self._jobs.get(file_id)
+        if job is not None:
+            return job.to_dict() if job.user_id == user_id else None
+
+        response = self.file_service.supabase.table('user_files') \
+            .select('id, filename, status') \
+            .eq('id', file_id).eq('user_id', user_id) \
+            .limit(1).execute()
+        if not response.data:
+            return None
+        row = response.data[0]
+        return {
+            'file_id': row['id'],
+            'filename': row.get('filename'),
+            'status': row.get('status'),
+            'stage': None,
+            'progress': 1.0 if row.get('status') == 'ready' else None
+        }
+
+    def cancel(self, file_id, user_id):
+        """
+        Request cancellation of a queued or running job.
+
+        Returns:
+            bool: True if the job was found and not finished yet
+        """
+        with self._lock:
+            job = self._jobs.get(file_id)
+        if job is None or job.user_id != user_id or job.finished:
+            return False
+        job.cancel_event.set()
+        logger.log_with_timestamp('INGESTION', f'Cancellation requested for {file_id}')
+        return True
@@ -0,0 +1,160 @@
+"""
+ONNX Runtime backend for the sentence-transformers embedding model.
+
+The transformer of the model is exported to ONNX once (and, by default,
+dynamically quantized to int8) into ONNX_MODEL_DIR. Pooling and normalization
+are done in NumPy the same way as the model's own modules, so the vectors match
+the ones produced by SentenceTransformer.encode up to quantization error (see
+benchmarks/bench_embedding_backends.py).
+
+OnnxEmbeddingModel has the parts of the SentenceTransformer interface that
+EmbeddingService uses: encode(), tokenizer, max_seq_length and
+get_sentence_embedding_dimension().
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+from ..utils.logger import Logger
+
+logger = Logger()
+
+CONFIG_FILE = 'embedding_config.json'
+FP32_FILE = 'model.onnx'
+INT8_FILE = 'model_int8.onnx'
+
+_export_lock = threading.Lock()
+
+
+def model_dir_for(base_dir, model_name):
+    return os.path.join(base_dir, model_name.replace('/', '__'))
+
+
+def export_model(model_name, target_dir):
+    """
+    Export a sentence-transformers model to ONNX with an int8 copy.
+
+    Needs torch and sentence-transformers; runs once per model, the result is
+    written to a temporary directory and moved into place when complete.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    model = SentenceTransformer(model_name, device='cpu')
+    transformer = model[0].auto_model.eval()
+    pooling = next((module for module in model if type(module).__name__ == 'Pooling'), None)
+    if pooling is not None and getattr(pooling, 'pooling_mode_cls_token', False):
+        pooling_mode = 'cls'
+    elif pooling is not None and getattr(pooling, 'pooling_mode_max_tokens', False):
+        pooling_mode = 'max'
+    else:
+        pooling_mode = 'mean'
+
+    work_dir = tempfile.mkdtemp(prefix='onnx-export-', dir=os.path.dirname(target_dir))
+    try:
+        sample = model.tokenizer(['export sample'], return_tensors='pt')
+        input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['last_hidden_state']}
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                tuple(sample[name] for name in input_names),
+                os.path.join(work_dir, FP32_FILE),
+                input_names=input_names,
+                output_names=['last_hidden_state'],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+        quantize_dynamic(os.path.join(work_dir, FP32_FILE), os.path.join(work_dir, INT8_FILE),
+                         weight_type=QuantType.QInt8)
+        model.tokenizer.save_pretrained(work_dir)
+        with open(os.path.join(work_dir, CONFIG_FILE), 'w') as config_file:
+            json.dump({
+                'model': model_name,
+                'max_seq_length': model.max_seq_length,
+                'dimension': model.get_sentence_embedding_dimension(),
+                'pooling': pooling_mode,
+                'normalize': any(type(module).__name__ == 'Normalize' for module in model),
+                'input_names': input_names
+            }, config_file)
+        # Another process may have finished the same export first
+        if os.path.exists(target_dir):
+            shutil.rmtree(work_dir)
+        else:
+            os.rename(work_dir, target_dir)
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+
+class OnnxEmbeddingModel:
+    """
+    Args:
+        model_dir (str): Directory written by export_model
+        quantized (bool): Use the int8 model
+        intra_op_threads (int): ONNX Runtime threads per inference, 0 for its default
+    """
+
+    def __init__(self, model_dir, quantized=True, intra_op_threads=0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, CONFIG_FILE)) as config_file:
+            self.config = json.load(config_file)
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, INT8_FILE if quantized else FP32_FILE),
+            options,
+            providers=['CPUExecutionProvider']
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = self.config['max_seq_length']
+        self.input_names = self.config['input_names']
+        self.quantized = quantized
+
+    def get_sentence_embedding_dimension(self):
+        return self.config['dimension']
+
+    def _pool(self, hidden, attention_mask):
+        if self.config['pooling'] == 'cls':
+            return hidden[:, 0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        if self.config['pooling'] == 'max':
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=False,
+               show_progress_bar=False):
+        """Same contract as SentenceTransformer.encode for a list of texts"""
+        # Longest first, as sentence-transformers does, so batches need little padding
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        embeddings = np.empty((len(texts), self.config['dimension']), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = order[start:start + batch_size]
+            encoded = self.tokenizer([texts[i] for i in batch], padding=True, truncation=True,
+                                     max_length=self.max_seq_length, return_tensors='np')
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(['last_hidden_state'], feeds)[0]
+            embeddings[batch] = self._pool(hidden, encoded['attention_mask'])
+        if normalize_embeddings or self.config['normalize']:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.clip(norms, 1e-12, None)
+        return embeddings
+
+
+def load_onnx_model(model_name, base_dir, quantized=True, intra_op_threads=0):
+    """Load the ONNX copy of a model, exporting it first if there is none"""
+    model_dir = model_dir_for(base_dir, model_name)
+    if not os.path.exists(os.path.join(model_dir, CONFIG_FILE)):
+        with _export_lock:
+            if not os.path.exists(os.path.join(model_dir, CONFIG_FILE)):
+                os.makedirs(base_dir, exist_ok=True)
+                logger.log_with_timestamp('EMBEDDING_SERVICE', f'Exporting {model_name} to ONNX in {model_dir}')
+                export_model(model_name, model_dir)
+    return OnnxEmbeddingModel(model_dir, quantized, intra_op_threads)
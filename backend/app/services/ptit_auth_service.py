@@ -1,5 +1,7 @@
+import asyncio
 from datetime import datetime, timedelta
 import requests
+from .uis_paginator import UISPaginator
 from ..utils.logger import Logger
 
 logger = Logger()
@@ -9,6 +11,9 @@ class PTITAuthService:
         self.base_url = "https://uis.ptithcm.edu.vn/api"
         self.access_token = None
         self.token_expiry = None
+        self.username = None
+        self.semesters = None
+        self.paginator = UISPaginator()
 
     def login(self, username, password):
         """Authenticate with PTIT API and get access token"""
@@ -26,6 +31,7 @@ class PTITAuthService:
             if response.ok:
                 data = response.json()
                 self.access_token = data.get('access_token')
+                self.username = username
                 # Set token expiry (typically 24 hours from now)
                 self.token_expiry = datetime.now() + timedelta(hours=2)
                 return True, None
@@ -79,8 +85,12 @@ class PTITAuthService:
         except Exception as e:
             return False, str(e)
 
-    def get_current_semester(self):
-        """Get current semester information from PTIT API"""
+    def get_semesters(self):
+        """Get every semester of the user from PTIT API, most recent first
+
+        Returns:
+            tuple: (list of semesters, error message or None)
+        """
         if not self.access_token:
             return None, "Not authenticated"
 
@@ -90,39 +100,84 @@ class PTITAuthService:
                 'Authorization': f'Bearer {self.access_token}',
                 'Content-Type': 'application/json'
             }
-            data = {
-                "filter": {"is_tieng_anh": None},
-                "additional": {
-                    "paging": {"limit": 100, "page": 1},
-                    "ordering": [{"name": "hoc_ky", "order_type": 1}]
-                }
-            }
-
-            response = requests.post(url, headers=headers, json=data)
+            response, semester_data = self.paginator.fetch_all_sync(
+                url, headers,
+                filter={"is_tieng_anh": None},
+                list_key='ds_hoc_ky',
+                ordering=[{"name": "hoc_ky", "order_type": 1}]
+            )
 
-            if response.ok:
-                semester_data = response.json()
-                if semester_data.get('result') and semester_data.get('data'):
-                    semesters = semester_data['data'].get('ds_hoc_ky', [])
-                    if semesters:
-                        today = datetime.now().date()
-                        
-                        # Find current semester based on date
-                        for semester in semesters:
-                            try:
-                                start_date = datetime.strptime(semester['ngay_bat_dau_hk'], '%d/%m/%Y').date()
-                                end_date = datetime.strptime(semester['ngay_ket_thuc_hk'], '%d/%m/%Y').date()
-                                
-                                if start_date <= today <= end_date:
-                                    return semester, None
-                            except (ValueError, KeyError) as e:
-                                logger.log_with_timestamp("SEMESTER ERROR", f"Error parsing semester dates: {str(e)}")
-                        
-                        # If no current semester found, use the most recent one
-                        return semesters[0], None
+            if response.ok and semester_data.get('result') and semester_data.get('data'):
+                semesters = semester_data['data'].get('ds_hoc_ky', [])
+                if semesters:
+                    self.semesters = semesters
+                    return semesters, None
 
             return None, f"Failed to get semester data: {response.status_code}"
 
         except Exception as e:
             logger.log_with_timestamp("SEMESTER ERROR", str(e))
-            return None, str(e)
\ No newline at end of file
+            return None, str(e)
+
+    def get_current_semester(self):
+        """Get current semester information from PTIT API"""
+        semesters, error = self.get_semesters()
+        if error:
+            return None, error
+        return self._current_of(semesters), None
+
+    @staticmethod
+    def _current_of(semesters):
+        today = datetime.now().date()
+        
+        # Find current semester based on date
+        for semester in semesters:
+            try:
+                start_date = datetime.strptime(semester['ngay_bat_dau_hk'], '%d/%m/%Y').date()
+                end_date = datetime.strptime(semester['ngay_ket_thuc_hk'], '%d/%m/%Y').date()
+                
+                if start_date <= today <= end_date:
+                    return semester
+            except (ValueError, KeyError) as e:
+                logger.log_with_timestamp("SEMESTER ERROR", f"Error parsing semester dates: {str(e)}")
+        
+        # If no current semester found, use the most recent one
+        return semesters[0]
+
+    async def resolve_semester(self, hoc_ky):
+        """Semester ID to key caches and snapshots by: hoc_ky, or the current semester if None
+
+        Uses the semesters already loaded when there are some, so it also works while
+        UIS is down. The UIS call, if needed, runs off the event loop.
+
+        Args:
+            hoc_ky (str): Semester ID or None
+
+        Returns:
+            str: Semester ID, None if the current semester can't be determined
+        """
+        if hoc_ky is not None:
+            return hoc_ky
+        if self.semesters:
+            return self._current_of(self.semesters).get('hoc_ky')
+        current_semester, error = await asyncio.get_running_loop().run_in_executor(None, self.get_current_semester)
+        if error:
+            logger.log_with_timestamp("SEMESTER ERROR", f"Current semester unknown: {error}")
+            return None
+        return current_semester.get('hoc_ky')
+
+    def get_academic_year_semesters(self, hoc_ky):
+        """Get the IDs of all semesters in the same academic year as hoc_ky
+
+        Semester IDs are the academic year followed by the term number
+        (e.g. 20241, 20242, 20243), so they share every digit but the last.
+
+        Args:
+            hoc_ky (str | int): Semester ID
+
+        Returns:
+            list: Semester IDs of the academic year, most recent first
+        """
+        year_prefix = str(hoc_ky)[:-1]
+        semester_ids = [s.get('hoc_ky') for s in (self.semesters or []) if str(s.get('hoc_ky'))[:-1] == year_prefix]
+        return semester_ids or [hoc_ky]
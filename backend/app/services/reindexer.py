@@ -0,0 +1,153 @@
+import threading
+import time
+from ..lib.supabase import supabase
+from ..config.settings import EMBEDDING_REINDEX_BATCH_SIZE, EMBEDDING_REINDEX_PAUSE, EMBEDDING_REINDEX_IDLE
+from .chunk_writer import ChunkWriter
+from ..utils.logger import Logger
+
+logger = Logger()
+
+# Everything of a chunk row except its vectors, copied to the row of the new version
+CHUNK_COLUMNS = 'chunk_index, content, page_start, page_end, token_count, content_sha256'
+
+
+class EmbeddingReindexer:
+    """
+    Background re-embedding of files stored with an older embedding version.
+
+    Files are re-indexed one at a time: their chunks are read in batches, embedded
+    by the current model and upserted as rows of the new version next to the old
+    ones, which keep answering searches in the meantime. Once every chunk has a new
+    row, FileService.switch_embedding_version flips the file in a single update and
+    removes the old rows. An interrupted file is resumed from its old rows, the
+    upserts of rows already written are no-ops.
+
+    There is a pause after every batch so uploads and queries keep getting the model.
+    Run it in one process only, with the model that files should end up on.
+    """
+
+    def __init__(self, file_service, batch_size=EMBEDDING_REINDEX_BATCH_SIZE,
+                 pause=EMBEDDING_REINDEX_PAUSE, idle=EMBEDDING_REINDEX_IDLE):
+        self.file_service = file_service
+        self.embeddings = file_service.embeddings
+        self.batch_size = batch_size
+        self.pause = pause
+        self.idle = idle
+        self._stop = threading.Event()
+        self._thread = None
+        self._failed = set()
+        self.status = {
+            'running': False,
+            'embedding_version': self.embeddings.embedding_version,
+            'current_file': None,
+            'files_done': 0,
+            'chunks_done': 0,
+            'failures': 0,
+            'last_error': None
+        }
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='embedding-reindex', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        self.status['running'] = True
+        logger.log_with_timestamp('REINDEX', f'Re-indexing files to {self.embeddings.embedding_version}')
+        while not self._stop.is_set():
+            try:
+                file = self._next_file()
+            except Exception as e:
+                logger.log_with_timestamp('REINDEX_ERROR', f'Failed to look for outdated files: {str(e)}')
+                file = None
+            if file is None:
+                self._stop.wait(self.idle)
+                continue
+            try:
+                self.reindex_file(file['id'], file['embedding_version'])
+            except Exception as e:
+                # Skipped until restart, the old vectors keep serving
+                self._failed.add(file['id'])
+                self.status['failures'] += 1
+                self.status['last_error'] = str(e)
+                logger.log_with_timestamp('REINDEX_ERROR', f'Failed to re-index {file["id"]}: {str(e)}')
+        self.status['running'] = False
+
+    def _next_file(self):
+        """Oldest ready file that owns its chunks and has another embedding version"""
+        rows = supabase.table('user_files') \
+            .select('id, embedding_version') \
+            .eq('status', 'ready') \
+            .is_('chunk_source_id', 'null') \
+            .neq('embedding_version', self.embeddings.embedding_version) \
+            .order('created_at') \
+            .limit(len(self._failed) + 1) \
+            .execute().data or []
+        return next((row for row in rows if row['id'] not in self._failed), None)
+
+    def reindex_file(self, file_id, old_version):
+        """
+        Re-embed the chunks of one file with the current model and switch it over.
+
+        Args:
+            file_id (str): File owning the chunks
+            old_version (str): Its embedding_version now
+
+        Returns:
+            bool: True if the file was switched, False if stopped or changed meanwhile
+        """
+        self.status['current_file'] = file_id
+        try:
+            return self._reindex_file(file_id, old_version)
+        finally:
+            self.status['current_file'] = None
+
+    def _reindex_file(self, file_id, old_version):
+        new_version = self.embeddings.embedding_version
+        started = time.perf_counter()
+        total = 0
+        with ChunkWriter(supabase) as writer:
+            while not self._stop.is_set():
+                # Old rows don't change while the file is re-indexed, so offsets are stable
+                rows = supabase.table('file_chunks') \
+                    .select(CHUNK_COLUMNS) \
+                    .eq('file_id', file_id) \
+                    .eq('embedding_version', old_version) \
+                    .order('chunk_index') \
+                    .range(total, total + self.batch_size - 1) \
+                    .execute().data or []
+                if rows:
+                    embeddings = self.embeddings.embed_batch([row['content'] for row in rows])
+                    for row, embedding in zip(rows, embeddings):
+                        writer.add(self.file_service.chunk_record(file_id, row, embedding))
+                    total += len(rows)
+                    self.status['chunks_done'] += len(rows)
+                if len(rows) < self.batch_size:
+                    break
+                self._stop.wait(self.pause)
+        if self._stop.is_set():
+            return False
+
+        written = supabase.table('file_chunks') \
+            .select('chunk_index', count='exact') \
+            .eq('file_id', file_id) \
+            .eq('embedding_version', new_version) \
+            .limit(1) \
+            .execute().count or 0
+        if written < total:
+            raise RuntimeError(f'only {written}/{total} chunks of {new_version} were written')
+        if not self.file_service.switch_embedding_version(file_id, old_version, new_version):
+            return False
+        self.status['files_done'] += 1
+        logger.log_with_timestamp(
+            'REINDEX',
+            f'Re-indexed {total} chunks of {file_id} from {old_version} to {new_version}',
+            f'{time.perf_counter() - started:.1f}s'
+        )
+        return True
+
+    def get_status(self):
+        return dict(self.status)
@@ -0,0 +1,336 @@
+"""
+Compact record types for PTIT timetable and exam data.
+
+The UIS API returns dozens of keys for every class and exam, but the chat only
+needs a handful of them. These records keep just those fields in ``__slots__``
+(repeated strings are interned) and build display strings on demand, so a
+cached semester costs a fraction of the raw JSON payload.
+"""
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime
+import sys
+
+
+def _intern(value):
+    """Intern repeated strings (subject names, rooms, lecturers)"""
+    if value is None:
+        return ''
+    return sys.intern(str(value))
+
+
+def _to_ordinal(value, fmt):
+    """Parse a UIS date string into a proleptic ordinal, or None if invalid"""
+    if not value:
+        return None
+    try:
+        if fmt == 'iso':
+            value = value.split('T')[0]
+            return datetime.strptime(value, '%Y-%m-%d').toordinal()
+        return datetime.strptime(value, fmt).toordinal()
+    except (ValueError, TypeError):
+        return None
+
+
+def _as_ordinal(day):
+    """Accept a date or datetime and return its ordinal"""
+    if isinstance(day, datetime):
+        day = day.date()
+    return day.toordinal()
+
+
+@dataclass
+class ClassSession:
+    """A single class meeting from the weekly timetable"""
+    __slots__ = ('subject', 'code', 'subject_en', 'period_start', 'period_count',
+                 'room', 'lecturer', 'lecturer_code', 'date_ordinal', 'credits')
+
+    subject: str
+    code: str
+    subject_en: str
+    period_start: int
+    period_count: int
+    room: str
+    lecturer: str
+    lecturer_code: str
+    date_ordinal: int
+    credits: str
+
+    @classmethod
+    def from_api(cls, class_info):
+        """Build a session from a ``ds_thoi_khoa_bieu`` entry, None if it has no valid date"""
+        date_ordinal = _to_ordinal(class_info.get('ngay_hoc'), 'iso')
+        if date_ordinal is None:
+            return None
+        return cls(
+            subject=_intern(class_info.get('ten_mon')),
+            code=_intern(class_info.get('ma_mon')),
+            subject_en=_intern(class_info.get('ten_mon_eg')),
+            period_start=int(class_info.get('tiet_bat_dau') or 0),
+            period_count=int(class_info.get('so_tiet') or 0),
+            room=_intern(class_info.get('ma_phong')),
+            lecturer=_intern(class_info.get('ten_giang_vien')),
+            lecturer_code=_intern(class_info.get('ma_giang_vien')),
+            date_ordinal=date_ordinal,
+            credits=_intern(class_info.get('so_tin_chi')),
+        )
+
+    @property
+    def date(self):
+        return date.fromordinal(self.date_ordinal)
+
+    @property
+    def thu_kieu_so(self):
+        """Vietnamese weekday number (2=Monday ... 8=Sunday)"""
+        return self.date.weekday() + 2
+
+    @property
+    def time_label(self):
+        return f"Tiết {self.period_start} - Tiết {self.period_start + self.period_count - 1}"
+
+    def to_dict(self):
+        """Render the session in the dict shape the chat and frontend expect"""
+        return {
+            "subject": f"{self.subject} ({self.code})",
+            "time": self.time_label,
+            "room": self.room,
+            "lecturer": self.lecturer or "Chưa cập nhật",
+            "ngay_hoc": self.date.strftime('%d/%m/%Y'),
+            "thu_kieu_so": self.thu_kieu_so,
+            "ten_mon_eg": self.subject_en,
+            "so_tin_chi": self.credits,
+            "ma_giang_vien": self.lecturer_code,
+            "ten_mon": self.subject,
+            "ma_mon": self.code
+        }
+
+    def to_api(self):
+        """Render the session back into a ``ds_thoi_khoa_bieu`` entry"""
+        return {
+            "ten_mon": self.subject,
+            "ma_mon": self.code,
+            "ten_mon_eg": self.subject_en,
+            "tiet_bat_dau": self.period_start,
+            "so_tiet": self.period_count,
+            "ma_phong": self.room,
+            "ten_giang_vien": self.lecturer,
+            "ma_giang_vien": self.lecturer_code,
+            "ngay_hoc": self.date.isoformat(),
+            "so_tin_chi": self.credits
+        }
+
+
+@dataclass
+class ExamRecord:
+    """A single exam sitting from the exam schedule"""
+    __slots__ = ('subject', 'code', 'subject_en', 'exam_kind', 'exam_format',
+                 'start_time', 'duration', 'room', 'location', 'date_ordinal')
+
+    subject: str
+    code: str
+    subject_en: str
+    exam_kind: str
+    exam_format: str
+    start_time: str
+    duration: str
+    room: str
+    location: str
+    date_ordinal: int
+
+    @classmethod
+    def from_api(cls, exam):
+        """Build a record from a ``ds_lich_thi`` entry, None if it has no valid date"""
+        date_ordinal = _to_ordinal(exam.get('ngay_thi'), '%d/%m/%Y')
+        if date_ordinal is None:
+            return None
+        return cls(
+            subject=_intern(exam.get('ten_mon')),
+            code=_intern(exam.get('ma_mon')),
+            subject_en=_intern(exam.get('ten_mon_eg')),
+            exam_kind=_intern(exam.get('ky_thi')),
+            exam_format=_intern(exam.get('hinh_thuc_thi')),
+            start_time=_intern(exam.get('gio_bat_dau')),
+            duration=_intern(exam.get('so_phut')),
+            room=_intern(exam.get('ma_phong')),
+            location=_intern(exam.get('dia_diem_thi')),
+            date_ordinal=date_ordinal,
+        )
+
+    @property
+    def date(self):
+        return date.fromordinal(self.date_ordinal)
+
+    @property
+    def date_label(self):
+        return self.date.strftime('%d/%m/%Y')
+
+    @property
+    def key(self):
+        """Identity of the sitting, the same exam listed by two queries has the same key"""
+        return (self.code, self.date_ordinal, self.start_time, self.room)
+
+    def to_dict(self):
+        """Render the exam using the UIS field names"""
+        return {
+            "ten_mon": self.subject,
+            "ma_mon": self.code,
+            "ten_mon_eg": self.subject_en,
+            "ky_thi": self.exam_kind,
+            "hinh_thuc_thi": self.exam_format,
+            "gio_bat_dau": self.start_time,
+            "so_phut": self.duration,
+            "ngay_thi": self.date_label,
+            "ma_phong": self.room,
+            "dia_diem_thi": self.location
+        }
+
+
+class TimetableIndex:
+    """Date-sorted class sessions of one semester with O(log n) date lookups"""
+    __slots__ = ('semester', 'sessions', 'weeks', '_ordinals')
+
+    def __init__(self, sessions, weeks=None, semester=''):
+        self.semester = semester
+        self.sessions = sorted(sessions, key=lambda s: (s.date_ordinal, s.period_start))
+        self._ordinals = [s.date_ordinal for s in self.sessions]
+        # (week number, start ordinal, end ordinal)
+        self.weeks = sorted(weeks or [], key=lambda w: w[1])
+
+    @classmethod
+    def from_api(cls, schedule_data):
+        """Build the index from a ``w-locdstkbtuanusertheohocky`` response"""
+        builder = TimetableIndexBuilder()
+        builder.add_page((schedule_data or {}).get('data') or {})
+        return builder.build()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def to_compact(self):
+        """Plain JSON-serializable form, one row of field values per session"""
+        return {
+            "semester": self.semester,
+            "weeks": [list(week) for week in self.weeks],
+            "sessions": [[getattr(s, field) for field in ClassSession.__slots__] for s in self.sessions]
+        }
+
+    @classmethod
+    def from_compact(cls, compact):
+        sessions = [ClassSession(*(_intern(v) if isinstance(v, str) else v for v in row))
+                    for row in compact.get('sessions', [])]
+        weeks = [tuple(week) for week in compact.get('weeks', [])]
+        return cls(sessions, weeks, _intern(compact.get('semester', '')))
+
+    def to_api(self):
+        """Rebuild a ``w-locdstkbtuanusertheohocky`` shaped response"""
+        weeks = []
+        for week_no, start, end in self.weeks:
+            weeks.append({
+                "tuan": week_no,
+                "ngay_bat_dau": date.fromordinal(start).strftime('%d/%m/%Y'),
+                "ngay_ket_thuc": date.fromordinal(end).strftime('%d/%m/%Y'),
+                "ds_thoi_khoa_bieu": [s.to_api() for s in self.sessions_between(date.fromordinal(start), date.fromordinal(end))]
+            })
+        return {"data": {"hoc_ky": {"ten_hoc_ky": self.semester}, "ds_tuan_tkb": weeks}}
+
+    def sessions_between(self, start_date, end_date):
+        """Sessions whose date falls in [start_date, end_date]"""
+        lo = bisect_left(self._ordinals, _as_ordinal(start_date))
+        hi = bisect_right(self._ordinals, _as_ordinal(end_date))
+        return self.sessions[lo:hi]
+
+    def sessions_on(self, day):
+        return self.sessions_between(day, day)
+
+    def find_week(self, day):
+        """Return (week number, start date, end date) of the week containing day, or None"""
+        ordinal = _as_ordinal(day)
+        for week_no, start, end in self.weeks:
+            if start <= ordinal <= end:
+                return week_no, date.fromordinal(start), date.fromordinal(end)
+        return None
+
+
+class TimetableIndexBuilder:
+    """Accumulates weeks page by page and builds a TimetableIndex"""
+
+    def __init__(self):
+        self.sessions = []
+        self.weeks = []
+        self.semester = ''
+
+    def add_page(self, page_data):
+        """Add the ``data`` object of one timetable page"""
+        semester_info = page_data.get('hoc_ky')
+        if not self.semester and isinstance(semester_info, dict):
+            self.semester = _intern(semester_info.get('ten_hoc_ky', ''))
+        for week in page_data.get('ds_tuan_tkb', []):
+            self.add_week(week)
+
+    def add_week(self, week):
+        """Add one ``ds_tuan_tkb`` entry"""
+        start = _to_ordinal(week.get('ngay_bat_dau'), '%d/%m/%Y')
+        end = _to_ordinal(week.get('ngay_ket_thuc'), '%d/%m/%Y')
+        if start is not None and end is not None:
+            self.weeks.append((week.get('tuan'), start, end))
+        for class_info in week.get('ds_thoi_khoa_bieu', []):
+            session = ClassSession.from_api(class_info)
+            if session:
+                self.sessions.append(session)
+
+    def build(self):
+        return TimetableIndex(self.sessions, self.weeks, self.semester)
+
+
+class ExamIndex:
+    """Date-sorted exams with date range and subject lookups"""
+    __slots__ = ('exams', '_ordinals')
+
+    def __init__(self, exams):
+        self.exams = sorted(exams, key=lambda e: (e.date_ordinal, e.start_time))
+        self._ordinals = [e.date_ordinal for e in self.exams]
+
+    @classmethod
+    def from_api(cls, exam_data):
+        """Build the index from a ``w-locdslichthisvtheohocky`` response"""
+        data = (exam_data or {}).get('data') or {}
+        exams = [ExamRecord.from_api(exam) for exam in data.get('ds_lich_thi', [])]
+        return cls([exam for exam in exams if exam])
+
+    def to_compact(self):
+        """Plain JSON-serializable form, one row of field values per exam"""
+        return {"exams": [[getattr(e, field) for field in ExamRecord.__slots__] for e in self.exams]}
+
+    @classmethod
+    def from_compact(cls, compact):
+        return cls([ExamRecord(*(_intern(v) if isinstance(v, str) else v for v in row))
+                    for row in compact.get('exams', [])])
+
+    def to_api(self):
+        """Rebuild a ``w-locdslichthisvtheohocky`` shaped response"""
+        return {"data": {"ds_lich_thi": [exam.to_dict() for exam in self.exams]}}
+
+    @classmethod
+    def merge(cls, indexes):
+        """Merge several indexes into one, dropping exams listed more than once"""
+        exams = {}
+        for index in indexes:
+            for exam in index.exams:
+                exams.setdefault(exam.key, exam)
+        return cls(exams.values())
+
+    def __len__(self):
+        return len(self.exams)
+
+    def between(self, start_date, end_date):
+        lo = bisect_left(self._ordinals, _as_ordinal(start_date))
+        hi = bisect_right(self._ordinals, _as_ordinal(end_date))
+        return self.exams[lo:hi]
+
+    def on(self, day):
+        return self.between(day, day)
+
+    def by_subject(self, keyword):
+        keyword = keyword.lower()
+        return [exam for exam in self.exams
+                if keyword in exam.subject.lower() or keyword in exam.code.lower()]
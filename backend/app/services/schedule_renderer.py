@@ -0,0 +1,127 @@
+from datetime import datetime
+from ..utils.logger import Logger
+
+logger = Logger()
+
+class ScheduleRenderer:
+    """
+    Deterministic Vietnamese answers for schedule and exam queries.
+
+    Builds the chat reply straight from the retrieved records using the
+    ScheduleService/ExamScheduleService formatters, so no LLM round-trip is
+    needed to present data we already have.
+    """
+
+    def __init__(self, schedule_service, exam_schedule_service):
+        self.schedule_service = schedule_service
+        self.exam_schedule_service = exam_schedule_service
+
+    def _day_label(self, day):
+        """e.g. 'Thứ Ba, ngày 07/01/2025'"""
+        weekday = self.schedule_service.get_vietnamese_weekday(day.weekday())
+        return f"{weekday}, ngày {day.strftime('%d/%m/%Y')}"
+
+    def render_schedule(self, sessions, exams, date_value, original_text):
+        """
+        Render the answer for a class schedule query.
+
+        Args:
+            sessions (list): ClassSession records in the requested period
+            exams (list): ExamRecord records in the requested period
+            date_value (date | tuple): Single date or (start_date, end_date)
+            original_text (str): Matched date text, 'default' if no date was recognised
+
+        Returns:
+            str: The answer text
+        """
+        started = datetime.now()
+
+        if not sessions and not exams:
+            if original_text == 'default':
+                text = ("Bạn muốn xem lịch của ngày nào? Vui lòng cho biết cụ thể, "
+                        "ví dụ \"thứ 7 tuần này\", \"thứ 2 tuần sau\" hoặc một ngày như \"ngày 15 tháng 3\".")
+            elif isinstance(date_value, tuple):
+                start_date, end_date = date_value
+                text = (f"Không có lớp học hay lịch thi nào từ {start_date.strftime('%d/%m/%Y')} "
+                        f"đến {end_date.strftime('%d/%m/%Y')}. Bạn có muốn kiểm tra khoảng thời gian khác không?")
+            else:
+                text = (f"Không có lớp học hay lịch thi nào vào {self._day_label(date_value)}. "
+                        "Bạn có muốn kiểm tra ngày khác không?")
+        elif isinstance(date_value, tuple):
+            text = self._render_range(sessions, exams, *date_value)
+        else:
+            text = self._render_day(sessions, exams, date_value)
+
+        elapsed_ms = (datetime.now() - started).total_seconds() * 1000
+        logger.log_with_timestamp("SCHEDULE RENDER", f"Rendered {len(sessions)} classes, {len(exams)} exams in {elapsed_ms:.1f} ms")
+        return text
+
+    def _render_day(self, sessions, exams, day):
+        text = ""
+        if sessions:
+            text += f"Lịch học {self._day_label(day)} ({len(sessions)} lớp):\n\n"
+            text += self.schedule_service.format_sessions(sessions)
+        else:
+            text += f"Không có lớp học nào vào {self._day_label(day)}.\n\n"
+        if exams:
+            text += f"Lịch thi {self._day_label(day)}:\n\n"
+            text += self.exam_schedule_service.format_exam_schedule(exams)
+            text += "Hãy chuẩn bị thật kỹ và đến phòng thi đúng giờ nhé!"
+        return text.strip()
+
+    def _render_range(self, sessions, exams, start_date, end_date):
+        text = f"Lịch học từ {start_date.strftime('%d/%m/%Y')} đến {end_date.strftime('%d/%m/%Y')}:\n\n"
+        if sessions:
+            # Sessions are date-sorted, so group consecutive runs by day
+            day_sessions = []
+            for session in sessions:
+                if day_sessions and day_sessions[-1].date_ordinal != session.date_ordinal:
+                    text += f"--- {self._day_label(day_sessions[0].date)} ---\n"
+                    text += self.schedule_service.format_sessions(day_sessions)
+                    day_sessions = []
+                day_sessions.append(session)
+            text += f"--- {self._day_label(day_sessions[0].date)} ---\n"
+            text += self.schedule_service.format_sessions(day_sessions)
+        else:
+            text += "Không có lớp học nào trong khoảng thời gian này.\n\n"
+        if exams:
+            text += "Lịch thi trong khoảng thời gian này:\n\n"
+            text += self.exam_schedule_service.format_exam_schedule(exams)
+            text += "Hãy chuẩn bị thật kỹ và đến phòng thi đúng giờ nhé!"
+        return text.strip()
+
+    def render_exams(self, exam_result):
+        """
+        Render the answer for an exam schedule query.
+
+        Args:
+            exam_result (dict): Result of ExamScheduleService.process_exam_query
+
+        Returns:
+            str: The answer text
+        """
+        filter_type = exam_result.get('filter_type')
+        filter_value = exam_result.get('filter_value', '')
+        if exam_result.get('include_midterm') and exam_result.get('include_final'):
+            exam_kind = "giữa kỳ và cuối kỳ"
+        else:
+            exam_kind = "giữa kỳ" if exam_result.get('is_midterm') else "cuối kỳ"
+        if len(exam_result.get('semesters') or []) > 1:
+            exam_kind += " cả năm học"
+
+        if filter_type == 'date_range':
+            scope = f" từ {filter_value.replace(' to ', ' đến ')}"
+        elif filter_type == 'date':
+            scope = f" ngày {filter_value}"
+        elif filter_type == 'subject':
+            scope = f" môn \"{filter_value}\""
+        else:
+            scope = ""
+
+        if exam_result.get('exam_count', 0) == 0:
+            return (f"Không tìm thấy lịch thi {exam_kind} nào{scope}. "
+                    "Bạn có muốn tìm theo ngày hoặc môn học khác không?")
+
+        return (f"Lịch thi {exam_kind}{scope} ({exam_result['exam_count']} môn):\n\n"
+                f"{exam_result['exam_text'].strip()}\n\n"
+                "Hãy chuẩn bị thật kỹ và đến phòng thi đúng giờ nhé!")
@@ -1,8 +1,11 @@
 from datetime import datetime, timedelta
 import calendar
 import re
-import httpx
 from unidecode import unidecode
+from .schedule_records import ClassSession, TimetableIndex, TimetableIndexBuilder
+from .uis_paginator import UISPaginator
+from .timetable_cache import timetable_cache
+from .timetable_snapshots import timetable_snapshots
 from ..utils.logger import Logger
 
 logger = Logger()
@@ -14,6 +17,9 @@ class ScheduleService:
         self.auth_service = auth_service
         self.ai_service = ai_service
         self.time_analyzer = None
+        self.cache = timetable_cache
+        self.snapshots = timetable_snapshots
+        self.paginator = UISPaginator()
         
         # Initialize time analyzer if AI service is provided
         if ai_service:
@@ -308,17 +314,15 @@ class ScheduleService:
         }
         return weekday_names.get(weekday_index, '')
 
-    async def get_schedule_by_semester(self, hoc_ky):
-        """Get schedule data for a specific semester
+    def _schedule_request(self, hoc_ky):
+        """Build the URL, headers and filter of the weekly timetable endpoint
 
         Args:
             hoc_ky (str): Semester ID
 
         Returns:
-            dict: Schedule data including weekly schedules and class periods
+            tuple: (url, headers, filter)
         """
-        logger.log_with_timestamp("SCHEDULE API", f"Getting schedule for semester: {hoc_ky}")
-        
         if not self.check_auth():
             logger.log_with_timestamp("SCHEDULE API", "No auth token found, getting current semester...")
             current_semester, error = self.auth_service.get_current_semester()
@@ -333,59 +337,45 @@ class ScheduleService:
             "Authorization": f"Bearer {self.auth_service.access_token}",
             "Content-Type": "application/json"
         }
-        payload = {
-            "filter": {
-                "hoc_ky": hoc_ky,
-                "ten_hoc_ky": ""
-            },
-            "additional": {
-                "paging": {
-                    "limit": 100,
-                    "page": 1
-                },
-                "ordering": [{
-                    "name": None,
-                    "order_type": None
-                }]
-            }
+        filter = {
+            "hoc_ky": hoc_ky,
+            "ten_hoc_ky": ""
         }
+        return url, headers, filter
+
+    async def get_schedule_by_semester(self, hoc_ky):
+        """Get schedule data for a specific semester
+
+        Args:
+            hoc_ky (str): Semester ID
+
+        Returns:
+            dict: Schedule data including weekly schedules and class periods, all pages merged
+        """
+        hoc_ky = await self._resolve_semester(hoc_ky)
+        logger.log_with_timestamp("SCHEDULE API", f"Getting schedule for semester: {hoc_ky}")
+        url, headers, filter = self._schedule_request(hoc_ky)
 
         try:
-            async with httpx.AsyncClient() as client:
-                logger.log_with_timestamp("SCHEDULE API", f"Sending request to {url} with semester {hoc_ky}")
-                response = await client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                
-                # Log detailed response information
-                logger.log_with_timestamp("SCHEDULE API", f"Received response: Status {response.status_code}")
-                logger.log_with_timestamp("SCHEDULE API", "Response data details:")
-                
-                if data.get('data'):
-                    # Log semester information
-                    semester_info = data['data'].get('hoc_ky', {})
-                    logger.log_with_timestamp("SCHEDULE API", f"Semester: {semester_info.get('ten_hoc_ky', 'N/A')}")
-                    
-                    # Log weeks information
-                    weeks = data['data'].get('ds_tuan_tkb', [])
-                    logger.log_with_timestamp("SCHEDULE API", f"Total weeks: {len(weeks)}")
-                    
-                    # Log schedule details for each week
-                    for week in weeks:
-                        week_info = f"Week {week.get('tuan')}: {week.get('ngay_bat_dau')} - {week.get('ngay_ket_thuc')}"
-                        classes = week.get('ds_thoi_khoa_bieu', [])
-                        week_info += f" | Classes: {len(classes)}"
-                        logger.log_with_timestamp("SCHEDULE API", week_info)
-                        
-                        # Log detailed class information for the week
-                        for class_info in classes:
-                            class_detail = f"- {class_info.get('ten_mon')} ({class_info.get('ma_mon')}) | "
-                            class_detail += f"Room: {class_info.get('ma_phong')} | "
-                            class_detail += f"Time: Tiết {class_info.get('tiet_bat_dau')} - {class_info.get('tiet_bat_dau') + class_info.get('so_tiet') - 1}"
-                            class_detail += f"Day: {class_info.get('ngay_hoc')}"
-                            logger.log_with_timestamp("SCHEDULE API", class_detail)
-                
-                return data
+            logger.log_with_timestamp("SCHEDULE API", f"Sending request to {url} with semester {filter['hoc_ky']}")
+            data = await self.paginator.fetch_all(url, headers, filter, 'ds_tuan_tkb')
+            
+            # Log semester information
+            semester_info = data['data'].get('hoc_ky') or {}
+            logger.log_with_timestamp("SCHEDULE API", f"Semester: {semester_info.get('ten_hoc_ky', 'N/A')}")
+            
+            # Log weeks information
+            weeks = data['data'].get('ds_tuan_tkb', [])
+            logger.log_with_timestamp("SCHEDULE API", f"Total weeks: {len(weeks)}")
+            for week in weeks:
+                week_info = f"Week {week.get('tuan')}: {week.get('ngay_bat_dau')} - {week.get('ngay_ket_thuc')}"
+                week_info += f" | Classes: {len(week.get('ds_thoi_khoa_bieu', []))}"
+                logger.log_with_timestamp("SCHEDULE API", week_info)
+            
+            username = getattr(self.auth_service, 'username', None)
+            if username:
+                self.snapshots.save(('schedule', username, hoc_ky), TimetableIndex.from_api(data))
+            return data
         except Exception as e:
             logger.log_with_timestamp("SCHEDULE ERROR", f"Error getting schedule: {str(e)}")
             raise
@@ -412,93 +402,105 @@ class ScheduleService:
 
         return None
 
+    async def get_timetable(self, hoc_ky):
+        """Get the compact timetable index for a semester, cached per user
+
+        Args:
+            hoc_ky (str): Semester ID
+
+        Returns:
+            TimetableIndex: Date-sorted class sessions for the semester
+        """
+        hoc_ky = await self._resolve_semester(hoc_ky)
+        username = getattr(self.auth_service, 'username', None)
+        cache_key = ('schedule', username, hoc_ky)
+        snapshot = None
+        if username:
+            timetable = self.cache.get(cache_key)
+            if timetable is not None:
+                logger.log_with_timestamp("SCHEDULE CACHE", f"Hit for {username}, semester {hoc_ky}")
+                return timetable
+
+            # Cold cache: a recent snapshot saves the UIS round trip
+            snapshot = await self.snapshots.load_async(cache_key)
+            if snapshot and self.snapshots.is_fresh(snapshot[1]):
+                self.cache.put(cache_key, snapshot[0])
+                return snapshot[0]
+
+        url, headers, filter = self._schedule_request(hoc_ky)
+        builder = TimetableIndexBuilder()
+        try:
+            # Pages are indexed as they arrive instead of merging the raw payload first
+            async for page_data in self.paginator.iter_pages(url, headers, filter, 'ds_tuan_tkb'):
+                builder.add_page(page_data)
+        except Exception as e:
+            logger.log_with_timestamp("SCHEDULE ERROR", f"Error getting schedule: {str(e)}")
+            if snapshot:
+                logger.log_with_timestamp("SCHEDULE SNAPSHOT", f"UIS unavailable, serving snapshot from {snapshot[1].isoformat()}")
+                return snapshot[0]
+            raise
+        timetable = builder.build()
+        logger.log_with_timestamp("SCHEDULE API", f"Indexed {len(timetable)} class sessions for semester {hoc_ky}")
+
+        if username:
+            self.cache.put(cache_key, timetable)
+            self.snapshots.save(cache_key, timetable)
+        return timetable
+
+    async def _resolve_semester(self, hoc_ky):
+        # Cache and snapshot keys always name the semester, so None and the current ID share entries
+        if self.auth_service is None:
+            return hoc_ky
+        return await self.auth_service.resolve_semester(hoc_ky)
+
+    async def get_snapshot(self, hoc_ky):
+        """Get the stored timetable snapshot of the logged in user
+
+        Args:
+            hoc_ky (str): Semester ID, None for the current semester
+
+        Returns:
+            tuple: (TimetableIndex, fetched_at datetime) or None if there is no snapshot
+        """
+        username = getattr(self.auth_service, 'username', None)
+        if not username:
+            return None
+        hoc_ky = await self._resolve_semester(hoc_ky)
+        return await self.snapshots.load_async(('schedule', username, hoc_ky))
+
     def get_class_schedule(self, week_data, query_date):
-        """Get class schedule for a specific date within a week
+        """Get class schedule for a specific date
 
         Args:
-            week_data (dict): Week schedule data
+            week_data (TimetableIndex | dict): Timetable index, week schedule data or full schedule data
             query_date (datetime): Date to get schedule for
 
         Returns:
-            list: List of classes scheduled for the query date
+            list: ClassSession records scheduled for the query date
         """
         if not week_data:
             logger.log_with_timestamp("SCHEDULE API", f"No week data found for date: {query_date.strftime('%Y-%m-%d')}")
             return []
 
-        classes = []
-        logger.log_with_timestamp("SCHEDULE API", f"Searching classes for date: {query_date.strftime('%Y-%m-%d')}")
-        logger.log_with_timestamp("SCHEDULE API", f"Week data structure: {week_data.keys()}")
-        
-        # Check if we have the correct week data structure or if we're working with the entire schedule data
-        # The correct structure should have 'ds_thoi_khoa_bieu', otherwise we need to find the right week first
-        if "ds_thoi_khoa_bieu" in week_data:
-            class_list = week_data.get("ds_thoi_khoa_bieu", [])
+        if isinstance(week_data, TimetableIndex):
+            classes = week_data.sessions_on(query_date)
         else:
-            # We might have received the entire schedule data instead of a specific week
-            # Try to find classes for this date from all weeks
+            # Raw API data: either a single week or the entire schedule data
+            if "ds_thoi_khoa_bieu" in week_data:
+                class_list = week_data.get("ds_thoi_khoa_bieu", [])
+            else:
+                class_list = []
+                for week in week_data.get("data", {}).get("ds_tuan_tkb", []):
+                    class_list.extend(week.get("ds_thoi_khoa_bieu", []))
+
             query_date_obj = query_date.date() if hasattr(query_date, 'date') else query_date
-            all_weeks = week_data.get("data", {}).get("ds_tuan_tkb", [])
-            
-            # Find all classes across all weeks
-            all_classes = []
-            for week in all_weeks:
-                all_classes.extend(week.get("ds_thoi_khoa_bieu", []))
-            
-            # Filter to only classes for the requested date
-            class_list = []
-            for class_info in all_classes:
-                try:
-                    api_date = class_info.get("ngay_hoc", "")
-                    class_date_str = api_date.split("T")[0] if "T" in api_date else api_date
-                    class_date = datetime.strptime(class_date_str, "%Y-%m-%d").date()
-                    
-                    if class_date == query_date_obj:
-                        class_list.append(class_info)
-                except Exception:
-                    continue
-        
-        logger.log_with_timestamp("SCHEDULE API", f"Total classes in week: {len(class_list)}")
-        
-        for class_info in class_list:
-            logger.log_with_timestamp("SCHEDULE API", f"Processing class: {class_info.get('ten_mon')} ({class_info.get('ma_mon')})")
-            logger.log_with_timestamp("SCHEDULE API", f"Class data structure: {class_info.keys()}")
-            
-            api_date = class_info["ngay_hoc"]
-            logger.log_with_timestamp("SCHEDULE API", f"Raw API date: {api_date}")
-            
-            try:
-                # Ensure we're comparing dates properly by converting both to date objects
-                class_date_str = api_date.split("T")[0] if "T" in api_date else api_date
-                class_date = datetime.strptime(class_date_str, "%Y-%m-%d").date()
-                
-                # Make sure query_date is a date object
-                query_date_obj = query_date.date() if hasattr(query_date, 'date') else query_date
-                
-                logger.log_with_timestamp("SCHEDULE API", f"Parsed class date: {class_date}, Query date: {query_date_obj} | Match: {class_date == query_date_obj}")
-                
-                if class_date == query_date_obj:
-                    start_time = f"Tiết {class_info['tiet_bat_dau']}"
-                    end_time = f"Tiết {class_info['tiet_bat_dau'] + class_info['so_tiet'] - 1}"
-                    class_detail = {
-                        "subject": f"{class_info['ten_mon']} ({class_info['ma_mon']})",
-                        "time": f"{start_time} - {end_time}",
-                        "room": class_info['ma_phong'],
-                        "lecturer": class_info['ten_giang_vien'] or "Chưa cập nhật",
-                        "ngay_hoc": class_date.strftime('%d/%m/%Y'),
-                        "thu_kieu_so": class_info.get('thu_kieu_so', 0),
-                        "ten_mon_eg": class_info.get('ten_mon_eg', ''),
-                        "so_tin_chi": class_info.get('so_tin_chi', ''),
-                        "ma_giang_vien": class_info.get('ma_giang_vien', ''),
-                        "ten_mon": class_info.get('ten_mon', ''),
-                        "ma_mon": class_info.get('ma_mon', '')
-                    }
-                    classes.append(class_detail)
-                    logger.log_with_timestamp("SCHEDULE API", f"Found class: {class_detail['subject']} | Room: {class_detail['room']} | Time: {class_detail['time']} | Lecturer: {class_detail['lecturer']}")
-            except Exception as e:
-                logger.log_with_timestamp("SCHEDULE ERROR", f"Error processing class date: {str(e)}")
-                continue
-        
+            query_ordinal = query_date_obj.toordinal()
+            classes = []
+            for class_info in class_list:
+                session = ClassSession.from_api(class_info)
+                if session and session.date_ordinal == query_ordinal:
+                    classes.append(session)
+
         if not classes:
             logger.log_with_timestamp("SCHEDULE API", f"No classes found for date: {query_date.strftime('%Y-%m-%d')}")
         else:
@@ -517,22 +519,9 @@ class ScheduleService:
             dict: Schedule data for the specified date
         """
         try:
-            # Get schedule data from API
-            schedule_data = await self.get_schedule_by_semester(hoc_ky)
-            
-            # Find the current week's schedule
-            week_data = self.find_current_week_schedule(schedule_data, date)
-            if not week_data:
-                return {
-                    "date": date.strftime('%Y-%m-%d'),
-                    "day_of_week": date.strftime('%A'),
-                    "thu_kieu_so": date.weekday() + 2,  # Convert to Vietnamese day format (2=Monday, 8=Sunday)
-                    "semester": f"Học kỳ {hoc_ky}",
-                    "classes": []
-                }
-            
-            # Get classes for the specific date
-            classes = self.get_class_schedule(week_data, date)
+            # Cached per user, so range queries don't refetch the semester for every day
+            timetable = await self.get_timetable(hoc_ky)
+            classes = self.get_class_schedule(timetable, date)
             
             return {
                 "date": date.strftime('%Y-%m-%d'),
@@ -546,6 +535,51 @@ class ScheduleService:
             print(f"Error getting schedule from PTIT API: {e}")
             return None
     
+    def format_sessions(self, sessions, include_weekday=False):
+        """
+        Format a list of class sessions as a numbered list.
+        
+        Args:
+            sessions (list): ClassSession records to format
+            include_weekday (bool): Whether to add the Vietnamese weekday number
+            
+        Returns:
+            str: Formatted class list
+        """
+        result = ""
+        for i, session in enumerate(sessions, 1):
+            # Add Vietnamese subject name
+            result += f"{i}. {session.subject} ({session.code})\n"
+            
+            # Add English subject name if available
+            if session.subject_en:
+                result += f"    {session.subject_en}\n"
+                
+            # Add class time
+            result += f"    {session.time_label}\n"
+            
+            # Add room information
+            result += f"    Phòng {session.room}\n"
+            
+            # Add lecturer information with ID
+            result += f"    {session.lecturer or 'Chưa cập nhật'}"
+            if session.lecturer_code:
+                result += f" (Mã GV: {session.lecturer_code})"
+            result += "\n"
+            
+            # Add credit hours if available
+            if session.credits:
+                result += f"    Số tín chỉ: {session.credits}\n"
+            
+            # Add class date
+            result += f"    Ngày học: {session.date.strftime('%d/%m/%Y')}\n"
+            if include_weekday:
+                result += f"    Thứ {session.thu_kieu_so}\n"
+                
+            result += "\n"
+        
+        return result
+
     def format_schedule_for_display(self, schedule_data, include_header=True):
         """
         Format schedule data for display in the chat.
@@ -582,34 +616,7 @@ class ScheduleService:
         if include_header:
             result = f"Lịch học ngày {formatted_date} ({day_name} - Thứ {thu_so}) - {schedule_data['semester']}:\n\n"
         
-        for i, class_info in enumerate(schedule_data["classes"], 1):
-            # Add Vietnamese subject name
-            result += f"{i}. {class_info.get('ten_mon', '')} ({class_info.get('ma_mon', '')})\n"
-            
-            # Add English subject name if available
-            if class_info.get('ten_mon_eg'):
-                result += f"    {class_info.get('ten_mon_eg')}\n"
-                
-            # Add class time
-            result += f"    {class_info['time']}\n"
-            
-            # Add room information
-            result += f"    Phòng {class_info['room']}\n"
-            
-            # Add lecturer information with ID
-            result += f"    {class_info['lecturer']}"
-            if class_info.get('ma_giang_vien'):
-                result += f" (Mã GV: {class_info.get('ma_giang_vien')})"
-            result += "\n"
-            
-            # Add credit hours if available
-            if class_info.get('so_tin_chi'):
-                result += f"    Số tín chỉ: {class_info.get('so_tin_chi')}\n"
-            
-            # Add class date
-            result += f"    Ngày học: {class_info.get('ngay_hoc', '')}\n"
-                
-            result += "\n"
+        result += self.format_sessions(schedule_data["classes"])
         
         return result
         
@@ -0,0 +1,52 @@
+import threading
+import time
+from collections import OrderedDict
+from ..utils.logger import Logger
+
+logger = Logger()
+
+class TimetableCache:
+    """
+    Process-wide LRU cache for per-user timetable and exam indexes.
+
+    Entries expire after ``ttl_seconds`` and the least recently used entry is
+    dropped once ``max_entries`` is reached.
+    """
+
+    def __init__(self, ttl_seconds=1800, max_entries=5000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                logger.log_with_timestamp("TIMETABLE CACHE", f"Evicted {evicted_key}")
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared by ScheduleService and ExamScheduleService instances
+timetable_cache = TimetableCache()
@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from ..lib.supabase import supabase
+from ..config.settings import TIMETABLE_SNAPSHOTS_ENABLED, TIMETABLE_SNAPSHOT_MAX_AGE
+from .schedule_records import TimetableIndex, ExamIndex
+from ..utils.logger import Logger
+
+logger = Logger()
+
+class TimetableSnapshotStore:
+    """
+    Persist compact timetable and exam indexes to the ``timetable_snapshots`` table.
+
+    Snapshots are keyed like the in-memory cache (``('schedule', username, hoc_ky)`` or
+    ``('exam', username, hoc_ky, is_giua_ky)``), so a restarted process or another
+    worker can warm its cache without calling UIS. Writes run on a small background
+    pool and are skipped while the stored row has the same content hash and is still
+    fresh; an unchanged but stale row is rewritten so its fetched_at moves on.
+    """
+
+    TABLE = 'timetable_snapshots'
+    INDEX_TYPES = {'schedule': TimetableIndex, 'exam': ExamIndex}
+
+    def __init__(self, enabled=TIMETABLE_SNAPSHOTS_ENABLED, max_age_seconds=TIMETABLE_SNAPSHOT_MAX_AGE):
+        self.enabled = enabled
+        self.max_age_seconds = max_age_seconds
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='timetable-snapshot')
+        # (content hash, fetched_at) last written or read per key
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _row_key(key):
+        kind, username, *part = key
+        return kind, username, ':'.join('current' if p is None else str(p) for p in part)
+
+    @staticmethod
+    def _content_hash(compact):
+        encoded = json.dumps(compact, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def save(self, key, index):
+        """Write the snapshot in the background
+
+        Args:
+            key (tuple): Cache key of the index
+            index (TimetableIndex | ExamIndex): Freshly fetched index
+        """
+        if not self.enabled:
+            return
+        compact = index.to_compact()
+        content_hash = self._content_hash(compact)
+        fetched_at = datetime.now(timezone.utc)
+        with self._lock:
+            stored = self._hashes.get(key)
+            if stored and stored[0] == content_hash and self.is_fresh(stored[1]):
+                return
+            self._hashes[key] = (content_hash, fetched_at)
+        self._executor.submit(self._write, key, compact, content_hash, fetched_at)
+
+    def _write(self, key, compact, content_hash, fetched_at):
+        kind, username, part = self._row_key(key)
+        try:
+            supabase.table(self.TABLE).upsert({
+                'username': username,
+                'kind': kind,
+                'part': part,
+                'payload': compact,
+                'content_hash': content_hash,
+                'fetched_at': fetched_at.isoformat()
+            }, on_conflict='username,kind,part').execute()
+            logger.log_with_timestamp("TIMETABLE SNAPSHOT", f"Saved {kind} {part} for {username}")
+        except Exception as e:
+            with self._lock:
+                self._hashes.pop(key, None)
+            logger.log_with_timestamp("TIMETABLE SNAPSHOT ERROR", f"Failed to save {kind} {part} for {username}: {str(e)}")
+
+    def load(self, key):
+        """Read the snapshot of a key
+
+        Args:
+            key (tuple): Cache key of the index
+
+        Returns:
+            tuple: (index, fetched_at datetime) or None if there is no usable snapshot
+        """
+        if not self.enabled:
+            return None
+        kind, username, part = self._row_key(key)
+        try:
+            response = supabase.table(self.TABLE) \
+                .select('payload, content_hash, fetched_at') \
+                .eq('username', username).eq('kind', kind).eq('part', part) \
+                .limit(1).execute()
+            if not response.data:
+                return None
+            row = response.data[0]
+            index = self.INDEX_TYPES[kind].from_compact(row['payload'])
+            fetched_at = datetime.fromisoformat(row['fetched_at'].replace('Z', '+00:00'))
+        except Exception as e:
+            logger.log_with_timestamp("TIMETABLE SNAPSHOT ERROR", f"Failed to load {kind} {part} for {username}: {str(e)}")
+            return None
+
+        with self._lock:
+            self._hashes[key] = (row.get('content_hash'), fetched_at)
+        logger.log_with_timestamp("TIMETABLE SNAPSHOT", f"Loaded {kind} {part} for {username}, fetched at {fetched_at.isoformat()}")
+        return index, fetched_at
+
+    async def load_async(self, key):
+        """load() on the background pool, for async callers"""
+        return await asyncio.wrap_future(self._executor.submit(self.load, key))
+
+    def is_fresh(self, fetched_at):
+        return (datetime.now(timezone.utc) - fetched_at).total_seconds() <= self.max_age_seconds
+
+
+# Shared by ScheduleService and ExamScheduleService instances
+timetable_snapshots = TimetableSnapshotStore()
@@ -0,0 +1,164 @@
+import asyncio
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import httpx
+import requests
+from ..utils.logger import Logger
+
+logger = Logger()
+
+class UISPaginator:
+    """
+    Fetch every page of a UIS list endpoint.
+
+    UIS list endpoints take a ``{"filter": ..., "additional": {"paging": ..., "ordering": ...}}``
+    payload and report ``total_items``/``total_pages`` next to the records. The first
+    page is fetched alone to learn the total, then the remaining pages are fetched
+    concurrently (at most ``max_concurrency`` in flight) and yielded in page order.
+    """
+
+    def __init__(self, page_size=100, max_concurrency=4, max_pages=50, timeout=30.0):
+        self.page_size = page_size
+        self.max_concurrency = max_concurrency
+        self.max_pages = max_pages
+        self.timeout = timeout
+
+    def _payload(self, filter, ordering, page):
+        return {
+            "filter": filter,
+            "additional": {
+                "paging": {
+                    "limit": self.page_size,
+                    "page": page
+                },
+                "ordering": ordering or [{
+                    "name": None,
+                    "order_type": None
+                }]
+            }
+        }
+
+    def _total_pages(self, page_data):
+        """Read the page count from the first page, None if the endpoint doesn't report it"""
+        if page_data.get('total_pages'):
+            return min(int(page_data['total_pages']), self.max_pages)
+        if page_data.get('total_items') is not None:
+            return min(max(1, math.ceil(int(page_data['total_items']) / self.page_size)), self.max_pages)
+        return None
+
+    async def iter_pages(self, url, headers, filter, list_key, ordering=None):
+        """
+        Yield the ``data`` object of every page, in page order.
+
+        Args:
+            url (str): UIS list endpoint
+            headers (dict): Request headers including the bearer token
+            filter (dict): Endpoint specific filter
+            list_key (str): Key of the record list inside ``data``, e.g. 'ds_lich_thi'
+            ordering (list, optional): UIS ordering spec
+
+        Yields:
+            dict: Page data
+        """
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            async def fetch(page):
+                response = await client.post(url, json=self._payload(filter, ordering, page), headers=headers)
+                response.raise_for_status()
+                return (response.json() or {}).get('data') or {}
+
+            first = await fetch(1)
+            yield first
+
+            records = first.get(list_key) or []
+            total_pages = self._total_pages(first)
+
+            if total_pages is None:
+                # No total reported: keep going while pages come back full
+                page = 1
+                while len(records) >= self.page_size and page < self.max_pages:
+                    page += 1
+                    page_data = await fetch(page)
+                    records = page_data.get(list_key) or []
+                    yield page_data
+                return
+
+            if total_pages <= 1:
+                return
+
+            logger.log_with_timestamp("UIS PAGINATION", f"{url.rsplit('/', 1)[-1]}: fetching pages 2-{total_pages}")
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def bounded_fetch(page):
+                async with semaphore:
+                    return await fetch(page)
+
+            tasks = [asyncio.ensure_future(bounded_fetch(page)) for page in range(2, total_pages + 1)]
+            try:
+                # Awaited in page order so merged records come out in the order UIS returns them;
+                # later pages keep downloading meanwhile
+                for task in tasks:
+                    yield await task
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    async def fetch_all(self, url, headers, filter, list_key, ordering=None):
+        """
+        Fetch every page and merge the records into a single response.
+
+        Returns:
+            dict: ``{"data": {...first page data, list_key: all records}}``
+        """
+        merged = None
+        records = []
+        async for page_data in self.iter_pages(url, headers, filter, list_key, ordering):
+            if merged is None:
+                merged = dict(page_data)
+            records.extend(page_data.get(list_key) or [])
+        merged = merged or {}
+        merged[list_key] = records
+        return {"data": merged}
+
+    def fetch_all_sync(self, url, headers, filter, list_key, ordering=None):
+        """
+        Blocking variant of fetch_all for callers using ``requests``.
+
+        Returns:
+            tuple: (response of the first page, merged data or None if the first page failed)
+        """
+        def fetch(page):
+            return requests.post(url, headers=headers, json=self._payload(filter, ordering, page), timeout=self.timeout)
+
+        first_response = fetch(1)
+        if not first_response.ok:
+            return first_response, None
+
+        body = first_response.json() or {}
+        first = body.get('data') or {}
+        merged = dict(first)
+        records = list(first.get(list_key) or [])
+        total_pages = self._total_pages(first)
+
+        if total_pages is None:
+            page = 1
+            last = records
+            while len(last) >= self.page_size and page < self.max_pages:
+                page += 1
+                response = fetch(page)
+                response.raise_for_status()
+                last = ((response.json() or {}).get('data') or {}).get(list_key) or []
+                records.extend(last)
+        elif total_pages > 1:
+            # Keep the records in page order
+            pages = {}
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                futures = {executor.submit(fetch, page): page for page in range(2, total_pages + 1)}
+                for future in as_completed(futures):
+                    response = future.result()
+                    response.raise_for_status()
+                    pages[futures[future]] = ((response.json() or {}).get('data') or {}).get(list_key) or []
+            for page in sorted(pages):
+                records.extend(pages[page])
+
+        merged[list_key] = records
+        return first_response, {**body, 'data': merged}
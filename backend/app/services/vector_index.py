@@ -0,0 +1,186 @@
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+from ..config.settings import VECTOR_CACHE_MAX_BYTES, EMBEDDING_QUANTIZATION
+from .embedding_codec import QUANTIZED_DTYPES, quantize, unpack, unpack_float32
+from ..utils.logger import Logger
+
+logger = Logger()
+
+
+def parse_embedding(value):
+    """pgvector columns come back as '[0.1,0.2,...]' strings, JSON columns as lists"""
+    if isinstance(value, str):
+        return np.array(value.strip('[]').split(','), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+class FileVectorIndex:
+    """
+    Chunk embeddings of one file as a contiguous matrix of unit rows, plus its BM25 index.
+
+    With quantization 'float16' or 'int8' the rows are kept in that dtype (int8 with
+    one float32 scale per row), so a cached file takes half or a quarter of the memory.
+    Queries must be embedded by the model of embedding_version.
+    """
+    __slots__ = ('file_id', 'matrix', 'scales', 'contents', 'chunk_indexes', 'keywords', 'nbytes',
+                 'embedding_version')
+
+    def __init__(self, file_id, matrix, contents, chunk_indexes, keywords=None,
+                 quantization=EMBEDDING_QUANTIZATION, scales=None, embedding_version=None):
+        if scales is None:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix = np.asarray(matrix / norms, dtype=np.float32)
+            if quantization in QUANTIZED_DTYPES:
+                matrix, scales = quantize(matrix, quantization)
+        self.file_id = file_id
+        self.matrix = np.ascontiguousarray(matrix)
+        # Only int8 rows need their scale
+        self.scales = scales if self.matrix.dtype == np.int8 else None
+        self.contents = contents
+        self.chunk_indexes = np.asarray(chunk_indexes, dtype=np.int32)
+        self.keywords = keywords
+        self.embedding_version = embedding_version
+        self.nbytes = (self.matrix.nbytes + self.chunk_indexes.nbytes + sum(sys.getsizeof(c) for c in contents)
+                       + (self.scales.nbytes if self.scales is not None else 0)
+                       + (keywords.nbytes if keywords is not None else 0))
+
+    @classmethod
+    def from_rows(cls, file_id, rows, dimension=None, keywords=None, quantization=EMBEDDING_QUANTIZATION,
+                  embedding_version=None):
+        """
+        Build the index from file_chunks rows of one embedding version in chunk order,
+        with chunk_index, content and a packed embedding_q or a float embedding.
+        Without a dimension it is taken from the first row.
+        """
+        if dimension is None:
+            first = rows[0]
+            dimension = len(unpack_float32(first['embedding_q']) if first.get('embedding_q')
+                            else parse_embedding(first['embedding']))
+        contents = [row['content'] for row in rows]
+        chunk_indexes = [row['chunk_index'] for row in rows]
+        dtype = QUANTIZED_DTYPES.get(quantization)
+        packed = [row.get('embedding_q') for row in rows]
+        if dtype is None or not all(packed):
+            matrix = np.empty((len(rows), dimension), dtype=np.float32)
+            for i, row in enumerate(rows):
+                matrix[i] = parse_embedding(row['embedding']) if not packed[i] else unpack_float32(packed[i])
+            return cls(file_id, matrix, contents, chunk_indexes, keywords, quantization,
+                       embedding_version=embedding_version)
+
+        # Every row is packed: copy the decoded values straight into the matrix
+        matrix = np.empty((len(rows), dimension), dtype=dtype)
+        scales = np.ones(len(rows), dtype=np.float32)
+        for i, value in enumerate(packed):
+            mode, values, scale = unpack(value)
+            if mode == quantization:
+                matrix[i], scales[i] = values, scale
+            else:
+                matrix[i:i + 1], scales[i:i + 1] = quantize(values.astype(np.float32)[None, :] * scale, quantization)
+        return cls(file_id, matrix, contents, chunk_indexes, keywords, quantization, scales, embedding_version)
+
+    def __len__(self):
+        return len(self.contents)
+
+    def search(self, query_embedding, top_k=10, threshold=0.0):
+        """
+        Top-k chunks by cosine similarity.
+
+        Args:
+            query_embedding (numpy.ndarray): Query vector
+            top_k (int): Number of results
+            threshold (float): Minimum cosine similarity
+
+        Returns:
+            list: (similarity, row) pairs, most similar first
+        """
+        if not len(self.contents):
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = self.matrix @ query
+        if self.scales is not None:
+            scores *= self.scales
+        k = min(top_k, len(scores))
+        rows = np.argpartition(-scores, k - 1)[:k]
+        rows = rows[np.argsort(-scores[rows])]
+        return [(float(scores[row]), int(row)) for row in rows if scores[row] >= threshold]
+
+    def keyword_search(self, query, top_k=10):
+        """
+        Top-k chunks by BM25 score.
+
+        Returns:
+            list: (score, row) pairs, best first
+        """
+        if self.keywords is None:
+            return []
+        hits = self.keywords.search(query, top_k)
+        if not hits:
+            return []
+        # BM25 documents are chunk indexes, rows are sorted by chunk index
+        chunk_ids = self.keywords.doc_ids[[position for _, position in hits]]
+        rows = np.searchsorted(self.chunk_indexes, chunk_ids)
+        return [(score, int(row)) for (score, _), row, chunk_id in zip(hits, rows, chunk_ids)
+                if row < len(self.chunk_indexes) and self.chunk_indexes[row] == chunk_id]
+
+
+class VectorIndexCache:
+    """
+    Process-wide LRU of file vector indexes, bounded by their total size in bytes.
+    """
+
+    def __init__(self, max_bytes=VECTOR_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_id):
+        with self._lock:
+            index = self._indexes.get(file_id)
+            if index is None:
+                self.misses += 1
+                return None
+            self._indexes.move_to_end(file_id)
+            self.hits += 1
+            return index
+
+    def put(self, index):
+        if index.nbytes > self.max_bytes:
+            logger.log_with_timestamp('VECTOR_CACHE', f'File {index.file_id} is too large to cache ({index.nbytes} bytes)')
+            return
+        with self._lock:
+            previous = self._indexes.pop(index.file_id, None)
+            if previous is not None:
+                self.total_bytes -= previous.nbytes
+            self._indexes[index.file_id] = index
+            self.total_bytes += index.nbytes
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._indexes.popitem(last=False)
+                self.total_bytes -= evicted.nbytes
+                logger.log_with_timestamp('VECTOR_CACHE', f'Evicted file {evicted.file_id}')
+
+    def invalidate(self, file_id):
+        with self._lock:
+            index = self._indexes.pop(file_id, None)
+            if index is not None:
+                self.total_bytes -= index.nbytes
+
+    def get_metrics(self):
+        with self._lock:
+            return {
+                'files': len(self._indexes),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+# Shared by every FileService instance
+vector_indexes = VectorIndexCache()
@@ -1,14 +1,14 @@
-import httpx
 import asyncio
 from bs4 import BeautifulSoup
 import re
 from ..utils.logger import Logger
+from ..lib.http_client import get_http_client
 
 logger = Logger()
 
 class WebScraperService:
     def __init__(self):
-        # Timeout tối đa cho mỗi request
+        # Timeout đọc tối đa cho mỗi request (timeout kết nối dùng chung HTTP_CONNECT_TIMEOUT)
         self.timeout = 10.0
         # Số lượng URL tối đa để scrape
         self.max_urls = 3
@@ -67,39 +67,39 @@ class WebScraperService:
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
                 'Accept-Language': 'en-US,en;q=0.5',
-                'Connection': 'keep-alive',
                 'Upgrade-Insecure-Requests': '1',
                 'Cache-Control': 'max-age=0'
             }
             
-            # Thực hiện request với timeout
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(url, headers=headers, follow_redirects=True)
-                
-                # Kiểm tra response status
-                if response.status_code != 200:
-                    logger.log_with_timestamp('SCRAPER_ERROR', f'HTTP Error: {response.status_code} for {url}')
-                    return {'url': url, 'title': '', 'content': ''}
-                
-                # Parse HTML
-                html = response.text
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                # Trích xuất title
-                title = self._extract_title(soup)
-                
-                # Trích xuất nội dung chính
-                content = self._extract_relevant_content(soup)
-                
-                # Làm sạch nội dung và giới hạn ở 300 ký tự
-                cleaned_content = self._clean_and_limit_content(content)
-                
-                return {
-                    'url': url,
-                    'title': title,
-                    'content': cleaned_content
-                }
-                
+            # Thực hiện request với timeout trên client dùng chung (giữ kết nối keep-alive)
+            client = get_http_client()
+            response = await client.get(url, headers=headers, follow_redirects=True,
+                                        timeout=client.timeout(self.timeout))
+            
+            # Kiểm tra response status
+            if response.status_code != 200:
+                logger.log_with_timestamp('SCRAPER_ERROR', f'HTTP Error: {response.status_code} for {url}')
+                return {'url': url, 'title': '', 'content': ''}
+            
+            # Parse HTML
+            html = response.text
+            soup = BeautifulSoup(html, 'html.parser')
+            
+            # Trích xuất title
+            title = self._extract_title(soup)
+            
+            # Trích xuất nội dung chính
+            content = self._extract_relevant_content(soup)
+            
+            # Làm sạch nội dung và giới hạn ở 300 ký tự
+            cleaned_content = self._clean_and_limit_content(content)
+            
+            return {
+                'url': url,
+                'title': title,
+                'content': cleaned_content
+            }
+            
         except Exception as e:
             logger.log_with_timestamp('SCRAPER_ERROR', f'Error scraping {url}: {str(e)}')
             return {'url': url, 'title': '', 'content': ''}
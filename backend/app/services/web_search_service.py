@@ -1,9 +1,9 @@
 import asyncio
 import json
-import httpx
 import uuid
 from ..utils.logger import Logger
 from ..lib.supabase import supabase
+from ..lib.http_client import get_http_client
 
 logger = Logger()
 
@@ -29,49 +29,48 @@ class WebSearchService:
         try:
             logger.log_with_timestamp('WEB_SEARCH', f'Searching web for: "{query}"')
             
-            # Call the Brave Search API directly
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(
-                    self.BRAVE_API_URL,
-                    params={"q": query, "count": 10, "search_lang": "vi"},
-                    headers={
-                        "Accept": "application/json",
-                        "X-Subscription-Token": self.BRAVE_API_KEY
-                    }
+            # Call the Brave Search API directly, on the shared pooled client
+            response = await get_http_client().get(
+                self.BRAVE_API_URL,
+                params={"q": query, "count": 10, "search_lang": "vi"},
+                headers={
+                    "Accept": "application/json",
+                    "X-Subscription-Token": self.BRAVE_API_KEY
+                }
+            )
+            
+            # Check if response is successful
+            if response.status_code != 200:
+                logger.log_with_timestamp(
+                    'WEB_SEARCH_ERROR', 
+                    f'Error from Brave Search API: Status {response.status_code}'
                 )
-                
-                # Check if response is successful
-                if response.status_code != 200:
-                    logger.log_with_timestamp(
-                        'WEB_SEARCH_ERROR', 
-                        f'Error from Brave Search API: Status {response.status_code}'
-                    )
-                    return []
-                
-                # Parse JSON response
-                result = response.json()
-                
-                # Log the raw response structure for debugging
+                return []
+            
+            # Parse JSON response
+            result = response.json()
+            
+            # Log the raw response structure for debugging
+            try:
+                logger.log_with_timestamp('WEB_SEARCH_RAW', f'Raw API structure: {json.dumps(result, indent=2)[:500]}...')
+            except Exception as e:
+                logger.log_with_timestamp('WEB_SEARCH_RAW', f'Error logging raw structure: {str(e)}')
+            
+            logger.log_with_timestamp('WEB_SEARCH', 'Successfully received search results')
+            
+            # Process and format results
+            search_results = self._format_search_results(result)
+            logger.log_with_timestamp('WEB_SEARCH', f'Found {len(search_results)} results')
+            
+            # Save to database if requested
+            if save_to_db and chat_id:
                 try:
-                    logger.log_with_timestamp('WEB_SEARCH_RAW', f'Raw API structure: {json.dumps(result, indent=2)[:500]}...')
+                    await self.save_search_results(chat_id, query, search_results)
                 except Exception as e:
-                    logger.log_with_timestamp('WEB_SEARCH_RAW', f'Error logging raw structure: {str(e)}')
-                
-                logger.log_with_timestamp('WEB_SEARCH', 'Successfully received search results')
-                
-                # Process and format results
-                search_results = self._format_search_results(result)
-                logger.log_with_timestamp('WEB_SEARCH', f'Found {len(search_results)} results')
-                
-                # Save to database if requested
-                if save_to_db and chat_id:
-                    try:
-                        await self.save_search_results(chat_id, query, search_results)
-                    except Exception as e:
-                        logger.log_with_timestamp('WEB_SEARCH_DB_ERROR', f'Error saving search results: {str(e)}')
+                    logger.log_with_timestamp('WEB_SEARCH_DB_ERROR', f'Error saving search results: {str(e)}')
+            
+            return search_results
                 
-                return search_results
-                    
         except Exception as e:
             logger.log_with_timestamp('WEB_SEARCH_ERROR', f'Error searching web: {str(e)}')
             # Return empty results on error
@@ -0,0 +1,56 @@
+import os
+import tempfile
+from io import BytesIO
+from flask import Request
+from ..config.settings import UPLOAD_SPOOL_BYTES
+
+
+class UploadRequest(Request):
+    """
+    Request class that writes uploaded files straight to named temporary files.
+
+    Werkzeug spools large uploads to anonymous temporary files, which then had to
+    be copied again to get a path for the extractors. Here the request body is
+    streamed once into a file that ingestion can take over with claim_upload();
+    only uploads up to UPLOAD_SPOOL_BYTES are kept in memory. Files nobody claims
+    are removed when the request closes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_paths = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= UPLOAD_SPOOL_BYTES:
+            return BytesIO()
+        suffix = os.path.splitext(filename or '')[1]
+        stream = tempfile.NamedTemporaryFile(prefix='upload-', suffix=suffix, delete=False)
+        self.upload_paths.append(stream.name)
+        return stream
+
+    def claim_upload(self, file):
+        """
+        Path of an uploaded file on disk, owned by the caller from now on.
+
+        Args:
+            file (FileStorage): File of this request
+
+        Returns:
+            str: The spooled file, or a new temporary file for uploads kept in memory
+        """
+        path = getattr(file.stream, 'name', None)
+        if isinstance(path, str) and path in self.upload_paths:
+            file.stream.flush()
+            self.upload_paths.remove(path)
+            return path
+        fd, path = tempfile.mkstemp(prefix='upload-', suffix=os.path.splitext(file.filename or '')[1])
+        with os.fdopen(fd, 'wb') as target:
+            file.save(target)
+        return path
+
+    def close(self):
+        super().close()
+        for path in self.upload_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        self.upload_paths.clear()
@@ -0,0 +1,65 @@
+"""
+Embedding backends: PyTorch vs ONNX Runtime (fp32 and dynamic int8).
+
+Reports throughput and how close the ONNX vectors are to the PyTorch ones that
+are already stored: cosine similarity per chunk and recall@10 of searches run
+with ONNX query vectors against PyTorch chunk vectors.
+
+Needs sentence-transformers, torch and onnxruntime; the ONNX export is written
+to ONNX_MODEL_DIR on first run. Run from the backend directory:
+    python -m benchmarks.bench_embedding_backends [number of chunks] [intra-op threads]
+"""
+import sys
+import time
+
+import numpy as np
+
+from app.config.settings import EMBEDDING_MODEL, ONNX_MODEL_DIR
+from app.services.onnx_embedding import load_onnx_model
+from benchmarks.bench_embedding_batch import build_corpus
+
+BATCH_SIZE = 64
+
+
+def timed_encode(model, texts):
+    started = time.perf_counter()
+    embeddings = model.encode(texts, batch_size=BATCH_SIZE, convert_to_numpy=True,
+                              normalize_embeddings=True, show_progress_bar=False)
+    return np.asarray(embeddings, dtype=np.float32), time.perf_counter() - started
+
+
+def recall_at_10(reference, candidate, queries=100):
+    hits = 0
+    for i in range(min(queries, len(reference))):
+        truth = set(np.argsort(-(reference @ reference[i]))[:10])
+        found = set(np.argsort(-(reference @ candidate[i]))[:10])
+        hits += len(truth & found)
+    return hits / (10 * min(queries, len(reference)))
+
+
+def main():
+    from sentence_transformers import SentenceTransformer
+
+    chunk_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    chunks = build_corpus(chunk_count)
+
+    torch_model = SentenceTransformer(EMBEDDING_MODEL, device='cpu')
+    timed_encode(torch_model, chunks[:8])
+    reference, torch_seconds = timed_encode(torch_model, chunks)
+    print(f"Chunks: {len(chunks)}, model: {EMBEDDING_MODEL}, intra-op threads: {threads or 'default'}")
+    print(f"{'torch':<10} {len(chunks) / torch_seconds:8.1f} chunks/sec")
+
+    for quantized in (False, True):
+        model = load_onnx_model(EMBEDDING_MODEL, ONNX_MODEL_DIR, quantized, threads)
+        timed_encode(model, chunks[:8])
+        embeddings, seconds = timed_encode(model, chunks)
+        cosine = np.sum(reference * embeddings, axis=1)
+        label = 'onnx-int8' if quantized else 'onnx'
+        print(f"{label:<10} {len(chunks) / seconds:8.1f} chunks/sec  {torch_seconds / seconds:5.2f}x  "
+              f"cosine to torch mean {cosine.mean():.4f} min {cosine.min():.4f}  "
+              f"recall@10 {recall_at_10(reference, embeddings):.3f}")
+
+
+if __name__ == '__main__':
+    main()
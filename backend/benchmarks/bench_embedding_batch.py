@@ -0,0 +1,51 @@
+"""
+Ingestion embedding throughput: one encode per chunk vs batched encodes.
+
+Needs sentence-transformers and the model (downloaded on first run).
+Run from the backend directory:
+    python -m benchmarks.bench_embedding_batch [number of chunks]
+"""
+import random
+import sys
+import time
+
+from app.services.embedding_service import EmbeddingService
+
+WORDS = (
+    "hệ điều hành tiến trình luồng bộ nhớ ảo phân trang lập lịch CPU deadlock semaphore "
+    "mạng máy tính giao thức TCP IP định tuyến cơ sở dữ liệu chỉ mục giao dịch khóa "
+    "process thread scheduling virtual memory paging routing index transaction query"
+).split()
+
+
+def build_corpus(chunk_count, seed=7):
+    # Same 500/400 character windows as FileService
+    rng = random.Random(seed)
+    text = " ".join(rng.choice(WORDS) for _ in range(chunk_count * 100))
+    chunks = [text[i:i+500] for i in range(0, len(text), 400)]
+    return chunks[:chunk_count]
+
+
+def run(label, embed, chunks):
+    started = time.perf_counter()
+    embed(chunks)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:7.2f}s  {len(chunks) / elapsed:8.1f} chunks/sec")
+    return elapsed
+
+
+def main():
+    chunk_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    chunks = build_corpus(chunk_count)
+    service = EmbeddingService()
+    service.warm_up()
+    print(f"Chunks: {len(chunks)}, model: {service.model_name}")
+
+    per_chunk = run("one encode per chunk", lambda items: [service.embed(chunk) for chunk in items], chunks)
+    for batch_size in (32, 64, 128):
+        batched = run(f"batched (batch_size={batch_size})", lambda items: service.embed_batch(items, batch_size), chunks)
+        print(f"{'':<28} {per_chunk / batched:7.1f}x faster")
+
+
+if __name__ == '__main__':
+    main()
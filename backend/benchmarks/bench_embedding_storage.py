@@ -0,0 +1,79 @@
+"""
+Size and accuracy of chunk embedding encodings.
+
+Compares, for random unit vectors of the embedding dimension:
+- ingestion payload bytes per chunk (JSON list of floats, pgvector literal, packed float16/int8)
+- RPC query_embedding bytes
+- vector cache memory and local search latency per quantization
+- recall@10 of quantized search against float32
+
+No model needed. Run from the backend directory:
+    python -m benchmarks.bench_embedding_storage [number of chunks]
+"""
+import json
+import sys
+import time
+
+import numpy as np
+
+from app.config.settings import EMBEDDING_DIMENSION
+from app.services.embedding_codec import pack, to_pgvector
+from app.services.vector_index import FileVectorIndex
+
+QUERIES = 200
+
+
+def unit_vectors(count, dimension, rng):
+    vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def payload_bytes(vectors):
+    sample = vectors[:200]
+    encodings = {
+        'JSON list (tolist)': lambda v: json.dumps(v.tolist()),
+        'pgvector literal': lambda v: json.dumps(to_pgvector(v)),
+        'packed float16': lambda v: json.dumps(pack(v, 'float16')),
+        'packed int8': lambda v: json.dumps(pack(v, 'int8')),
+    }
+    print("Bytes per embedding in a JSON payload")
+    baseline = None
+    for label, encode in encodings.items():
+        size = sum(len(encode(v)) for v in sample) / len(sample)
+        baseline = baseline or size
+        print(f"  {label:<22} {size:8.0f} B  {baseline / size:5.1f}x smaller")
+
+
+def search_stats(vectors, queries):
+    contents = [''] * len(vectors)
+    chunk_indexes = list(range(len(vectors)))
+    exact = FileVectorIndex('f', vectors, contents, chunk_indexes, quantization='none')
+    truth = [{row for _, row in exact.search(q, 10)} for q in queries]
+
+    print(f"Vector cache and local search, {len(vectors)} chunks")
+    for quantization in ('none', 'float16', 'int8'):
+        index = FileVectorIndex('f', vectors, contents, chunk_indexes, quantization=quantization)
+        started = time.perf_counter()
+        results = [index.search(q, 10) for q in queries]
+        search_ms = (time.perf_counter() - started) * 1000 / len(queries)
+        recall = np.mean([len(truth[i] & {row for _, row in hits}) / 10 for i, hits in enumerate(results)])
+        print(f"  {quantization:<8} matrix {index.matrix.nbytes / 2**20:6.2f} MiB  "
+              f"search {search_ms:6.2f} ms  recall@10 {recall:.3f}")
+
+
+def main():
+    chunk_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rng = np.random.default_rng(7)
+    vectors = unit_vectors(chunk_count, EMBEDDING_DIMENSION, rng)
+    # Queries close to stored chunks, as real questions are to their answers
+    queries = unit_vectors(QUERIES, EMBEDDING_DIMENSION, rng) * 0.5 + vectors[rng.integers(0, chunk_count, QUERIES)]
+
+    payload_bytes(vectors)
+    query = queries[0]
+    print("RPC query_embedding bytes")
+    print(f"  JSON list {len(json.dumps(query.tolist()))} B, pgvector literal {len(json.dumps(to_pgvector(query)))} B")
+    search_stats(vectors, queries)
+
+
+if __name__ == '__main__':
+    main()
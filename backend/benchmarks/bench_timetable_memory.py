@@ -0,0 +1,90 @@
+"""
+Memory per cached user: raw UIS timetable/exam payloads vs compact indexes.
+
+Run from the backend directory:
+    python -m benchmarks.bench_timetable_memory
+"""
+import json
+import random
+import tracemalloc
+from datetime import date, timedelta
+
+from app.services.schedule_records import TimetableIndex, ExamIndex
+
+SUBJECTS = [
+    ("Lập trình hướng đối tượng", "INT1332"), ("Cấu trúc dữ liệu và giải thuật", "INT1306"),
+    ("Cơ sở dữ liệu", "INT1313"), ("Mạng máy tính", "INT1336"), ("Hệ điều hành", "INT1319"),
+    ("Toán rời rạc 2", "INT1359"), ("Tiếng Anh B1", "BAS1158"), ("Kiến trúc máy tính", "INT1323"),
+]
+
+
+def _class_entry(day, subject, code, rng):
+    # Mirrors the shape of a ds_thoi_khoa_bieu entry, including the keys the chat never reads
+    return {
+        "ngay_hoc": f"{day.isoformat()}T00:00:00", "thu_kieu_so": day.weekday() + 2,
+        "tiet_bat_dau": rng.choice([1, 4, 7, 10]), "so_tiet": 3, "ma_mon": code, "ten_mon": subject,
+        "ten_mon_eg": subject.upper(), "so_tin_chi": "3", "ma_nhom": "01", "ma_to_th": "", "ma_phong": f"2A{rng.randint(10, 40)}",
+        "ma_giang_vien": f"GV{rng.randint(100, 999)}", "ten_giang_vien": "Nguyễn Văn A", "id_to_hoc": str(rng.random()),
+        "id_tkb": str(rng.random()), "id_to_hop": "", "ma_lop": "D21CQCN01-N", "ten_lop": "D21CQCN01-N",
+        "is_hk_lien_truoc": 0, "is_day_bu": False, "ngay_hoc_bu": None, "ghi_chu": "", "loai_tiet": "LT",
+        "ma_co_so": "CS2", "ten_co_so": "Cơ sở TP.HCM", "khoa": "CNTT2", "ten_khoa": "Công nghệ thông tin 2",
+        "is_online": False, "link_online": "", "so_tuan": 15, "tuan_bat_dau": 1, "tuan_ket_thuc": 15,
+    }
+
+
+def build_payloads(weeks=18, classes_per_week=20, exams=12, seed=7):
+    rng = random.Random(seed)
+    start = date(2025, 1, 6)
+    ds_tuan_tkb = []
+    for w in range(weeks):
+        week_start = start + timedelta(weeks=w)
+        classes = []
+        for _ in range(classes_per_week):
+            subject, code = rng.choice(SUBJECTS)
+            classes.append(_class_entry(week_start + timedelta(days=rng.randint(0, 5)), subject, code, rng))
+        ds_tuan_tkb.append({
+            "tuan": w + 1, "ngay_bat_dau": week_start.strftime('%d/%m/%Y'),
+            "ngay_ket_thuc": (week_start + timedelta(days=6)).strftime('%d/%m/%Y'),
+            "thong_tin_tuan": f"Tuần {w + 1}", "ds_thoi_khoa_bieu": classes, "ds_id_thoi_khoa_bieu_trung": [],
+        })
+    ds_lich_thi = []
+    for i in range(exams):
+        subject, code = SUBJECTS[i % len(SUBJECTS)]
+        ds_lich_thi.append({
+            "ma_mon": code, "ten_mon": subject, "ten_mon_eg": subject.upper(), "ky_thi": "Thi cuối kỳ",
+            "hinh_thuc_thi": "Tự luận", "so_phut": "90", "gio_bat_dau": "07:30",
+            "ngay_thi": (start + timedelta(weeks=weeks, days=i)).strftime('%d/%m/%Y'),
+            "ma_phong": "2B21", "dia_diem_thi": "Cơ sở TP.HCM", "so_tin_chi": "3", "nhom_thi": "01",
+            "to_thi": "", "si_so": 60, "ghi_chu_du_thi": "", "id_lich_thi": str(rng.random()),
+        })
+    schedule = json.dumps({"data": {"hoc_ky": {"ten_hoc_ky": "Học kỳ 2 - Năm học 2024-2025"}, "ds_tuan_tkb": ds_tuan_tkb}})
+    exam = json.dumps({"data": {"ds_lich_thi": ds_lich_thi}})
+    return schedule, exam
+
+
+def measure(build):
+    tracemalloc.start()
+    value = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, size
+
+
+def main():
+    schedule_json, exam_json = build_payloads()
+    # Warm up lazy imports (_strptime, locale) so they are not counted below
+    TimetableIndex.from_api(json.loads(schedule_json))
+
+    (raw_schedule, raw_exam), raw_bytes = measure(lambda: (json.loads(schedule_json), json.loads(exam_json)))
+    (timetable, exam_index), compact_bytes = measure(
+        lambda: (TimetableIndex.from_api(json.loads(schedule_json)), ExamIndex.from_api(json.loads(exam_json))))
+
+    print(f"Sessions: {len(timetable)}, exams: {len(exam_index)}")
+    print(f"Raw payload per user:     {raw_bytes / 1024:8.1f} KiB")
+    print(f"Compact index per user:   {compact_bytes / 1024:8.1f} KiB")
+    print(f"Reduction:                {raw_bytes / max(compact_bytes, 1):8.1f}x")
+    print(f"Estimated for 5000 users: {raw_bytes * 5000 / 2**20:.0f} MiB -> {compact_bytes * 5000 / 2**20:.0f} MiB")
+
+
+if __name__ == '__main__':
+    main()
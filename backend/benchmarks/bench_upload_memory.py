@@ -0,0 +1,93 @@
+"""
+Peak memory of the upload path as the upload grows.
+
+Each size is posted in a fresh process to a Flask app with the upload handling
+of the real one (UploadRequest + claim_upload + streamed text extraction), and
+to the same app reading the upload into memory the way /upload used to
+(file.read() and decode). The peak RSS of the process is reported for both.
+
+Run from the backend directory:
+    python -m benchmarks.bench_upload_memory [size in MiB ...]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+LINE = "Hệ điều hành quản lý tiến trình, bộ nhớ ảo và lập lịch CPU cho các chương trình.\n"
+
+
+def peak_rss_mib():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build_app(mode):
+    from flask import Flask, request, jsonify
+    from app.utils.uploads import UploadRequest
+    from app.services.extractors import iter_file_text
+
+    app = Flask(__name__)
+    app.request_class = UploadRequest
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        file = request.files['file']
+        characters = 0
+        if mode == 'streamed':
+            path = request.claim_upload(file)
+            try:
+                for _, text in iter_file_text(path, file.content_type):
+                    characters += len(text)
+            finally:
+                os.remove(path)
+        else:
+            content = file.read().decode('utf-8', errors='ignore')
+            file.seek(0)
+            characters = len(content)
+        return jsonify({'characters': characters})
+
+    return app
+
+
+def child(mode, path):
+    app = build_app(mode)
+    baseline = peak_rss_mib()
+    with open(path, 'rb') as upload:
+        response = app.test_client().post(
+            '/upload',
+            data={'file': (upload, 'notes.txt', 'text/plain'), 'user_id': 'bench'},
+            content_type='multipart/form-data'
+        )
+    assert response.status_code == 200, response.data
+    print(f"{peak_rss_mib():.1f} {baseline:.1f}")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [8, 32, 128]
+    print(f"{'upload':>8}  {'read() peak':>12}  {'streamed peak':>14}")
+    for size in sizes:
+        fd, path = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            block = LINE * (1024 * 1024 // len(LINE.encode('utf-8')))
+            for _ in range(size):
+                f.write(block)
+        try:
+            results = {}
+            for mode in ('read', 'streamed'):
+                output = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.bench_upload_memory', '--child', mode, path],
+                    capture_output=True, text=True, check=True
+                ).stdout.split()
+                results[mode] = float(output[-2])
+            print(f"{size:>5} MiB  {results['read']:>8.1f} MiB  {results['streamed']:>10.1f} MiB")
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main()
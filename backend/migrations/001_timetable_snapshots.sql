@@ -0,0 +1,11 @@
+-- Compact timetable/exam indexes, one row per (user, kind, part).
+-- kind: 'schedule' or 'exam'; part: semester ID, plus ':True'/':False' (midterm) for exams.
+create table if not exists timetable_snapshots (
+    username text not null,
+    kind text not null,
+    part text not null,
+    payload jsonb not null,
+    content_hash text not null,
+    fetched_at timestamptz not null default now(),
+    primary key (username, kind, part)
+);
@@ -0,0 +1,5 @@
+-- Pages and model token count of each chunk (see app/services/chunker.py).
+alter table file_chunks
+    add column if not exists page_start integer,
+    add column if not exists page_end integer,
+    add column if not exists token_count integer;
@@ -0,0 +1,6 @@
+-- BM25 keyword index of each file's chunks (see app/services/bm25_index.py).
+create table if not exists file_keyword_indexes (
+    file_id uuid primary key references user_files(id) on delete cascade,
+    payload jsonb not null,
+    created_at timestamptz not null default now()
+);
@@ -0,0 +1,14 @@
+-- Content-addressed deduplication (see FileService.find_duplicate_file / _embed_chunks).
+-- An upload whose bytes match a ready file points at that file's chunks through
+-- chunk_source_id instead of storing a copy; deleting the source hands the chunks
+-- over to one of the referencing files (FileService.delete_file), hence no cascade here.
+alter table user_files
+    add column if not exists content_sha256 text,
+    add column if not exists chunk_source_id uuid references user_files(id);
+
+create index if not exists user_files_content_sha256_idx on user_files (content_sha256) where status = 'ready';
+create index if not exists user_files_chunk_source_id_idx on user_files (chunk_source_id);
+
+-- Chunks with the same text reuse the stored embedding instead of being encoded again
+alter table file_chunks add column if not exists content_sha256 text;
+create index if not exists file_chunks_content_sha256_idx on file_chunks (content_sha256);
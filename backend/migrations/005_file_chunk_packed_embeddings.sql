@@ -0,0 +1,3 @@
+-- Packed float16/int8 chunk vectors (see app/services/embedding_codec.py), written when
+-- EMBEDDING_QUANTIZATION is 'float16' or 'int8'. The pgvector column stays for match_file_chunks.
+alter table file_chunks add column if not exists embedding_q text;
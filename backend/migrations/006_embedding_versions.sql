@@ -0,0 +1,39 @@
+-- Embedding version of files and chunks: the name of the model that embedded them
+-- (EmbeddingService.embedding_version). Searches only compare a query with chunk
+-- vectors of the same version, and app/services/reindexer.py re-embeds files of an
+-- older version next to the old rows before switching user_files.embedding_version.
+-- Everything stored so far was embedded by all-MiniLM-L6-v2.
+alter table user_files add column if not exists embedding_version text default 'all-MiniLM-L6-v2';
+alter table file_chunks add column if not exists embedding_version text default 'all-MiniLM-L6-v2';
+update user_files set embedding_version = 'all-MiniLM-L6-v2' where embedding_version is null;
+update file_chunks set embedding_version = 'all-MiniLM-L6-v2' where embedding_version is null;
+alter table file_chunks alter column embedding_version set not null;
+
+create index if not exists user_files_embedding_version_idx on user_files (embedding_version) where status = 'ready';
+
+-- Chunk rows are upserted on this key so retried batches are idempotent
+-- (app/services/chunk_writer.py); rows of both versions exist while a file is re-indexed
+create unique index if not exists file_chunks_file_id_version_chunk_index_key
+    on file_chunks (file_id, embedding_version, chunk_index);
+
+-- match_file_chunks restricted to one embedding version. The embedding column keeps
+-- its dimension: re-indexing to a model of another dimension needs it widened first
+-- (alter column embedding type vector), which rules out an ivfflat/hnsw index on it.
+create or replace function match_file_chunks_versioned(
+    query_embedding vector,
+    p_file_id uuid,
+    p_embedding_version text,
+    match_threshold float,
+    match_count int
+)
+returns table (chunk_index integer, content text, similarity float)
+language sql stable
+as $$
+    select c.chunk_index, c.content, 1 - (c.embedding <=> query_embedding) as similarity
+    from file_chunks c
+    where c.file_id = p_file_id
+      and c.embedding_version = p_embedding_version
+      and 1 - (c.embedding <=> query_embedding) > match_threshold
+    order by c.embedding <=> query_embedding
+    limit match_count;
+$$;
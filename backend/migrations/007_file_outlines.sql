@@ -0,0 +1,9 @@
+-- Outline of each file (headings with their pages, keywords, opening text) built at
+-- ingest, and an optional LLM summary (see app/services/file_outline.py). Overview
+-- questions and searches without matches are answered from it.
+create table if not exists file_outlines (
+    file_id uuid primary key references user_files(id) on delete cascade,
+    outline jsonb not null,
+    summary text,
+    created_at timestamptz not null default now()
+);
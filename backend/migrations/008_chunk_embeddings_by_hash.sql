@@ -0,0 +1,17 @@
+-- Stored embedding of each content hash for FileService._existing_embeddings: one row
+-- per hash however many chunks share it, and never a NULL or all-zero vector.
+create or replace function chunk_embeddings_by_hash(
+    p_hashes text[],
+    p_embedding_version text
+)
+returns table (content_sha256 text, embedding vector)
+language sql stable
+as $$
+    select distinct on (c.content_sha256) c.content_sha256, c.embedding
+    from file_chunks c
+    where c.content_sha256 = any(p_hashes)
+      and c.embedding_version = p_embedding_version
+      and c.embedding is not null
+      and vector_norm(c.embedding) > 0
+    order by c.content_sha256;
+$$;
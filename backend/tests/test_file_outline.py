@@ -0,0 +1,113 @@
+"""
+Outline of a PDF built through the ingest path (PDF extraction, chunking, outline)
+and the questions answered from it.
+
+Run from backend/: python -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+from app.services.chunker import Chunker
+from app.services.extractors import iter_pdf_pages
+from app.services.file_outline import OutlineBuilder, is_overview_question
+
+PAGES = [
+    [
+        'CHUONG 1 GIOI THIEU',
+        'He dieu hanh la phan mem quan ly phan cung cua may tinh.',
+        'No cung cap dich vu cho cac chuong trinh ung dung.',
+        '1.1 Khai niem he dieu hanh',
+        'He dieu hanh dieu phoi CPU, bo nho va thiet bi vao ra.',
+    ],
+    [
+        '1.2 Lap lich CPU',
+        'Bo lap lich chon tien trinh tiep theo duoc chay tren CPU.',
+        'CHUONG 2 QUAN LY BO NHO',
+        'Bo nho ao cho phep chay chuong trinh lon hon bo nho vat ly.',
+    ],
+]
+
+
+def _pdf_bytes(pages):
+    """A PDF with one line of Helvetica text per entry, as a PDF writer lays out lines"""
+    count = len(pages)
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [' + b' '.join(b'%d 0 R' % (4 + 2 * i) for i in range(count))
+        + b'] /Count %d >>' % count,
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    for i, lines in enumerate(pages):
+        stream = b'BT /F1 11 Tf 14 TL 50 780 Td ' + b' '.join(
+            b'(' + line.encode('latin-1') + b') Tj T*' for line in lines) + b' ET'
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (5 + 2 * i))
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+
+    data = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(data)
+    data += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    data += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    data += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return data
+
+
+def _count_words(texts):
+    return [len(text.split()) for text in texts]
+
+
+class PdfOutlineTest(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.pdf')
+        with os.fdopen(handle, 'wb') as pdf_file:
+            pdf_file.write(_pdf_bytes(PAGES))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_headings_of_multi_line_pages(self):
+        pieces = list(iter_pdf_pages(self.path))
+        # PyPDF2 separates the lines of a page with single line breaks
+        self.assertIn('CHUONG 1 GIOI THIEU\nHe dieu hanh', pieces[0][1])
+
+        outline = OutlineBuilder()
+        for chunk in Chunker(_count_words, max_tokens=30).chunks(pieces):
+            outline.add(chunk.index, chunk.text, chunk.page_start, chunk.page_end)
+        sections = outline.build()['sections']
+
+        self.assertEqual(
+            [(section['title'], section['level']) for section in sections],
+            [('CHUONG 1 GIOI THIEU', 1), ('1.1 Khai niem he dieu hanh', 2),
+             ('1.2 Lap lich CPU', 2), ('CHUONG 2 QUAN LY BO NHO', 1)]
+        )
+        self.assertEqual(sections[-1]['page'], 2)
+
+    def test_headings_are_not_glued_to_sentences(self):
+        chunks = list(Chunker(_count_words, max_tokens=200).chunks(iter_pdf_pages(self.path)))
+        text = '\n\n'.join(chunk.text for chunk in chunks)
+        self.assertIn('CHUONG 1 GIOI THIEU\n\nHe dieu hanh la phan mem', text)
+
+
+class OverviewQuestionTest(unittest.TestCase):
+
+    def test_questions_about_the_whole_file(self):
+        for question in ['File này nói về gì?', 'Tóm tắt tài liệu này giúp mình', 'Tóm tắt giúp mình nhé',
+                         'Nội dung chính của file này là gì?', "What's the pdf mainly about?",
+                         'Summarize this file', 'Give me an overview of the document']:
+            self.assertTrue(is_overview_question(question), question)
+
+    def test_questions_about_a_topic(self):
+        # Answered from search results, not from the outline alone
+        for question in ['Tóm tắt chương 2', 'Tóm tắt thuật toán lập lịch SJF', 'Tổng quan về bộ nhớ ảo',
+                         'Nội dung chính của chương 3 là gì', 'overview of scheduling algorithms?',
+                         "Summarize the document's section on paging"]:
+            self.assertFalse(is_overview_question(question), question)
+
+
+if __name__ == '__main__':
+    unittest.main()
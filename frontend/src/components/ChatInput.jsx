@@ -98,6 +98,22 @@ const ChatInput = ({
 
       const data = await response.json();
 
+      // The file is processed in the background, wait until it is ready
+      let status = data.status;
+      while (data.file_id && status !== "ready") {
+        if (status === "failed" || status === "cancelled") {
+          throw new Error(`File processing ${status}`);
+        }
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        const statusResponse = await fetch(
+          `http://localhost:8000/file/${data.file_id}/status?user_id=${encodeURIComponent(userId)}`
+        );
+        if (!statusResponse.ok) {
+          throw new Error("Status check failed");
+        }
+        status = (await statusResponse.json()).status;
+      }
+
       // Call the onFileUpload callback with file ID and name
       if (onFileUpload && data.file_id) {
         onFileUpload(data.file_id, file.name);
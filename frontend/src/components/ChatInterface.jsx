@@ -224,6 +224,64 @@ const ChatInterface = () => {
     setActiveFileContext(null);
   };
 
+  // Show the answer being streamed as a temporary assistant message
+  const showStreamingMessage = (content) => {
+    setMessages((prev) => {
+      const streaming = {
+        role: "assistant",
+        content,
+        chat_id: activeChat,
+        created_at: new Date().toISOString(),
+        streaming: true,
+      };
+      const index = prev.findIndex((m) => m.streaming);
+      return index === -1
+        ? [...prev, streaming]
+        : prev.map((m, i) => (i === index ? streaming : m));
+    });
+  };
+
+  // Read a newline-delimited JSON answer (schedule/exam queries):
+  // 'data' carries the schedule and a first answer, 'token' pieces of the
+  // LLM summary, 'done' the final answer
+  const readChatStream = async (response) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let summary = "";
+    let result = null;
+
+    const handleEvent = (line) => {
+      if (!line.trim()) return;
+      const event = JSON.parse(line);
+      if (event.type === "data") {
+        showStreamingMessage(event.response);
+      } else if (event.type === "token") {
+        summary += event.content;
+        showStreamingMessage(summary);
+      } else if (event.type === "error") {
+        console.error("Streaming error:", event.error);
+      } else if (event.type === "done") {
+        result = event;
+      }
+    };
+
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split("\n");
+      buffer = lines.pop();
+      lines.forEach(handleEvent);
+    }
+    handleEvent(buffer + decoder.decode());
+
+    if (!result) {
+      throw new Error("Stream ended before the final answer");
+    }
+    return result;
+  };
+
   // Update sendMessage to include web_search_enabled
   const handleSendMessage = async (message, webSearchEnabled) => {
     if (!message.trim() || isLoading) return;
@@ -277,6 +335,7 @@ const ChatInterface = () => {
         agent_id: selectedAgent,
         web_search_enabled: webSearchEnabled || false,
         chat_id: activeChat, // Thêm chat_id để backend có thể lưu tin nhắn
+        stream: true, // Lịch học/lịch thi được trả về dần (NDJSON)
       };
 
       console.log("Sending chat request with user ID:", user?.id);
@@ -305,7 +364,10 @@ const ChatInterface = () => {
 
         let data;
         try {
-          data = await response.json();
+          const contentType = response.headers.get("Content-Type") || "";
+          data = contentType.includes("application/x-ndjson")
+            ? await readChatStream(response)
+            : await response.json();
         } catch (jsonError) {
           console.error("JSON parsing error:", jsonError);
           throw new Error("Invalid response format from server");
@@ -325,7 +387,11 @@ const ChatInterface = () => {
           assistantMessage.web_search_results = true;
         }
 
-        setMessages((prev) => [...prev, assistantMessage]);
+        // Replace the streamed message, if any, with the final one
+        setMessages((prev) => [
+          ...prev.filter((m) => !m.streaming),
+          assistantMessage,
+        ]);
 
         // Save assistant's message to Supabase
         const { error: assistantInsertError } = await supabase
@@ -349,7 +415,7 @@ const ChatInterface = () => {
 
         // Show friendly error message in chat
         setMessages((prev) => [
-          ...prev,
+          ...prev.filter((m) => !m.streaming),
           {
             role: "assistant",
             content: